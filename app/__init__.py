@@ -1,12 +1,15 @@
 # Marca app/ como paquete
 from flask import Flask, render_template, request
 from flask_sqlalchemy import SQLAlchemy
-import logging
-from logging.handlers import RotatingFileHandler
+from flask_migrate import Migrate
 import os
 
 # Inicializar db fuera de la función para evitar ciclos
 db = SQLAlchemy()
+migrate = Migrate()
+
+# Las migraciones viven junto al paquete para que la imagen las incluya al copiar app/
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
 
 def create_app():
     app = Flask(__name__, template_folder='templates', static_folder='static')
@@ -15,37 +18,21 @@ def create_app():
     from app.config import Config
     app.config.from_object(Config)
     
-    # Configurar logging
-    log_dir = '/app/logs'
-    if not os.path.exists(log_dir):
-        os.makedirs(log_dir)
-    
-    # Configurar el manejador de archivo con rotación
-    file_handler = RotatingFileHandler(
-        os.path.join(log_dir, 'app.log'),
-        maxBytes=1024 * 1024 * 10,  # 10 MB por archivo
-        backupCount=5  # Mantener hasta 5 archivos de respaldo
-    )
-    file_handler.setLevel(logging.DEBUG)
-    file_handler.setFormatter(logging.Formatter(
-        '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-    ))
-    
-    # Configurar el manejador de consola
-    console_handler = logging.StreamHandler()
-    console_handler.setLevel(logging.DEBUG)
-    console_handler.setFormatter(logging.Formatter(
-        '%(asctime)s - %(levelname)s - %(message)s'
-    ))
-    
-    # Configurar el logger de la app
-    app.logger.handlers.clear()
-    app.logger.setLevel(logging.DEBUG)
-    app.logger.addHandler(file_handler)
-    app.logger.addHandler(console_handler)
+    # Configurar logging (escritura en segundo plano, ver app/logging_config.py)
+    from app.logging_config import setup_logging
+    setup_logging(app, Config)
     
     # Inicializar la base de datos
     db.init_app(app)
+    migrate.init_app(app, db, directory=MIGRATIONS_DIR, render_as_batch=True)  # batch: ALTER TABLE en SQLite
+    
+    # Latencia y códigos de estado por endpoint para /api/stats
+    from app.services.metrics_service import init_request_metrics
+    init_request_metrics(app)
+    
+    # Perfilado de peticiones bajo demanda (se activa desde /admin/profiling)
+    from app.services.profiling_service import init_profiling
+    init_profiling(app)
     
     # Registrar rutas
     from app.routes import init_routes
@@ -7,8 +7,102 @@ load_dotenv()
 class Config:
     SECRET_KEY = os.getenv('SECRET_KEY', 'supersecreto')
     SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URL', 'postgresql://user:password@db:5432/oposicionesdb')
+    SCHEMA_WAIT_TIMEOUT = int(os.getenv('SCHEMA_WAIT_TIMEOUT', 600))  # Segundos que gunicorn espera a las migraciones del worker
     SQLALCHEMY_TRACK_MODIFICATIONS = False
-    CURSOS_DIR = "/cursos"
+    CURSOS_DIR = os.getenv('CURSOS_DIR', "/cursos")
     ARCHIVE_DIR = os.path.join(CURSOS_DIR, "_archive")
     TEMP_DIR = os.path.join(CURSOS_DIR, "_temp")
-    MAX_QUEUE_SIZE = int(os.getenv('MAX_QUEUE_SIZE', 5))
\ No newline at end of file
+    MAX_QUEUE_SIZE = int(os.getenv('MAX_QUEUE_SIZE', 5))
+    CURSOS_INDEX_REFRESH_INTERVAL = int(os.getenv('CURSOS_INDEX_REFRESH_INTERVAL', 30))
+    SEARCH_INDEX_PATH = os.getenv('SEARCH_INDEX_PATH', '/app/data/search.db')
+    SEARCH_MAX_RESULTS = int(os.getenv('SEARCH_MAX_RESULTS', 200))
+    CONVERSION_WORKERS = int(os.getenv('CONVERSION_WORKERS', 0))  # 0 = automático según CPUs
+    FFMPEG_THREADS = int(os.getenv('FFMPEG_THREADS', 2))
+    CONVERSION_ORDER = os.getenv('CONVERSION_ORDER', 'shortest')  # 'shortest' o 'fifo'
+    JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', 3))
+    JOB_LEASE_SECONDS = int(os.getenv('JOB_LEASE_SECONDS', 120))
+    JOB_HEARTBEAT_INTERVAL = int(os.getenv('JOB_HEARTBEAT_INTERVAL', 15))
+    JOB_POLL_INTERVAL = int(os.getenv('JOB_POLL_INTERVAL', 5))
+    JOB_RETENTION_DAYS = int(os.getenv('JOB_RETENTION_DAYS', 30))  # Historial de trabajos terminados (0 = sin límite)
+    FILE_CACHE_MAX_AGE = int(os.getenv('FILE_CACHE_MAX_AGE', 3600))
+    FILE_OFFLOAD = os.getenv('FILE_OFFLOAD', '')  # '', 'x-accel' (nginx) o 'x-sendfile' (apache/lighttpd)
+    ACCEL_REDIRECT_PREFIX = os.getenv('ACCEL_REDIRECT_PREFIX', '/protected-cursos/')
+    HLS_ENABLED = os.getenv('HLS_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    HLS_RENDITIONS = os.getenv('HLS_RENDITIONS', '360,720,1080')  # Alturas en píxeles
+    HLS_SEGMENT_SECONDS = int(os.getenv('HLS_SEGMENT_SECONDS', 6))
+    THUMBNAILS_ENABLED = os.getenv('THUMBNAILS_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    THUMBNAIL_DIR = os.getenv('THUMBNAIL_DIR', '/app/data/thumbs')
+    THUMBNAIL_CACHE_MAX_MB = int(os.getenv('THUMBNAIL_CACHE_MAX_MB', 500))
+    THUMBNAIL_WIDTH = int(os.getenv('THUMBNAIL_WIDTH', 640))
+    SPRITE_TILE_WIDTH = int(os.getenv('SPRITE_TILE_WIDTH', 160))
+    SPRITE_COLUMNS = int(os.getenv('SPRITE_COLUMNS', 10))
+    SPRITE_MAX_TILES = int(os.getenv('SPRITE_MAX_TILES', 100))
+    SCAN_WORKERS = int(os.getenv('SCAN_WORKERS', 0))  # 0 = automático según CPUs
+    FINGERPRINT_BLOCK_KB = int(os.getenv('FINGERPRINT_BLOCK_KB', 64))
+    PROBE_BACKEND = os.getenv('PROBE_BACKEND', 'auto')  # 'auto' (lector MP4 nativo + ffprobe) o 'ffprobe'
+    PROGRESS_PUBLISH_INTERVAL = float(os.getenv('PROGRESS_PUBLISH_INTERVAL', 2))
+    LOG_DIR = os.getenv('LOG_DIR', '/app/logs')
+    LOG_BACKUP_COUNT = int(os.getenv('LOG_BACKUP_COUNT', 5))
+    LOG_PAGE_SIZE = int(os.getenv('LOG_PAGE_SIZE', 100))
+    LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+    LOG_FORMAT = os.getenv('LOG_FORMAT', 'json')  # Formato de app.log: 'json' o 'text'
+    LOG_CONSOLE_FORMAT = os.getenv('LOG_CONSOLE_FORMAT', 'text')
+    LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', 10000))
+    # Fracción de peticiones por endpoint cuyos mensajes DEBUG se registran (el resto, 1.0)
+    LOG_DEBUG_SAMPLING = os.getenv(
+        'LOG_DEBUG_SAMPLING',
+        'index=0.05,serve_file_no_section=0.01,serve_file_with_section=0.01,serve_thumbnail=0'
+    )
+    METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')  # Si se define, /api/stats exige "Authorization: Bearer <token>" o sesión de admin
+    METRICS_PUBLISH_INTERVAL = int(os.getenv('METRICS_PUBLISH_INTERVAL', 15))
+    PROFILING_DIR = os.getenv('PROFILING_DIR', '/app/data/profiles')
+    PROFILING_BUFFER_SIZE = int(os.getenv('PROFILING_BUFFER_SIZE', 200))  # Perfiles conservados (los más antiguos se borran)
+    PROFILING_SAMPLE_INTERVAL_MS = int(os.getenv('PROFILING_SAMPLE_INTERVAL_MS', 5))
+    # Reutilizar la salida de una conversión anterior del mismo original: 'copy', 'reflink' o 'hardlink' (ambos con
+    # copia si no se puede) u 'off'. Con 'hardlink' los dos cursos comparten el archivo: editarlo en uno cambia el otro
+    CONVERSION_DEDUP = os.getenv('CONVERSION_DEDUP', 'copy')
+    # Recodificación por segmentos: los videos de al menos estos minutos se cortan por keyframes y los trozos
+    # se codifican en paralelo (0 = desactivado)
+    SEGMENTED_ENCODE_MIN_MINUTES = int(os.getenv('SEGMENTED_ENCODE_MIN_MINUTES', 30))
+    SEGMENT_SECONDS = int(os.getenv('SEGMENT_SECONDS', 120))  # Duración aproximada de cada trozo
+    SEGMENT_PARALLELISM = int(os.getenv('SEGMENT_PARALLELISM', 0))  # Máximo de trozos a la vez; 0 = CPUs / FFMPEG_THREADS
+    # Ingesta por eventos de lecciones nuevas: 'auto' (inotify, o sondeo si /cursos es un montaje de red),
+    # 'inotify', 'poll' u 'off' (solo el escaneo completo periódico)
+    INGEST_WATCHER = os.getenv('INGEST_WATCHER', 'auto')
+    INGEST_STABLE_SECONDS = int(os.getenv('INGEST_STABLE_SECONDS', 10))  # Sin cambios de tamaño ni mtime = copia terminada
+    INGEST_POLL_INTERVAL = int(os.getenv('INGEST_POLL_INTERVAL', 15))
+    VIDEO_FULL_SCAN_INTERVAL = int(os.getenv('VIDEO_FULL_SCAN_INTERVAL', 3600))  # Escaneo completo con la ingesta activa
+    # Prioridad de ffmpeg frente al servido de archivos: nice 0-19 y clase de ionice ('idle', 'best-effort' u 'off')
+    CONVERSION_NICE = int(os.getenv('CONVERSION_NICE', 10))
+    CONVERSION_IONICE = os.getenv('CONVERSION_IONICE', 'idle')
+    # Ventanas de baja demanda "HH:MM-HH:MM,..." (hora local); fuera de ellas solo arrancan los trabajos de
+    # administradores. Vacío = siempre
+    CONVERSION_WINDOWS = os.getenv('CONVERSION_WINDOWS', '')
+    # Regulación por carga: con REDUCE los ffmpeg nuevos usan THROTTLE_REDUCED_THREADS hilos, con SUSPEND se
+    # detienen todos (SIGSTOP) hasta THROTTLE_RESUME_SECONDS después de que baje la carga (0 = sin umbral)
+    THROTTLE_ENABLED = os.getenv('THROTTLE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    THROTTLE_CHECK_INTERVAL = int(os.getenv('THROTTLE_CHECK_INTERVAL', 5))
+    THROTTLE_REDUCE_STREAMS = int(os.getenv('THROTTLE_REDUCE_STREAMS', 3))
+    THROTTLE_SUSPEND_STREAMS = int(os.getenv('THROTTLE_SUSPEND_STREAMS', 15))
+    THROTTLE_REDUCE_LATENCY_MS = int(os.getenv('THROTTLE_REDUCE_LATENCY_MS', 300))
+    THROTTLE_SUSPEND_LATENCY_MS = int(os.getenv('THROTTLE_SUSPEND_LATENCY_MS', 1000))
+    THROTTLE_MIN_REQUESTS = int(os.getenv('THROTTLE_MIN_REQUESTS', 20))  # Peticiones mínimas para fiarse del p95
+    THROTTLE_REDUCED_THREADS = int(os.getenv('THROTTLE_REDUCED_THREADS', 1))
+    THROTTLE_RESUME_SECONDS = int(os.getenv('THROTTLE_RESUME_SECONDS', 60))
+    # Perfil de recodificación por defecto ('standard', 'lecture', 'slides' o 'compact'); se puede cambiar por
+    # curso y por trabajo desde el gestor de videos
+    ENCODING_PROFILE = os.getenv('ENCODING_PROFILE', 'standard')
+    # Estimación por muestras antes de recodificar: clips codificados y segundos de cada uno (0 = sin estimación)
+    ENCODING_SAMPLE_COUNT = int(os.getenv('ENCODING_SAMPLE_COUNT', 3))
+    ENCODING_SAMPLE_SECONDS = int(os.getenv('ENCODING_SAMPLE_SECONDS', 8))
+    # Deduplicación de /cursos y _archive: 'report' (solo informe), 'hardlink', 'reflink', 'purge' (solo la retención
+    # de _archive) u 'off', cada DEDUP_INTERVAL_HOURS como trabajo automático; los videos por debajo de
+    # DEDUP_MIN_SIZE_MB no se comparan
+    DEDUP_MODE = os.getenv('DEDUP_MODE', 'report')
+    DEDUP_INTERVAL_HOURS = int(os.getenv('DEDUP_INTERVAL_HOURS', 24))
+    DEDUP_MIN_SIZE_MB = int(os.getenv('DEDUP_MIN_SIZE_MB', 1))
+    # Los enlaces duros hacen que las copias compartan el inodo: una escritura en el sitio sobre una cambia todas.
+    # El modo 'hardlink' (periódico o manual) solo se permite activándolo aquí; 'reflink' no tiene ese riesgo
+    DEDUP_ALLOW_HARDLINK = os.getenv('DEDUP_ALLOW_HARDLINK', 'false').lower() in ('1', 'true', 'yes')
+    # Días que se guarda en _archive un original ya convertido antes de purgarlo (0 = siempre)
+    ARCHIVE_RETENTION_DAYS = int(os.getenv('ARCHIVE_RETENTION_DAYS', 0))
@@ -0,0 +1,170 @@
+# Logging no bloqueante: las peticiones solo encolan registros y un hilo en segundo plano escribe archivo y consola
+import atexit
+import copy
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener, WatchedFileHandler
+from flask import g, has_request_context, request
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+CONSOLE_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+# Atributos propios de LogRecord: lo demás viene de extra={...} y se añade al JSON
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime'}
+
+LOG_MAX_BYTES = 1024 * 1024 * 10  # 10 MB por archivo
+ROTATION_CHECK_SECONDS = 30
+
+logging_stats = {'dropped': 0}
+# Argumentos que se pueden formatear en otro hilo sin riesgo de que cambien antes
+_IMMUTABLE_ARGS = (str, int, float, bool, bytes, type(None))
+
+class JsonFormatter(logging.Formatter):
+    # Una línea JSON por registro; "ts" va primero para que el lector de logs localice cabeceras sin parsear
+    def format(self, record):
+        entry = {
+            'ts': f"{self.formatTime(record, '%Y-%m-%d %H:%M:%S')},{int(record.msecs):03d}",
+            'level': record.levelname,
+            'name': record.name,
+            'message': record.getMessage(),
+            'process': record.process,
+            'thread': record.threadName,
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+class NonBlockingQueueHandler(QueueHandler):
+    # Si el escritor no da abasto se descarta el registro en lugar de frenar la petición
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            logging_stats['dropped'] += 1
+
+    def prepare(self, record):
+        # El nivel y el muestreo ya se han comprobado (Logger.isEnabledFor y el filtro del manejador) antes de llegar
+        # aquí. En el hilo de la petición solo se resuelve lo que no puede cruzar de hilo (args mutables y traceback);
+        # con args inmutables, lo habitual, el mensaje y el formato final los compone el hilo escritor
+        mutable_args = record.args and not (isinstance(record.args, tuple)
+                                            and all(isinstance(arg, _IMMUTABLE_ARGS) for arg in record.args))
+        if not mutable_args and not record.exc_info:
+            return record
+        record = copy.copy(record)
+        if mutable_args:
+            record.msg = record.getMessage()
+            record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+def parse_sampling(value):
+    # "index=0.01,serve_file_with_section=0" -> {'index': 0.01, 'serve_file_with_section': 0.0}
+    rates = {}
+    for item in (value or '').split(','):
+        endpoint, _, rate = item.partition('=')
+        if endpoint.strip() and rate.strip():
+            try:
+                rates[endpoint.strip()] = min(1.0, max(0.0, float(rate)))
+            except ValueError:
+                continue
+    return rates
+
+class DebugSamplingFilter(logging.Filter):
+    # Muestreo de DEBUG por endpoint: se decide una vez por petición para conservar trazas completas
+    def __init__(self, rates):
+        super().__init__()
+        self.rates = rates
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG or not has_request_context():
+            return True
+        sampled = g.get('_log_debug_sampled')
+        if sampled is None:
+            rate = self.rates.get(request.endpoint, 1.0)
+            sampled = rate >= 1.0 or random.random() < rate
+            g._log_debug_sampled = sampled
+        return sampled
+
+def _make_formatter(log_format, text_format):
+    if log_format == 'json':
+        return JsonFormatter()
+    return logging.Formatter(text_format)
+
+def setup_logging(app, config):
+    log_dir = config.LOG_DIR
+    if not os.path.exists(log_dir):
+        os.makedirs(log_dir)
+
+    # Todos los procesos (workers de gunicorn y worker.py) escriben en app.log en modo append. Ninguno rota por su
+    # cuenta: WatchedFileHandler reabre app.log cuando otro proceso lo ha renombrado (ver start_log_rotation)
+    file_handler = WatchedFileHandler(os.path.join(log_dir, 'app.log'))
+    file_handler.setFormatter(_make_formatter(config.LOG_FORMAT, TEXT_FORMAT))
+
+    # Configurar el manejador de consola
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(_make_formatter(config.LOG_CONSOLE_FORMAT, CONSOLE_FORMAT))
+
+    # Los manejadores reales viven en el hilo del listener; el logger solo tiene el de la cola
+    log_queue = queue.Queue(maxsize=config.LOG_QUEUE_SIZE)
+    queue_handler = NonBlockingQueueHandler(log_queue)
+    queue_handler.addFilter(DebugSamplingFilter(parse_sampling(config.LOG_DEBUG_SAMPLING)))
+    listener = QueueListener(log_queue, file_handler, console_handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)  # Vacía la cola al salir
+
+    # Configurar el logger de la app
+    app.logger.handlers.clear()
+    app.logger.setLevel(getattr(logging, config.LOG_LEVEL.upper(), logging.INFO))
+    app.logger.addHandler(queue_handler)
+    app.extensions['log_listener'] = listener
+    app.extensions['log_queue'] = log_queue
+    return listener
+
+def rotate_log(path, max_bytes, backup_count):
+    # Misma secuencia que RotatingFileHandler (app.log -> app.log.1 ... app.log.N) pero solo renombrando:
+    # los procesos que siguen escribiendo en el archivo renombrado terminan su registro allí y luego reabren
+    if backup_count <= 0:
+        return False
+    try:
+        if os.path.getsize(path) < max_bytes:
+            return False
+    except OSError:
+        return False
+    for i in range(backup_count - 1, 0, -1):
+        if os.path.exists(f"{path}.{i}"):
+            os.replace(f"{path}.{i}", f"{path}.{i + 1}")
+    os.replace(path, f"{path}.1")
+    return True
+
+def log_rotation_loop(app, path, backup_count):
+    while True:
+        try:
+            if rotate_log(path, LOG_MAX_BYTES, backup_count):
+                app.logger.info(f"Log rotado: {path}")
+        except OSError as e:
+            app.logger.error(f"Error en log_rotation_loop: {str(e)}", exc_info=True)
+        time.sleep(ROTATION_CHECK_SECONDS)
+
+def start_log_rotation(app, config):
+    # Un único proceso rota app.log (el worker, una instancia por despliegue)
+    path = os.path.join(config.LOG_DIR, 'app.log')
+    threading.Thread(target=log_rotation_loop, args=(app, path, config.LOG_BACKUP_COUNT), name='log-rotation', daemon=True).start()
+
+def get_logging_stats(app):
+    log_queue = app.extensions.get('log_queue')
+    return {
+        'queued': log_queue.qsize() if log_queue else 0,
+        'capacity': log_queue.maxsize if log_queue else 0,
+        'dropped': logging_stats['dropped'],
+    }
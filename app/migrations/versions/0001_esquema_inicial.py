@@ -0,0 +1,41 @@
+"""Esquema inicial
+
+Revision ID: 0001
+Revises: 
+Create Date: 2026-10-18 16:24:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Esquema de la primera versión, la que creaba db.create_all() antes de las migraciones: solo usuarios y
+    # conversiones. Las tablas y columnas posteriores las añaden las revisiones siguientes
+    op.create_table('converted_video',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('original_hash', sa.String(length=64), nullable=False),
+    sa.Column('original_path', sa.String(length=255), nullable=False),
+    sa.Column('converted_path', sa.String(length=255), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('user',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('username', sa.String(length=80), nullable=False),
+    sa.Column('password', sa.String(length=120), nullable=False),
+    sa.Column('is_admin', sa.Boolean(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('username')
+    )
+
+
+def downgrade():
+    op.drop_table('user')
+    op.drop_table('converted_video')
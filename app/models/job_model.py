@@ -0,0 +1,29 @@
+# Modelo para trabajos de conversión persistentes
+from app.__init__ import db
+
+class ConversionJob(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    file_path = db.Column(db.String(1024), nullable=False, index=True)
+    job_type = db.Column(db.String(20), nullable=False, default='convert')
+    state = db.Column(db.String(20), nullable=False, default='queued')  # queued/processing/completed/failed
+    priority = db.Column(db.Integer, nullable=False, default=1)
+    duration = db.Column(db.Float, nullable=False, default=0)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=3)
+    worker_id = db.Column(db.String(255))
+    temp_path = db.Column(db.String(1024))
+    progress = db.Column(db.Integer, nullable=False, default=0)
+    eta = db.Column(db.String(50))
+    message = db.Column(db.Text)
+    payload = db.Column(db.Text)  # JSON con parámetros específicos del tipo de trabajo
+    result = db.Column(db.Text)  # JSON con el resultado
+    created_at = db.Column(db.DateTime, nullable=False)
+    started_at = db.Column(db.DateTime)
+    heartbeat_at = db.Column(db.DateTime)
+    lease_expires_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index('ix_conversion_job_claim', 'state', 'priority', 'duration', 'id'),
+        db.Index('ix_conversion_job_latest', 'job_type', 'file_path', 'id'),
+    )
@@ -0,0 +1,7 @@
+# Modelo para ajustes y estado compartido entre procesos
+from app.__init__ import db
+
+class AppSetting(db.Model):
+    key = db.Column(db.String(100), primary_key=True)
+    value = db.Column(db.Text)  # JSON
+    updated_at = db.Column(db.DateTime)
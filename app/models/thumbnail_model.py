@@ -0,0 +1,13 @@
+# Modelos para las miniaturas pedidas por los procesos web y las que ffmpeg no ha podido generar
+from app.__init__ import db
+
+class ThumbnailRequest(db.Model):
+    # Una fila por video mostrado sin miniaturas: el worker la borra al recogerla
+    file_path = db.Column(db.String(1024), primary_key=True)
+    requested_at = db.Column(db.DateTime, nullable=False)
+
+class ThumbnailFailure(db.Model):
+    # Videos con los que ffmpeg ha fallado, para que ningún proceso los vuelva a pedir en cada visita
+    file_hash = db.Column(db.String(64), primary_key=True)
+    message = db.Column(db.Text)
+    failed_at = db.Column(db.DateTime, nullable=False)
@@ -2,7 +2,40 @@
 from app.__init__ import db
 
 class ConvertedVideo(db.Model):
+    # original_hash y converted_path indexados: el escaneo consulta por ruta y la conversión
+    # busca salidas previas del mismo original por hash. Los cambios de esquema van en app/migrations.
     id = db.Column(db.Integer, primary_key=True)
-    original_hash = db.Column(db.String(64), nullable=False)
-    original_path = db.Column(db.String(255), nullable=False)
-    converted_path = db.Column(db.String(255), nullable=False)
\ No newline at end of file
+    original_hash = db.Column(db.String(64), nullable=False, index=True)
+    original_path = db.Column(db.String(1024), nullable=False)
+    converted_path = db.Column(db.String(1024), nullable=False, index=True)
+    converted_hash = db.Column(db.String(64))
+    video_codec = db.Column(db.String(50))
+    size = db.Column(db.BigInteger)
+    created_at = db.Column(db.DateTime)
+    # Perfil de recodificación (None si solo se copió el video) y ahorro previsto por muestras frente al real
+    profile = db.Column(db.String(32))
+    original_size = db.Column(db.BigInteger)
+    expected_size = db.Column(db.BigInteger)
+    expected_seconds = db.Column(db.Float)
+    encode_seconds = db.Column(db.Float)
+    original_purged_at = db.Column(db.DateTime)  # Original borrado de _archive por la política de retención
+
+class VideoMetadata(db.Model):
+    # Caché de huella y ffprobe: válida mientras (tamaño, mtime, inodo) no cambien.
+    # file_hash (SHA-256 completo) se calcula solo cuando hace falta.
+    id = db.Column(db.Integer, primary_key=True)
+    file_path = db.Column(db.String(1024), unique=True, nullable=False, index=True)
+    size = db.Column(db.BigInteger, nullable=False)
+    mtime_ns = db.Column(db.BigInteger, nullable=False)
+    inode = db.Column(db.BigInteger, nullable=False)
+    fingerprint = db.Column(db.String(64), index=True)
+    file_hash = db.Column(db.String(64))
+    format_name = db.Column(db.String(255))
+    video_codec = db.Column(db.String(50))
+    audio_codec = db.Column(db.String(50))
+    duration = db.Column(db.Float)
+    bit_rate = db.Column(db.BigInteger)
+    faststart = db.Column(db.Boolean)  # MP4 con moov antes de mdat; None si no es MP4 o no se pudo leer
+    streams = db.Column(db.Text)
+    probe_error = db.Column(db.Text)
+    updated_at = db.Column(db.DateTime)
@@ -5,6 +5,7 @@ from .user_routes import register_user_routes
 from .video_routes import register_video_routes
 from .api_routes import register_api_routes
 from .log_routes import register_log_routes  # Nueva importación
+from .profiling_routes import register_profiling_routes
 
 def init_routes(app):
     register_auth_routes(app)
@@ -12,4 +13,5 @@ def init_routes(app):
     register_user_routes(app)
     register_video_routes(app)
     register_api_routes(app)
-    register_log_routes(app)  # Registrar las rutas de logs
\ No newline at end of file
+    register_log_routes(app)  # Registrar las rutas de logs
+    register_profiling_routes(app)
@@ -1,13 +1,34 @@
 # Rutas de API
-from flask import jsonify, request
+from flask import Response, jsonify, request, session, url_for
+import time
+from app.services.search_service import search
+from app.services.metrics_service import collect_metrics, is_authorized, render_json, render_prometheus
+from app.services.video_catalog import query_videos
+from app.models.video_model import ConvertedVideo
+
+def _bool_arg(name):
+    # '1'/'true'/'si' -> True, '0'/'false'/'no' -> False, ausente o vacío -> sin filtro
+    value = request.args.get(name, '').strip().lower()
+    if value in ('1', 'true', 'si', 'sí', 'yes'):
+        return True
+    if value in ('0', 'false', 'no'):
+        return False
+    return None
 
 def register_api_routes(app):
     @app.route('/api/stats', methods=['GET'])
     def api_stats():
         try:
-            referrer = request.referrer if request.referrer else "No referrer provided"
-            app.logger.info(f"Solicitud recibida en /api/stats desde: {referrer}")
-            return jsonify({"error": "Endpoint no implementado aún"}), 200
+            # Prometheus por defecto; JSON con ?format=json o Accept: application/json
+            app.logger.debug("Solicitud recibida en /api/stats desde: %s", request.remote_addr)
+            if not is_authorized(request.headers.get('Authorization'), session.get('is_admin', False)):
+                return jsonify({"error": "No autorizado"}), 401
+            metrics = collect_metrics()
+            wants_json = request.args.get('format') == 'json' or \
+                request.accept_mimetypes.best_match(['text/plain', 'application/json']) == 'application/json'
+            if wants_json:
+                return jsonify(render_json(metrics)), 200
+            return Response(render_prometheus(metrics), mimetype='text/plain; version=0.0.4; charset=utf-8')
         except Exception as e:
             app.logger.error(f"Error en api_stats: {str(e)}", exc_info=True)
             return jsonify({"error": "Error interno del servidor"}), 500
@@ -20,4 +41,86 @@ def register_api_routes(app):
             return jsonify({"error": "Endpoint no implementado aún"}), 200
         except Exception as e:
             app.logger.error(f"Error en api_version: {str(e)}", exc_info=True)
-            return jsonify({"error": "Error interno del servidor"}), 500
\ No newline at end of file
+            return jsonify({"error": "Error interno del servidor"}), 500
+
+    @app.route('/api/search', methods=['GET'])
+    def api_search():
+        try:
+            if not session.get('logged_in'):
+                return jsonify({"error": "No autenticado"}), 401
+            query = request.args.get('q', '').strip()
+            limit = max(1, min(request.args.get('limit', 20, type=int), 100))
+            start = time.perf_counter()
+            results = search(query, limit=limit) if query else []
+            for result in results:
+                if result['kind'] == 'seccion':
+                    result['url'] = url_for('index', curso=result['curso'])
+                elif result['seccion']:
+                    result['url'] = url_for('serve_file_with_section', curso=result['curso'],
+                                            seccion=result['seccion'], filename=result['filename'])
+                else:
+                    result['url'] = url_for('serve_file_no_section', curso=result['curso'], filename=result['filename'])
+            return jsonify({
+                "query": query,
+                "results": results,
+                "took_ms": round((time.perf_counter() - start) * 1000, 2)
+            }), 200
+        except Exception as e:
+            app.logger.error(f"Error en api_search: {str(e)}", exc_info=True)
+            return jsonify({"error": "Error interno del servidor"}), 500
+
+    @app.route('/api/videos', methods=['GET'])
+    def api_videos():
+        try:
+            if not session.get('logged_in') or not session.get('is_admin'):
+                return jsonify({"error": "No autorizado"}), 403
+            start = time.perf_counter()
+            result = query_videos(
+                sort=request.args.get('sort', 'path'),
+                descending=request.args.get('order', 'asc') == 'desc',
+                curso=request.args.get('curso') or None,
+                needs_conversion=_bool_arg('needs_conversion'),
+                processed=_bool_arg('processed'),
+                limit=request.args.get('limit', 50, type=int),
+                cursor=request.args.get('cursor') or None,
+            )
+            result['took_ms'] = round((time.perf_counter() - start) * 1000, 2)
+            return jsonify(result), 200
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        except Exception as e:
+            app.logger.error(f"Error en api_videos: {str(e)}", exc_info=True)
+            return jsonify({"error": "Error interno del servidor"}), 500
+
+    @app.route('/api/videos/archived', methods=['GET'])
+    def api_archived_videos():
+        # Paginación por id descendente (los más recientes primero)
+        try:
+            if not session.get('logged_in') or not session.get('is_admin'):
+                return jsonify({"error": "No autorizado"}), 403
+            limit = max(1, min(request.args.get('limit', 50, type=int), 500))
+            query = ConvertedVideo.query.order_by(ConvertedVideo.id.desc())
+            cursor = request.args.get('cursor', type=int)
+            if cursor:
+                query = query.filter(ConvertedVideo.id < cursor)
+            rows = query.limit(limit + 1).all()
+            videos = [{
+                'id': video.id,
+                'original_hash': video.original_hash,
+                'original_path': video.original_path,
+                'converted_path': video.converted_path,
+                'profile': video.profile,
+                'original_size': video.original_size,
+                'size': video.size,
+                'expected_size': video.expected_size,
+                'expected_seconds': video.expected_seconds,
+                'encode_seconds': video.encode_seconds,
+                'original_purged_at': video.original_purged_at.strftime('%Y-%m-%d %H:%M') if video.original_purged_at else None,
+            } for video in rows[:limit]]
+            return jsonify({
+                "videos": videos,
+                "next_cursor": videos[-1]['id'] if len(rows) > limit else None,
+            }), 200
+        except Exception as e:
+            app.logger.error(f"Error en api_archived_videos: {str(e)}", exc_info=True)
+            return jsonify({"error": "Error interno del servidor"}), 500
@@ -9,7 +9,7 @@ def register_auth_routes(app):
             if request.method == 'POST':
                 username = request.form['username']
                 password = request.form['password']
-                app.logger.debug(f"Intento de login para usuario: {username}")
+                app.logger.debug("Intento de login para usuario: %s", username)
                 user = authenticate_user(username, password)
                 if user:
                     session['logged_in'] = True
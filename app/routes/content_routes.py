@@ -1,8 +1,11 @@
 # Rutas de contenido
-from flask import render_template, request, redirect, url_for, session, jsonify
+from flask import render_template, request, redirect, url_for, session, jsonify, send_file, abort
 import os
+from werkzeug.exceptions import HTTPException
 from app.services.file_service import scan_cursos, scan_cursos_filtered, serve_file
 from app.services.video_service import get_video_info
+from app.services.course_index import get_index_stats
+from app.services import thumbnail_service
 from app.config import Config  # Importar Config
 
 def register_content_routes(app):
@@ -10,20 +13,12 @@ def register_content_routes(app):
     def inject_globals():
         try:
             cursos = scan_cursos()
-            # Contar cursos, secciones y archivos para el log
-            total_cursos = len(cursos)
-            total_secciones = sum(len(secciones) for secciones in cursos.values())
-            total_archivos = sum(
-                len(contenido['videos']) + len(contenido['pdfs'])
-                for curso in cursos.values()
-                for contenido in curso.values()
-            )
-            app.logger.info(
-                f"Cursos inyectados en globals:\n"
-                f"Cursos encontrados: {total_cursos}\n"
-                f"Secciones: {total_secciones}\n"
-                f"Archivos totales: {total_archivos}\n"
-                f"Ruta: {Config.CURSOS_DIR}"
+            # Los totales los mantiene el índice, no hace falta recorrer el árbol
+            stats = get_index_stats()
+            # Se ejecuta en cada render: formato diferido y solo en DEBUG
+            app.logger.debug(
+                "Cursos inyectados en globals: %s cursos, %s secciones, %s archivos (ruta: %s)",
+                stats['cursos'], stats['secciones'], stats['archivos'], Config.CURSOS_DIR
             )
             return {
                 'cursos': cursos,
@@ -45,18 +40,28 @@ def register_content_routes(app):
             selected_curso = request.args.get('curso')
 
             if search_query and request.method == 'POST':
-                app.logger.debug(f"Filtrando cursos con búsqueda: {search_query}")
+                app.logger.debug("Filtrando cursos con búsqueda: %s", search_query)
                 cursos = scan_cursos_filtered(search_query)
             else:
                 cursos = scan_cursos()
 
-            app.logger.debug(f"Cursos cargados en index: {cursos}")
+            app.logger.debug("Cursos cargados en index: %d", len(cursos))
             if not selected_curso and cursos:
                 selected_curso = list(cursos.keys())[0]
-                app.logger.debug(f"Curso seleccionado automáticamente: {selected_curso}")
+                app.logger.debug("Curso seleccionado automáticamente: %s", selected_curso)
+
+            # Pósters y sprites solo de los videos del curso mostrado, por (sección, video)
+            thumbnails = {}
+            if selected_curso in cursos:
+                keys = {
+                    os.path.join(Config.CURSOS_DIR, selected_curso, seccion, video): (seccion, video)
+                    for seccion, contenido in cursos[selected_curso].items()
+                    for video in contenido['videos']
+                }
+                thumbnails = {keys[path]: thumbs for path, thumbs in thumbnail_service.get_thumbnails(list(keys)).items()}
 
             return render_template('index.html', cursos=cursos, search_query=search_query, 
-                                selected_curso=selected_curso)
+                                selected_curso=selected_curso, thumbnails=thumbnails)
         except Exception as e:
             app.logger.error(f"Error en index: {str(e)}", exc_info=True)
             return "Error interno del servidor", 500
@@ -68,7 +73,7 @@ def register_content_routes(app):
                 app.logger.debug("Usuario no autenticado, redirigiendo a login")
                 return redirect(url_for('login'))
             file_path = os.path.join(Config.CURSOS_DIR, curso, seccion, filename)
-            app.logger.debug(f"Intentando inspeccionar: {file_path}")
+            app.logger.debug("Intentando inspeccionar: %s", file_path)
             if os.path.isfile(file_path):
                 video_info = get_video_info(file_path)
                 return jsonify(video_info)
@@ -85,8 +90,10 @@ def register_content_routes(app):
                 app.logger.debug("Usuario no autenticado, redirigiendo a login")
                 return redirect(url_for('login'))
             file_path = os.path.join(Config.CURSOS_DIR, curso, filename)
-            app.logger.debug(f"Intentando servir archivo sin sección: {file_path}")
+            app.logger.debug("Intentando servir archivo sin sección: %s", file_path)
             return serve_file(file_path, filename)
+        except HTTPException:
+            raise
         except Exception as e:
             app.logger.error(f"Error en serve_file_no_section: {str(e)}", exc_info=True)
             return "Error interno del servidor", 500
@@ -98,8 +105,33 @@ def register_content_routes(app):
                 app.logger.debug("Usuario no autenticado, redirigiendo a login")
                 return redirect(url_for('login'))
             file_path = os.path.join(Config.CURSOS_DIR, curso, seccion, filename)
-            app.logger.debug(f"Intentando servir archivo con sección: {file_path}")
+            app.logger.debug("Intentando servir archivo con sección: %s", file_path)
             return serve_file(file_path, filename)
+        except HTTPException:
+            raise
         except Exception as e:
             app.logger.error(f"Error en serve_file_with_section: {str(e)}", exc_info=True)
-            return "Error interno del servidor", 500
\ No newline at end of file
+            return "Error interno del servidor", 500
+
+    @app.route('/thumbs/<file_hash>/<name>', methods=['GET'])
+    def serve_thumbnail(file_hash, name):
+        try:
+            if not session.get('logged_in'):
+                return redirect(url_for('login'))
+            if name not in thumbnail_service.THUMB_FILES or not file_hash.isalnum():
+                abort(404)
+            path = thumbnail_service.get_thumb_path(file_hash, name)
+            if not os.path.isfile(path):
+                abort(404)
+            thumbnail_service.touch(file_hash)
+            # El contenido depende solo del hash: se puede cachear indefinidamente
+            response = send_file(path, max_age=31536000, conditional=True, etag=True)
+            response.cache_control.immutable = True
+            response.cache_control.private = True
+            response.cache_control.public = False
+            return response
+        except HTTPException:
+            raise
+        except Exception as e:
+            app.logger.error(f"Error en serve_thumbnail: {str(e)}", exc_info=True)
+            return "Error interno del servidor", 500
@@ -1,6 +1,7 @@
 # Rutas para visualización de logs
 from flask import render_template, request, redirect, url_for, session
-import os
+from app.config import Config  # Importar Config
+from app.services.log_service import query_logs
 
 def register_log_routes(app):
     @app.route('/admin/logs', methods=['GET'])
@@ -10,40 +11,24 @@ def register_log_routes(app):
                 app.logger.warning("Usuario no autenticado o no es admin, redirigiendo a index")
                 return redirect(url_for('index'))
 
-            # Obtener el nivel de filtro desde los parámetros de la URL
-            level_filter = request.args.get('level', '').upper()
+            # Filtros desde los parámetros de la URL
+            filters = {
+                'level': request.args.get('level', '').upper(),
+                'since': request.args.get('since', ''),
+                'until': request.args.get('until', ''),
+                'q': request.args.get('q', ''),
+            }
+            page = request.args.get('page', 1, type=int)
+            cursor = request.args.get('cursor')
 
-            # Leer el archivo de logs
-            log_file_path = '/app/logs/app.log'
-            logs = []
-            if os.path.exists(log_file_path):
-                with open(log_file_path, 'r') as f:
-                    for line in f:
-                        try:
-                            # Parsear cada línea del log
-                            # Formato: "2025-03-20 21:30:00,123 - flask - WARNING - Mensaje"
-                            parts = line.strip().split(' - ', 3)
-                            if len(parts) == 4:
-                                timestamp, name, level, message = parts
-                                # Filtrar por nivel si se especificó
-                                if level_filter and level != level_filter:
-                                    continue
-                                logs.append({
-                                    'timestamp': timestamp,
-                                    'name': name,
-                                    'level': level,
-                                    'message': message
-                                })
-                        except Exception as e:
-                            app.logger.warning(f"Error al parsear línea de log: {line} - {str(e)}")
-                            continue
-
-            # Ordenar los logs por fecha descendente (más recientes primero)
-            logs.sort(key=lambda x: x['timestamp'], reverse=True)
+            # Solo se leen los registros de la página pedida, del más reciente al más antiguo
+            result = query_logs(level=filters['level'], since=filters['since'], until=filters['until'],
+                                text=filters['q'], page=page, page_size=Config.LOG_PAGE_SIZE, cursor=cursor)
 
             app.logger.info("Renderizando la página de visualización de logs")
-            return render_template('logs.html', logs=logs, level=level_filter)
+            return render_template('logs.html', logs=result['logs'], level=filters['level'], filters=filters,
+                                   result=result, cursor=cursor)
 
         except Exception as e:
             app.logger.error(f"Error en view_logs: {str(e)}", exc_info=True)
-            return "Error interno del servidor", 500
\ No newline at end of file
+            return "Error interno del servidor", 500
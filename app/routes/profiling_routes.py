@@ -0,0 +1,69 @@
+# Rutas de administración del perfilado de peticiones
+from flask import render_template, request, redirect, url_for, session, send_file, abort
+from werkzeug.exceptions import HTTPException
+from app.services.profiling_service import (
+    MODES, clear_profiles, get_profile, get_profile_file, get_profiling_settings, list_profiles, set_profiling_settings
+)
+
+def register_profiling_routes(app):
+    @app.route('/admin/profiling', methods=['GET', 'POST'])
+    def profiling_list():
+        try:
+            if not session.get('logged_in') or not session.get('is_admin'):
+                app.logger.warning("Usuario no autenticado o no es admin, redirigiendo a index")
+                return redirect(url_for('index'))
+
+            if request.method == 'POST':
+                action = request.form.get('action')
+                if action == 'settings':
+                    settings = set_profiling_settings(
+                        enabled=request.form.get('enabled') == 'on',
+                        sample_rate=request.form.get('sample_rate', 0.1, type=float),
+                        mode=request.form.get('mode', 'cprofile'),
+                        endpoints=request.form.get('endpoints', ''),
+                    )
+                    app.logger.info(f"Ajustes de perfilado actualizados: {settings}")
+                elif action == 'clear':
+                    app.logger.info(f"Perfiles eliminados: {clear_profiles()}")
+                return redirect(url_for('profiling_list'))
+
+            endpoint = request.args.get('route', '')
+            profiles = list_profiles()
+            if endpoint:
+                profiles = [p for p in profiles if p['endpoint'] == endpoint]
+            return render_template('profiling.html', profiles=profiles, settings=get_profiling_settings(),
+                                   modes=MODES, endpoint=endpoint)
+        except Exception as e:
+            app.logger.error(f"Error en profiling_list: {str(e)}", exc_info=True)
+            return "Error interno del servidor", 500
+
+    @app.route('/admin/profiling/<profile_id>', methods=['GET'])
+    def profiling_detail(profile_id):
+        try:
+            if not session.get('logged_in') or not session.get('is_admin'):
+                return redirect(url_for('index'))
+            profile = get_profile(profile_id)
+            if profile is None:
+                abort(404)
+            return render_template('profile_detail.html', profile=profile)
+        except HTTPException:
+            raise
+        except Exception as e:
+            app.logger.error(f"Error en profiling_detail: {str(e)}", exc_info=True)
+            return "Error interno del servidor", 500
+
+    @app.route('/admin/profiling/<profile_id>/download/<extension>', methods=['GET'])
+    def profiling_download(profile_id, extension):
+        try:
+            if not session.get('logged_in') or not session.get('is_admin'):
+                return redirect(url_for('index'))
+            path = get_profile_file(profile_id, extension)
+            if path is None:
+                abort(404)
+            # .prof se abre con pstats, snakeviz o gprof2dot
+            return send_file(path, as_attachment=True, download_name=f"perfil-{profile_id}.{extension}")
+        except HTTPException:
+            raise
+        except Exception as e:
+            app.logger.error(f"Error en profiling_download: {str(e)}", exc_info=True)
+            return "Error interno del servidor", 500
@@ -1,9 +1,16 @@
 # Rutas de gestión de videos
-from flask import render_template, request, redirect, url_for, session
+from flask import render_template, request, redirect, url_for, session, Response
+import json
 import os
+import queue
 from app.__init__ import db
 from app.models.video_model import ConvertedVideo
-from app.services.video_service import conversion_status, video_candidates_cache, cache_status, set_queue_size, conversion_queue
+from app.services.video_service import (get_published_metadata_stats, get_cache_status, queue_conversion, queue_estimate,
+                                        get_course_profiles, set_course_profile)
+from app.services.conversion_planner import ENCODING_PROFILES, get_profile
+from app.services.file_service import scan_cursos
+from app.services import scheduler_service, progress_service, video_catalog, dedup_service
+from app.config import Config  # Importar Config
 
 def register_video_routes(app):
     @app.route('/admin/video-manager', methods=['GET', 'POST'])
@@ -12,42 +19,111 @@ def register_video_routes(app):
             if not session.get('logged_in') or not session.get('is_admin'):
                 app.logger.debug("Usuario no autenticado o no es admin, redirigiendo a index")
                 return redirect(url_for('index'))
-            archived_videos = ConvertedVideo.query.all()
-            videos = video_candidates_cache
-            converting_videos = [
-                {'file_path': path, **status} 
-                for path, status in conversion_status.items() 
-                if status['status'] in ['queued', 'processing']
-            ]
+            # Las tablas de videos escaneados y archivados se cargan por páginas desde /api/videos
+            converting_videos = scheduler_service.get_active_jobs()
             error = None
             if request.method == 'POST':
                 action = request.form.get('action')
                 if action == 'convert':
                     file_paths = request.form.getlist('file_paths')
+                    profile = request.form.get('profile') or None  # Vacío = perfil del curso
+                    job_states = scheduler_service.get_job_states()
+                    # Las peticiones del administrador no cuentan para MAX_QUEUE_SIZE
+                    rejected = []
                     for file_path in file_paths:
-                        if conversion_queue.full():
-                            error = "Cola llena, espera a que se procesen algunos videos."
-                            break
-                        if file_path not in conversion_status or conversion_status[file_path]['status'] == 'failed':
-                            conversion_queue.put(file_path)
-                            conversion_status[file_path] = {'status': 'queued', 'message': 'En cola', 'progress': 0, 'eta': 'Esperando...'}
+                        video = video_catalog.get_video(file_path)
+                        if video and (file_path not in job_states or job_states[file_path]['status'] in ('failed', 'queued')):
+                            if not queue_conversion(file_path, priority=scheduler_service.PRIORITY_ADMIN,
+                                                    duration=video.get('duration', 0), profile=profile):
+                                rejected.append(os.path.basename(file_path))
+                    if rejected:
+                        error = f"No se pudieron encolar: {', '.join(rejected)} (ya en curso o error de base de datos)."
+                    video_catalog.invalidate()  # Los estados han cambiado
                     app.logger.info(f"Archivos puestos en cola para conversión: {file_paths}")
-                    return redirect(url_for('manage_videos'))
+                    if not error:
+                        return redirect(url_for('manage_videos'))
+                elif action == 'estimate':
+                    # Sin perfil elegido se estiman todos para poder compararlos
+                    profile = request.form.get('profile')
+                    rejected = []
+                    for file_path in request.form.getlist('file_paths'):
+                        video = video_catalog.get_video(file_path)
+                        if video and not queue_estimate(file_path, [profile] if profile else None, duration=video.get('duration', 0)):
+                            rejected.append(os.path.basename(file_path))
+                    app.logger.info(f"Estimaciones de conversión solicitadas: {request.form.getlist('file_paths')}")
+                    if rejected:
+                        error = f"No se pudieron encolar las estimaciones de: {', '.join(rejected)} (ya hay una en curso)."
+                    else:
+                        return redirect(url_for('manage_videos'))
+                elif action == 'set_course_profile':
+                    curso = request.form.get('curso')
+                    if curso:
+                        set_course_profile(curso, request.form.get('profile'))
+                        app.logger.info(f"Perfil de codificación de {curso}: {request.form.get('profile') or 'por defecto'}")
                 elif action == 'set_queue_size':
                     new_size = int(request.form.get('queue_size', 5))
-                    set_queue_size(new_size)
+                    over = scheduler_service.set_queue_size(new_size)
                     app.logger.info(f"Tamaño de la cola actualizado a: {new_size}")
+                    if over:
+                        error = f"La cola tiene {over} trabajos por encima del nuevo límite; se procesarán igualmente."
+                elif action == 'pause':
+                    scheduler_service.pause()
+                    app.logger.info("Planificador de conversiones en pausa")
+                elif action == 'resume':
+                    scheduler_service.resume()
+                    app.logger.info("Planificador de conversiones reanudado")
+                elif action == 'dedup':
+                    # report, hardlink, reflink o purge; se ejecuta como trabajo en la cola de conversiones
+                    mode = request.form.get('mode', 'report')
+                    if mode == 'hardlink' and not Config.DEDUP_ALLOW_HARDLINK:
+                        error = "Los enlaces duros están desactivados (DEDUP_ALLOW_HARDLINK)."
+                    elif dedup_service.queue_dedup(mode):
+                        app.logger.info(f"Deduplicación solicitada (modo {mode})")
+                    else:
+                        error = "Ya hay una deduplicación en curso."
                 elif action == 'delete_archived':
                     archived_id = request.form.get('archived_id')
                     archived = ConvertedVideo.query.get(archived_id)
-                    if archived and os.path.isfile(archived.original_path):
-                        os.remove(archived.original_path)
+                    # Si la retención ya purgó el original solo queda borrar la fila
+                    if archived and (archived.original_purged_at or os.path.isfile(archived.original_path)):
+                        if os.path.isfile(archived.original_path):
+                            os.remove(archived.original_path)
                         db.session.delete(archived)
                         db.session.commit()
                         app.logger.info(f"Video archivado con ID {archived_id} eliminado")
-            return render_template('video_manager.html', videos=videos, archived_videos=archived_videos, 
-                                queue_size=conversion_queue.qsize(), max_queue_size=conversion_queue.maxsize, 
-                                error=error, cache_status=cache_status, converting_videos=converting_videos)
+            return render_template('video_manager.html',
+                                queue_size=scheduler_service.qsize(), max_queue_size=scheduler_service.get_max_queue_size(),
+                                scheduler=scheduler_service.get_scheduler_status(), 
+                                error=error, cache_status=get_cache_status(), converting_videos=converting_videos,
+                                metadata_stats=get_published_metadata_stats(),
+                                profiles=ENCODING_PROFILES, default_profile=get_profile()['name'],
+                                course_profiles=get_course_profiles(), course_names=sorted(scan_cursos()),
+                                estimates=scheduler_service.get_recent_results('estimate'),
+                                dedup_report=dedup_service.get_report(), dedup_jobs=scheduler_service.get_recent_results('dedup', 3),
+                                dedup_mode=Config.DEDUP_MODE, retention_days=Config.ARCHIVE_RETENTION_DAYS,
+                                allow_hardlink=Config.DEDUP_ALLOW_HARDLINK)
         except Exception as e:
             app.logger.error(f"Error en manage_videos: {str(e)}", exc_info=True)
-            return "Error interno del servidor", 500
\ No newline at end of file
+            return "Error interno del servidor", 500
+
+    @app.route('/admin/video-manager/events', methods=['GET'])
+    def video_manager_events():
+        # Server-Sent Events: estado de la cola sin recargar la página (un hilo por proceso consulta la base de datos)
+        if not session.get('logged_in') or not session.get('is_admin'):
+            return "No autorizado", 403
+
+        def stream():
+            subscriber = progress_service.subscribe(app)
+            try:
+                yield "retry: 5000\n\n"
+                while True:
+                    try:
+                        snapshot = subscriber.get(timeout=15)
+                        yield f"event: jobs\ndata: {json.dumps(snapshot)}\n\n"
+                    except queue.Empty:
+                        yield ": keepalive\n\n"
+            finally:
+                progress_service.unsubscribe(subscriber)
+
+        return Response(stream(), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
@@ -0,0 +1,135 @@
+# Planificador de conversiones: elige la operación más barata que deja el video reproducible en el navegador
+import os
+from app.config import Config  # Importar Config
+from app.services.mp4_parser import is_faststart
+
+# Operaciones de menor a mayor coste
+OPERATIONS = ('none', 'faststart', 'remux', 'audio', 'reencode')
+
+VIDEO_EXTENSIONS = ('.mp4', '.mkv', '.mov', '.m4v')
+BROWSER_VIDEO_CODECS = ('h264',)
+BROWSER_AUDIO_CODECS = ('aac', 'mp3')
+BROWSER_PIX_FMTS = ('yuv420p', 'yuvj420p')
+# Perfiles H.264 que los navegadores no decodifican (10 bits, 4:2:2, 4:4:4)
+UNSUPPORTED_H264_PROFILES = ('High 10', 'High 4:2:2', 'High 4:4:4 Predictive', 'High 10 Intra', 'High 4:2:2 Intra')
+AUDIO_BITRATE = '160k'
+
+# Perfiles de recodificación (solo afectan a 'reencode'; copiar o reempaquetar no cambia la calidad).
+# crf: calidad constante de libx264; maxrate_kbps limita los picos (bufsize = 2x); max_height reduce la
+# resolución sin ampliar nunca. Las clases son sobre todo diapositivas y pizarra: mucha imagen fija, poco
+# movimiento y voz, que admiten CRF altos, presets lentos y menos bitrate de audio sin pérdida visible.
+ENCODING_PROFILES = {
+    'standard': {
+        'label': 'Estándar (calidad por defecto de libx264)',
+        'crf': 23, 'preset': 'fast', 'tune': None, 'maxrate_kbps': None, 'max_height': None,
+        'audio_bitrate': AUDIO_BITRATE,
+    },
+    'lecture': {
+        'label': 'Clase grabada (cámara y pizarra)',
+        'crf': 26, 'preset': 'medium', 'tune': None, 'maxrate_kbps': 2500, 'max_height': 1080,
+        'audio_bitrate': '128k',
+    },
+    'slides': {
+        'label': 'Diapositivas o pantalla con voz',
+        'crf': 28, 'preset': 'slow', 'tune': 'stillimage', 'maxrate_kbps': 1500, 'max_height': 1080,
+        'audio_bitrate': '96k',
+    },
+    'compact': {
+        'label': 'Compacto (720p)',
+        'crf': 28, 'preset': 'medium', 'tune': None, 'maxrate_kbps': 1200, 'max_height': 720,
+        'audio_bitrate': '96k',
+    },
+}
+
+def is_video_file(filename):
+    return filename.lower().endswith(VIDEO_EXTENSIONS)
+
+def get_output_path(file_path):
+    # Los contenedores distintos de MP4 se publican como <nombre>.mp4 en la misma carpeta
+    return os.path.splitext(file_path)[0] + '.mp4'
+
+def plan_conversion(file_path, video_info):
+    # Devuelve {'operation', 'reasons', 'output_path'}; cada motivo explica por qué no basta una operación más barata
+    streams = video_info.get('streams') or []
+    video_stream = next((s for s in streams if s.get('codec_type') == 'video'), {})
+    audio_streams = [s for s in streams if s.get('codec_type') == 'audio']
+    video_codec = video_info.get('video_codec') or video_stream.get('codec_name')
+    reasons = []
+    reencode_video = False
+    transcode_audio = False
+
+    if video_codec not in BROWSER_VIDEO_CODECS:
+        reencode_video = True
+        reasons.append(f"códec de video {video_codec} no reproducible en navegador")
+    else:
+        pix_fmt = video_stream.get('pix_fmt')
+        if pix_fmt and pix_fmt not in BROWSER_PIX_FMTS:
+            reencode_video = True
+            reasons.append(f"formato de píxel {pix_fmt} no soportado (se requiere yuv420p)")
+        profile = video_stream.get('profile')
+        if profile in UNSUPPORTED_H264_PROFILES:
+            reencode_video = True
+            reasons.append(f"perfil H.264 {profile} no soportado")
+
+    incompatible_audio = sorted({s.get('codec_name') for s in audio_streams
+                                 if s.get('codec_name') not in BROWSER_AUDIO_CODECS})
+    if incompatible_audio:
+        transcode_audio = True
+        reasons.append(f"audio {', '.join(str(c) for c in incompatible_audio)} no compatible, se transcodifica a AAC")
+
+    is_mp4 = file_path.lower().endswith('.mp4')
+    if not is_mp4:
+        reasons.append(f"contenedor {os.path.splitext(file_path)[1]} se reempaqueta en MP4")
+
+    if reencode_video:
+        operation = 'reencode'
+    elif transcode_audio:
+        operation = 'audio'
+    elif not is_mp4:
+        operation = 'remux'
+    elif (video_info['faststart'] if 'faststart' in video_info else is_faststart(file_path)) is False:
+        operation = 'faststart'
+        reasons.append("el átomo moov está al final: se mueve al principio para arrancar antes")
+    else:
+        operation = 'none'
+        reasons.append("compatible: no requiere conversión")
+    return {
+        'operation': operation,
+        'reasons': reasons,
+        'transcode_audio': transcode_audio,
+        'output_path': get_output_path(file_path),
+    }
+
+def get_profile(name=None):
+    # Perfil por nombre con su nombre incluido; uno desconocido cae en ENCODING_PROFILE y después en 'standard'
+    for candidate in (name, Config.ENCODING_PROFILE, 'standard'):
+        if candidate in ENCODING_PROFILES:
+            return dict(ENCODING_PROFILES[candidate], name=candidate)
+
+def video_encode_args(threads, profile=None):
+    profile = profile or get_profile()
+    args = ['-c:v', 'libx264', '-preset', profile['preset'], '-crf', str(profile['crf'])]
+    if profile['tune']:
+        args += ['-tune', profile['tune']]
+    if profile['maxrate_kbps']:
+        args += ['-maxrate', f"{profile['maxrate_kbps']}k", '-bufsize', f"{profile['maxrate_kbps'] * 2}k"]
+    if profile['max_height']:
+        # Solo reduce: min() deja igual los videos que ya son más pequeños; -2 mantiene el ancho par
+        args += ['-vf', f"scale=-2:'min({profile['max_height']},ih)'"]
+    return args + ['-pix_fmt', 'yuv420p', '-threads', str(threads)]
+
+def audio_args(plan, profile=None):
+    if plan['transcode_audio']:
+        return ['-c:a', 'aac', '-b:a', (profile or get_profile())['audio_bitrate']]
+    return ['-c:a', 'copy']
+
+def build_ffmpeg_command(file_path, plan, output_path, threads, profile=None):
+    # Solo el primer video (portadas y subtítulos de MKV no caben en MP4) y todas las pistas de audio
+    command = ['ffmpeg', '-y', '-i', file_path, '-map', '0:v:0', '-map', '0:a?']
+    if plan['operation'] == 'reencode':
+        command += video_encode_args(threads, profile)
+    else:
+        command += ['-c:v', 'copy']
+    command += audio_args(plan, profile)
+    command += ['-movflags', '+faststart', '-f', 'mp4', '-progress', 'pipe:1', output_path]
+    return command
@@ -0,0 +1,213 @@
+# Índice en memoria del árbol de cursos
+import os
+import threading
+import time
+from flask import current_app
+from app.config import Config  # Importar Config
+from app.services.hls_service import HLS_SUFFIX, get_hls_dirname
+from app.services.metrics_service import observe
+
+# Estado global del índice
+# _dirs: ruta relativa -> {'mtime', 'subdirs', 'videos', 'pdfs'} ('.' es la raíz)
+_dirs = {}
+_lock = threading.RLock()
+_listeners = []
+_watcher_started = False
+cursos_index = {}
+index_stats = {
+    'status': 'empty',
+    'build_seconds': None,
+    'last_refresh_seconds': None,
+    'last_refresh_at': None,
+    'refresh_count': 0,
+    'last_changed_dirs': 0,
+    'cursos': 0,
+    'secciones': 0,
+    'archivos': 0,
+}
+
+def is_excluded(rel_path):
+    # Los paquetes HLS (<lección>_hls) cuelgan de la sección pero no son secciones
+    return '_archive' in rel_path or '_temp' in rel_path \
+        or any(part.endswith(HLS_SUFFIX) for part in rel_path.split(os.sep))
+
+def _scan_dir(rel_path):
+    abs_path = os.path.join(Config.CURSOS_DIR, rel_path)
+    mtime = os.stat(abs_path).st_mtime_ns
+    subdirs, videos, pdfs = [], [], []
+    with os.scandir(abs_path) as entries:
+        for entry in entries:
+            if entry.is_dir() and not entry.is_symlink():
+                subdirs.append(entry.name)
+            elif entry.name.endswith('.mp4') and entry.is_file():
+                videos.append(entry.name)
+            elif entry.name.endswith('.pdf') and entry.is_file():
+                pdfs.append(entry.name)
+    return {'mtime': mtime, 'subdirs': sorted(subdirs), 'videos': sorted(videos), 'pdfs': sorted(pdfs)}
+
+def _child_path(rel_path, name):
+    return name if rel_path == '.' else os.path.join(rel_path, name)
+
+def _scan_tree(rel_path, changed):
+    # Escanea rel_path y todos sus subdirectorios que aún no estén en el índice
+    pending = [rel_path]
+    while pending:
+        current = pending.pop()
+        if current != '.' and is_excluded(current):
+            continue
+        try:
+            _dirs[current] = _scan_dir(current)
+        except OSError as e:
+            current_app.logger.warning(f"No se pudo leer el directorio {current}: {str(e)}")
+            _dirs.pop(current, None)
+            continue
+        changed.append(current)
+        for name in _dirs[current]['subdirs']:
+            child = _child_path(current, name)
+            if child not in _dirs:
+                pending.append(child)
+
+def _remove_tree(rel_path, removed):
+    prefix = rel_path + os.sep
+    for path in [p for p in _dirs if p == rel_path or p.startswith(prefix)]:
+        del _dirs[path]
+        removed.append(path)
+
+def _rebuild_snapshot():
+    global cursos_index
+    cursos = {}
+    total_secciones = 0
+    total_archivos = 0
+    for rel_path in sorted(_dirs, key=lambda p: p.split(os.sep)):
+        if rel_path == '.':
+            continue
+        path_parts = rel_path.split(os.sep)
+        curso = path_parts[0]
+        seccion = '/'.join(path_parts[1:]) or ''
+        entry = _dirs[rel_path]
+        subdirs = set(entry['subdirs'])
+        cursos.setdefault(curso, {})[seccion] = {
+            'videos': entry['videos'],
+            'pdfs': entry['pdfs'],
+            # Lecciones con paquete HLS publicado (el directorio solo aparece cuando está completo)
+            'hls': [v for v in entry['videos'] if get_hls_dirname(v) in subdirs],
+        }
+        total_secciones += 1
+        total_archivos += len(entry['videos']) + len(entry['pdfs'])
+    # Se sustituye la referencia completa: los lectores nunca ven un índice a medio construir
+    cursos_index = cursos
+    index_stats.update({'cursos': len(cursos), 'secciones': total_secciones, 'archivos': total_archivos})
+
+def _notify(changed, removed):
+    for listener in list(_listeners):
+        try:
+            listener(changed, removed)
+        except Exception as e:
+            current_app.logger.error(f"Error en listener del índice de cursos: {str(e)}", exc_info=True)
+
+def register_listener(listener):
+    # listener(changed_dirs, removed_dirs) se llama tras cada cambio del índice
+    with _lock:
+        if listener not in _listeners:
+            _listeners.append(listener)
+
+def build_course_index():
+    with _lock:
+        start = time.perf_counter()
+        if not os.path.exists(Config.CURSOS_DIR):
+            current_app.logger.error(f"El directorio {Config.CURSOS_DIR} no existe")
+            index_stats['status'] = 'error'
+            return cursos_index
+        if not os.access(Config.CURSOS_DIR, os.R_OK):
+            current_app.logger.error(f"No hay permisos de lectura para {Config.CURSOS_DIR}")
+            index_stats['status'] = 'error'
+            return cursos_index
+        removed = list(_dirs)
+        _dirs.clear()
+        changed = []
+        _scan_tree('.', changed)
+        _rebuild_snapshot()
+        index_stats['build_seconds'] = round(time.perf_counter() - start, 4)
+        observe('scan_cursos_duration_seconds', index_stats['build_seconds'], kind='build')
+        index_stats['status'] = 'ready'
+        current_app.logger.info(
+            f"Índice de cursos construido en {index_stats['build_seconds']}s: "
+            f"{index_stats['cursos']} cursos, {index_stats['secciones']} secciones, "
+            f"{index_stats['archivos']} archivos"
+        )
+        _notify(changed, [p for p in removed if p not in _dirs])
+        return cursos_index
+
+def refresh_course_index():
+    # Solo se relistan los directorios cuyo mtime ha cambiado (altas/bajas de archivos o subdirectorios)
+    with _lock:
+        if index_stats['status'] != 'ready':
+            build_course_index()
+            return [], []
+        start = time.perf_counter()
+        changed, removed = [], []
+        for rel_path in sorted(_dirs, key=lambda p: p.count(os.sep)):
+            if rel_path not in _dirs:
+                continue  # Eliminado junto con su directorio padre
+            try:
+                mtime = os.stat(os.path.join(Config.CURSOS_DIR, rel_path)).st_mtime_ns
+            except OSError:
+                _remove_tree(rel_path, removed)
+                continue
+            if mtime == _dirs[rel_path]['mtime']:
+                continue
+            old_subdirs = _dirs[rel_path]['subdirs']
+            _scan_tree(rel_path, changed)
+            if rel_path not in _dirs:
+                _remove_tree(rel_path, removed)
+                continue
+            for name in set(old_subdirs) - set(_dirs[rel_path]['subdirs']):
+                _remove_tree(_child_path(rel_path, name), removed)
+        if changed or removed:
+            _rebuild_snapshot()
+        index_stats['last_refresh_seconds'] = round(time.perf_counter() - start, 4)
+        observe('scan_cursos_duration_seconds', index_stats['last_refresh_seconds'], kind='refresh')
+        index_stats['last_refresh_at'] = time.time()
+        index_stats['refresh_count'] += 1
+        index_stats['last_changed_dirs'] = len(changed) + len(removed)
+        if changed or removed:
+            current_app.logger.info(
+                f"Índice de cursos actualizado en {index_stats['last_refresh_seconds']}s: "
+                f"{len(changed)} directorios cambiados, {len(removed)} eliminados"
+            )
+            _notify(changed, removed)
+        return changed, removed
+
+def get_cursos():
+    if index_stats['status'] != 'ready':
+        build_course_index()
+    return cursos_index
+
+def get_dir_entry(rel_path):
+    return _dirs.get(rel_path)
+
+def get_dir_mtimes():
+    with _lock:
+        return {rel_path: entry['mtime'] for rel_path, entry in _dirs.items()}
+
+def get_index_stats():
+    return dict(index_stats)
+
+def watch_course_index(app):
+    while True:
+        with app.app_context():
+            try:
+                # La primera vuelta construye el índice (si ninguna petición lo ha hecho ya)
+                refresh_course_index()
+            except Exception as e:
+                app.logger.error(f"Error al refrescar el índice de cursos: {str(e)}", exc_info=True)
+        time.sleep(Config.CURSOS_INDEX_REFRESH_INTERVAL)
+
+def start_course_index(app):
+    # Idempotente; no bloquea el arranque: el índice se construye en el hilo de refresco
+    global _watcher_started
+    with _lock:
+        if _watcher_started:
+            return
+        _watcher_started = True
+    threading.Thread(target=watch_course_index, args=(app,), daemon=True).start()
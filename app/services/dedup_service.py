@@ -0,0 +1,375 @@
+# Deduplicación de la biblioteca: el mismo video copiado en varios cursos y los originales de _archive se
+# agrupan por tamaño, huella rápida y SHA-256 (los de video_service, calculados solo donde hace falta) para
+# informar del espacio recuperable y, si se pide, sustituir las copias por enlaces duros o reflinks.
+# También aplica la retención de los originales archivados cuya conversión sigue verificada.
+import errno
+import fcntl
+import filecmp
+import os
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from app.__init__ import db
+from app.config import Config  # Importar Config
+from app.models.video_model import ConvertedVideo, VideoMetadata
+from app.services import hls_service, scheduler_service, throttle_service
+from app.services.conversion_planner import is_video_file
+from app.services.metrics_service import inc
+from app.services.settings_service import get_setting, get_setting_with_age, set_setting
+from flask import current_app
+
+MODES = ('report', 'hardlink', 'reflink', 'purge')
+FICLONE = 0x40049409  # ioctl de Linux para clonar un archivo compartiendo bloques (btrfs, XFS con reflink, bcachefs)
+REPORT_TOP_GROUPS = 20
+LOOKUP_CHUNK = 500  # Rutas por consulta IN
+CHECK_SECONDS = 3600  # Cada cuánto se mira si toca el mantenimiento periódico
+
+_started = False
+dedup_stats = {'reclaimable_bytes': None}  # Del último informe de este proceso
+
+def _is_archived(path):
+    return os.path.commonpath([os.path.abspath(path), os.path.abspath(Config.ARCHIVE_DIR)]) == os.path.abspath(Config.ARCHIVE_DIR)
+
+def _walk_library():
+    # Videos de los cursos y de _archive; _temp y los paquetes HLS no se recorren
+    temp_dir = os.path.abspath(Config.TEMP_DIR)
+    for root, dirs, filenames in os.walk(Config.CURSOS_DIR):
+        dirs[:] = [d for d in dirs if not hls_service.is_hls_dir(d) and os.path.abspath(os.path.join(root, d)) != temp_dir]
+        if os.path.relpath(root, Config.CURSOS_DIR) == '.':
+            continue
+        for filename in filenames:
+            if is_video_file(filename):
+                yield os.path.join(root, filename)
+
+def _wait_while_suspended():
+    # Hashear y comparar es E/S pura: con las conversiones detenidas por carga de servido también se espera
+    while throttle_service.is_suspended():
+        time.sleep(Config.THROTTLE_CHECK_INTERVAL)
+
+def _lookup(model, column, paths):
+    rows = {}
+    for start in range(0, len(paths), LOOKUP_CHUNK):
+        chunk = paths[start:start + LOOKUP_CHUNK]
+        rows.update((getattr(row, column), row) for row in model.query.filter(getattr(model, column).in_(chunk)).order_by(model.id))
+    return rows
+
+def _fingerprints(entries, metadata):
+    # Huella de la caché si el archivo no ha cambiado; si no (p. ej. originales de _archive), se calcula
+    from app.services.video_service import _stat_matches, compute_fingerprint
+    result = {}
+    for path, st in entries:
+        meta = metadata.get(path)
+        if meta is not None and meta.fingerprint and _stat_matches(meta, st):
+            result[path] = meta.fingerprint
+        else:
+            try:
+                result[path] = compute_fingerprint(path)
+            except OSError:
+                continue
+    return result
+
+def _full_hashes(entries, archived):
+    # Un hash por inodo: las rutas ya enlazadas entre sí no se leen dos veces
+    from app.services.video_service import get_file_hash, get_full_hash
+    by_inode = {}
+    result = {}
+    for path, st in entries:
+        inode = (st.st_dev, st.st_ino)
+        if inode not in by_inode:
+            _wait_while_suspended()
+            row = archived.get(path)
+            if row is not None and row.original_size == st.st_size:
+                by_inode[inode] = row.original_hash  # Hash calculado al convertir; se verifica byte a byte antes de enlazar
+            elif _is_archived(path):
+                by_inode[inode] = get_file_hash(path)
+            else:
+                by_inode[inode] = get_full_hash(path)
+        if by_inode[inode]:
+            result[path] = by_inode[inode]
+    return result
+
+def find_duplicates(on_progress=None):
+    # Grupos de archivos idénticos: [{'hash', 'size', 'files': [(ruta, stat)]}] con más de un inodo o enlazados
+    by_size = defaultdict(list)
+    scanned = 0
+    for path in _walk_library():
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        scanned += 1
+        if st.st_size >= Config.DEDUP_MIN_SIZE_MB * 1024 * 1024:
+            by_size[st.st_size].append((path, st))
+    # Mismo tamaño es condición necesaria; la huella (tres bloques) descarta casi todo lo demás sin leerlo entero
+    candidates = [entries for entries in by_size.values() if len(entries) > 1]
+    paths = [path for entries in candidates for path, _ in entries]
+    metadata = _lookup(VideoMetadata, 'file_path', paths)
+    archived = _lookup(ConvertedVideo, 'original_path', [path for path in paths if _is_archived(path)])
+    groups = []
+    for index, entries in enumerate(candidates):
+        if on_progress:
+            on_progress(index, len(candidates))
+        if len({(st.st_dev, st.st_ino) for _, st in entries}) > 1:
+            fingerprints = _fingerprints(entries, metadata)
+            by_fingerprint = defaultdict(list)
+            for path, st in entries:
+                if path in fingerprints:
+                    by_fingerprint[fingerprints[path]].append((path, st))
+            subsets = [subset for subset in by_fingerprint.values() if len(subset) > 1]
+        else:
+            subsets = [entries]  # Ya son el mismo inodo: solo cuentan como enlazados
+        for subset in subsets:
+            hashes = _full_hashes(subset, archived) if len({(st.st_dev, st.st_ino) for _, st in subset}) > 1 \
+                else dict.fromkeys((path for path, _ in subset), None)
+            by_hash = defaultdict(list)
+            for path, st in subset:
+                if path in hashes:
+                    by_hash[hashes[path]].append((path, st))
+            for file_hash, files in by_hash.items():
+                if len(files) > 1:
+                    groups.append({'hash': file_hash, 'size': files[0][1].st_size, 'files': files})
+    return scanned, groups
+
+def _group_summary(group):
+    # Por dispositivo, todos los inodos menos uno se pueden enlazar; las copias en otro dispositivo no
+    inodes = defaultdict(set)
+    for _, st in group['files']:
+        inodes[st.st_dev].add(st.st_ino)
+    linkable = sum(len(device_inodes) - 1 for device_inodes in inodes.values())
+    return {
+        'hash': group['hash'],
+        'size': group['size'],
+        'paths': sorted(path for path, _ in group['files']),
+        'reclaimable_bytes': group['size'] * linkable,
+        'cross_device_bytes': group['size'] * (len(inodes) - 1),
+        'linked_bytes': group['size'] * (len(group['files']) - sum(len(device_inodes) for device_inodes in inodes.values())),
+    }
+
+def build_report(scanned, groups, started):
+    summaries = sorted((_group_summary(group) for group in groups), key=lambda s: s['reclaimable_bytes'], reverse=True)
+    return {
+        'generated_at': datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S'),
+        'duration_seconds': round(time.monotonic() - started, 1),
+        'files_scanned': scanned,
+        'groups': sum(1 for s in summaries if s['reclaimable_bytes']),
+        'duplicate_files': sum(len(s['paths']) - 1 for s in summaries if s['reclaimable_bytes']),
+        'reclaimable_bytes': sum(s['reclaimable_bytes'] for s in summaries),
+        'cross_device_bytes': sum(s['cross_device_bytes'] for s in summaries),
+        'linked_bytes': sum(s['linked_bytes'] for s in summaries),
+        'top': [s for s in summaries if s['reclaimable_bytes']][:REPORT_TOP_GROUPS],
+    }
+
+def clone_file(source_path, target_path):
+    with open(source_path, 'rb') as source, open(target_path, 'wb') as target:
+        fcntl.ioctl(target.fileno(), FICLONE, source.fileno())
+
+def _replace_with_link(canonical, path, method):
+    # El enlace se crea al lado con otro nombre y se renombra encima: nunca hay un momento sin archivo.
+    # El nombre temporal no tiene extensión de video, así que ni el escaneo ni la ingesta lo recogen
+    directory, name = os.path.split(path)
+    temp_path = os.path.join(directory, f".{name}.dedup-{os.getpid()}")
+    try:
+        if method == 'reflink':
+            # Copia con bloques compartidos: conserva el inodo propio, así que se mantienen permisos y mtime
+            st = os.stat(path)
+            clone_file(canonical, temp_path)
+            os.chmod(temp_path, st.st_mode & 0o7777)
+            os.utime(temp_path, ns=(st.st_atime_ns, st.st_mtime_ns))
+        else:
+            os.link(canonical, temp_path)
+        os.replace(temp_path, path)
+    finally:
+        if os.path.lexists(temp_path):
+            os.remove(temp_path)
+
+def _refresh_metadata(path, file_hash):
+    # El contenido no cambia: se conservan huella y ffprobe, solo se actualiza (tamaño, mtime, inodo)
+    meta = VideoMetadata.query.filter_by(file_path=path).first()
+    if meta is None:
+        return
+    st = os.stat(path)
+    meta.size, meta.mtime_ns, meta.inode = st.st_size, st.st_mtime_ns, st.st_ino
+    meta.file_hash = file_hash
+    db.session.commit()
+
+def _canonical(entries):
+    # El inodo con más enlaces, preferiblemente el de un curso (el que se sirve y ya está en la caché de páginas)
+    return min(entries, key=lambda e: (-e[1].st_nlink, _is_archived(e[0]), e[0]))
+
+def compact(groups, method, on_progress=None):
+    busy = {job['file_path'] for job in scheduler_service.get_active_jobs()}
+    recent = time.time() - Config.INGEST_STABLE_SECONDS  # Un archivo modificado hace nada puede estar copiándose
+    result = {'linked_files': 0, 'linked_bytes': 0, 'skipped': 0, 'unsupported': False}
+    for index, group in enumerate(groups):
+        if on_progress:
+            on_progress(index, len(groups))
+        by_device = defaultdict(list)
+        for path, st in group['files']:
+            by_device[st.st_dev].append((path, st))
+        for entries in by_device.values():
+            canonical_path, canonical_st = _canonical(entries)
+            replaced = defaultdict(int)
+            for path, st in entries:
+                if st.st_ino == canonical_st.st_ino:
+                    continue
+                _wait_while_suspended()
+                try:
+                    current = os.stat(path)
+                    changed = (current.st_ino, current.st_size, current.st_mtime_ns) != (st.st_ino, st.st_size, st.st_mtime_ns)
+                    if path in busy or changed or current.st_mtime >= recent:
+                        result['skipped'] += 1
+                        continue
+                    # El hash del archivo puede venir de la base de datos: antes de enlazar se comparan los bytes
+                    if not filecmp.cmp(canonical_path, path, shallow=False):
+                        current_app.logger.warning(f"Deduplicación: {path} ya no coincide con {canonical_path}, se omite")
+                        result['skipped'] += 1
+                        continue
+                    _replace_with_link(canonical_path, path, method)
+                except OSError as e:
+                    if e.errno in (errno.EXDEV, errno.EOPNOTSUPP, errno.ENOTTY, errno.EINVAL, errno.EPERM, errno.EMLINK):
+                        if method == 'reflink' and e.errno in (errno.EOPNOTSUPP, errno.ENOTTY, errno.EINVAL):
+                            result['unsupported'] = True
+                            current_app.logger.warning(f"Deduplicación: el sistema de archivos no admite reflinks ({e})")
+                            return result
+                        current_app.logger.info(f"Deduplicación: no se pudo enlazar {path} ({e})")
+                        result['skipped'] += 1
+                        continue
+                    raise
+                _refresh_metadata(path, group['hash'])
+                result['linked_files'] += 1
+                replaced[st.st_ino] += 1
+                current_app.logger.info(f"Deduplicación: {path} -> {canonical_path} ({method})")
+            # El espacio se libera cuando el inodo sustituido pierde su último enlace
+            for path, st in entries:
+                if replaced.get(st.st_ino) == st.st_nlink:
+                    result['linked_bytes'] += st.st_size
+                    replaced[st.st_ino] = 0
+    inc('dedup_linked_bytes_total', result['linked_bytes'], method=method)
+    return result
+
+def purge_archive():
+    # Retención de _archive: tras ARCHIVE_RETENTION_DAYS se borra el original si su conversión sigue en disco
+    # y su SHA-256 coincide con el registrado. La fila se conserva (el hash del original sigue sirviendo para
+    # reutilizar la conversión) marcada con original_purged_at
+    from app.services.video_service import get_full_hash
+    result = {'purged': 0, 'purged_bytes': 0, 'skipped': 0}
+    if Config.ARCHIVE_RETENTION_DAYS <= 0:
+        return result
+    cutoff = datetime.utcnow() - timedelta(days=Config.ARCHIVE_RETENTION_DAYS)
+    rows = ConvertedVideo.query.filter(ConvertedVideo.original_purged_at.is_(None), ConvertedVideo.created_at < cutoff,
+                                       ConvertedVideo.converted_hash.isnot(None)).order_by(ConvertedVideo.id).all()
+    for row in rows:
+        _wait_while_suspended()
+        if not _is_archived(row.original_path) or not os.path.isfile(row.original_path):
+            continue
+        try:
+            verified = os.path.getsize(row.converted_path) == row.size and get_full_hash(row.converted_path) == row.converted_hash
+        except OSError:
+            verified = False
+        if not verified:
+            current_app.logger.warning(f"Retención: no se purga {row.original_path}, la conversión {row.converted_path} no se puede verificar")
+            result['skipped'] += 1
+            continue
+        st = os.stat(row.original_path)
+        os.remove(row.original_path)
+        row.original_purged_at = datetime.utcnow()
+        db.session.commit()
+        freed = st.st_size if st.st_nlink == 1 else 0  # Si sigue enlazado en otro sitio no libera nada
+        result['purged'] += 1
+        result['purged_bytes'] += freed
+        current_app.logger.info(f"Retención: purgado {row.original_path} ({freed} bytes liberados)")
+    inc('archive_purged_bytes_total', result['purged_bytes'])
+    return result
+
+def _format_size(size):
+    return f"{size / (1024 ** 3):.2f} GB" if size >= 1024 ** 3 else f"{size / (1024 ** 2):.1f} MB"
+
+def run_dedup(file_path, payload=None):
+    # Trabajo 'dedup' (file_path es CURSOS_DIR): purga por retención, informe y, según el modo, compactación
+    from app.services.video_service import conversion_status
+    payload = payload or {}
+    mode = resolve_mode(payload.get('mode'))
+    started = time.monotonic()
+    messages = []
+    result = {'mode': mode}
+    try:
+        if mode == 'purge' or payload.get('purge'):
+            conversion_status[file_path] = {'status': 'processing', 'message': 'Aplicando la retención de _archive',
+                                            'progress': 0, 'eta': 'N/A'}
+            result['purge'] = purge_archive()
+            messages.append(f"{result['purge']['purged']} originales purgados ({_format_size(result['purge']['purged_bytes'])})")
+        if mode != 'purge':
+            def on_progress(verb, weight, offset):
+                def update(index, total):
+                    conversion_status[file_path] = {'status': 'processing', 'message': f"{verb} ({index + 1}/{total})",
+                                                    'progress': int(offset + weight * index / max(1, total)), 'eta': 'N/A'}
+                return update
+            scanned, groups = find_duplicates(on_progress('Buscando duplicados', 50 if mode != 'report' else 99, 0))
+            if mode in ('hardlink', 'reflink'):
+                result['compact'] = compact(groups, mode, on_progress('Enlazando duplicados', 49, 50))
+                messages.append(f"{result['compact']['linked_files']} archivos enlazados "
+                                f"({_format_size(result['compact']['linked_bytes'])} liberados)"
+                                + (', reflinks no admitidos' if result['compact']['unsupported'] else ''))
+                scanned, groups = find_duplicates()  # El informe refleja lo que queda tras compactar
+            report = build_report(scanned, groups, started)
+            set_setting('dedup.report', report)
+            dedup_stats['reclaimable_bytes'] = report['reclaimable_bytes']
+            result['report'] = {key: value for key, value in report.items() if key != 'top'}
+            messages.insert(0, f"{report['groups']} grupos duplicados, {_format_size(report['reclaimable_bytes'])} recuperables")
+        conversion_status[file_path] = {'status': 'completed', 'message': '; '.join(messages) or 'Sin cambios',
+                                        'progress': 100, 'eta': '0s', 'result': result}
+    except Exception as e:
+        db.session.rollback()
+        conversion_status[file_path] = {'status': 'failed', 'message': str(e), 'progress': 0, 'eta': 'N/A'}
+        current_app.logger.error(f"Error en run_dedup: {str(e)}", exc_info=True)
+    # En todos los modos (el de 'purge' no escribe informe): dedup_loop mide el intervalo desde aquí
+    set_setting('dedup.last_run', {'mode': mode, 'finished_at': datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')})
+
+def resolve_mode(mode):
+    # Sin DEDUP_ALLOW_HARDLINK el modo 'hardlink' se queda en informe
+    if mode == 'hardlink' and not Config.DEDUP_ALLOW_HARDLINK:
+        return 'report'
+    return mode if mode in MODES else 'report'
+
+def queue_dedup(mode='report', priority=scheduler_service.PRIORITY_ADMIN, purge=False):
+    return scheduler_service.submit(Config.CURSOS_DIR, priority=priority, job_type='dedup',
+                                    payload={'mode': resolve_mode(mode), 'purge': purge})
+
+def get_report():
+    return get_setting('dedup.report')
+
+def maintenance_due():
+    _, age = get_setting_with_age('dedup.last_run')
+    return age is None or age >= Config.DEDUP_INTERVAL_HOURS * 3600
+
+def dedup_loop(app):
+    # Mantenimiento periódico como trabajo automático: respeta las ventanas de conversión y la regulación
+    while True:
+        with app.app_context():
+            try:
+                if maintenance_due():
+                    mode = resolve_mode(Config.DEDUP_MODE)
+                    if mode != Config.DEDUP_MODE:
+                        app.logger.warning(f"DEDUP_MODE={Config.DEDUP_MODE} no permitido, se usa {mode} "
+                                           "(los enlaces duros requieren DEDUP_ALLOW_HARDLINK)")
+                    if queue_dedup(mode, scheduler_service.PRIORITY_AUTO, purge=Config.ARCHIVE_RETENTION_DAYS > 0):
+                        app.logger.info(f"Mantenimiento de duplicados encolado (modo {mode})")
+            except Exception as e:
+                app.logger.error(f"Error en dedup_loop: {str(e)}", exc_info=True)
+            finally:
+                db.session.remove()
+        time.sleep(CHECK_SECONDS)
+
+def start_dedup_maintenance(app):
+    global _started
+    if Config.DEDUP_MODE == 'off' or Config.DEDUP_INTERVAL_HOURS <= 0:
+        app.logger.info("Mantenimiento periódico de duplicados desactivado")
+        return
+    if _started:
+        return
+    _started = True
+    threading.Thread(target=dedup_loop, args=(app,), name='dedup', daemon=True).start()
+
+def get_dedup_stats():
+    return dict(dedup_stats)
@@ -0,0 +1,87 @@
+# Estimación de una recodificación antes de hacerla: se codifican unos pocos clips cortos repartidos por el
+# video con el mismo perfil y se extrapola el tamaño de salida y el tiempo. Cuesta segundos frente a los
+# minutos de la conversión completa.
+import os
+import shutil
+import subprocess
+import time
+from app.config import Config  # Importar Config
+from app.services import scheduler_service, throttle_service
+from app.services.conversion_planner import get_profile, video_encode_args
+
+CONTAINER_OVERHEAD = 1.01  # Cabeceras e índice del MP4
+DEFAULT_AUDIO_BPS = 128000  # Pistas de audio copiadas cuyo bitrate no se conoce
+
+def get_work_dir(file_path):
+    # Con el prefijo del archivo: el limpiador de temporales no lo toca mientras su trabajo tenga lease
+    return os.path.join(Config.TEMP_DIR, f"{scheduler_service.get_temp_prefix(file_path)}_estimate")
+
+def sample_offsets(duration, count, seconds):
+    # Un clip en el centro de cada tramo: evita cortinillas y negros del principio y del final.
+    # Si el video es corto la conversión completa ya es barata y no se estima
+    if count <= 0 or seconds <= 0 or not duration or duration < count * seconds * 2:
+        return []
+    return [round(duration * (i + 0.5) / count - seconds / 2, 2) for i in range(count)]
+
+def _audio_bytes_per_second(plan, profile, video_info):
+    streams = [s for s in video_info.get('streams') or [] if s.get('codec_type') == 'audio']
+    if plan['transcode_audio']:
+        return len(streams) * int(profile['audio_bitrate'].rstrip('k')) * 1000 / 8
+    return sum(int(s.get('bit_rate') or DEFAULT_AUDIO_BPS) for s in streams) / 8
+
+def _encode_sample(file_path, offset, seconds, output_path, profile):
+    # -ss antes de -i: salto directo al keyframe anterior, sin decodificar lo que hay delante
+    command = ['ffmpeg', '-y', '-nostats', '-loglevel', 'error', '-ss', str(offset), '-i', file_path,
+               '-t', str(seconds), '-map', '0:v:0', *video_encode_args(throttle_service.get_encoder_threads(), profile),
+               '-an', '-f', 'mp4', output_path]
+    process = subprocess.Popen(throttle_service.wrap_command(command), stdout=subprocess.DEVNULL,
+                               stderr=subprocess.PIPE, universal_newlines=True)
+    throttle_service.register(process)
+    try:
+        _, errors = process.communicate()
+    finally:
+        throttle_service.unregister(process)
+    return process.returncode, errors.strip()[-500:]
+
+def estimate(file_path, plan, video_info, profile=None, parallelism=1, on_sample=None):
+    # Devuelve el tamaño y el tiempo previstos, o None si no hay recodificación o el video es demasiado corto.
+    # on_sample(índice, total) se llama antes de cada clip; parallelism divide el tiempo en la conversión por segmentos
+    duration = video_info.get('duration') or 0
+    offsets = sample_offsets(duration, Config.ENCODING_SAMPLE_COUNT, Config.ENCODING_SAMPLE_SECONDS)
+    if plan['operation'] != 'reencode' or not offsets:
+        return None
+    profile = profile or get_profile()
+    work_dir = get_work_dir(file_path)
+    shutil.rmtree(work_dir, ignore_errors=True)
+    os.makedirs(work_dir)
+    try:
+        video_bytes = 0
+        wall = 0.0
+        for index, offset in enumerate(offsets):
+            if on_sample:
+                on_sample(index, len(offsets))
+            output_path = os.path.join(work_dir, f"sample_{index}.mp4")
+            started = time.monotonic()
+            returncode, error = _encode_sample(file_path, offset, Config.ENCODING_SAMPLE_SECONDS, output_path, profile)
+            wall += time.monotonic() - started
+            if returncode != 0:
+                raise RuntimeError(f"Muestra {index + 1} de la estimación: {error}")
+            video_bytes += os.path.getsize(output_path)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    sampled = len(offsets) * Config.ENCODING_SAMPLE_SECONDS
+    bytes_per_second = video_bytes / sampled + _audio_bytes_per_second(plan, profile, video_info)
+    speed = sampled / wall if wall > 0 else None  # Segundos de video por segundo real
+    original_size = os.path.getsize(file_path)
+    expected_size = int(bytes_per_second * duration * CONTAINER_OVERHEAD)
+    return {
+        'profile': profile['name'],
+        'samples': len(offsets),
+        'sample_seconds': Config.ENCODING_SAMPLE_SECONDS,
+        'original_size': original_size,
+        'expected_size': expected_size,
+        'expected_ratio': round(expected_size / original_size, 3) if original_size else None,
+        'expected_seconds': round(duration / speed / max(1, parallelism), 1) if speed else None,
+        'speed': round(speed, 2) if speed else None,
+        'estimate_seconds': round(wall, 2),
+    }
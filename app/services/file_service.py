@@ -1,97 +1,63 @@
 # Lógica para manejo de archivos
 import os
-from flask import send_from_directory, current_app, abort
+from flask import current_app, abort
+from werkzeug.exceptions import HTTPException
 from app.config import Config  # Importar Config
+from app.services.course_index import get_cursos
+from app.services.search_service import search
+from app.services.stream_service import stream_file
+from app.services.profiling_service import fs_timer
 
 def scan_cursos():
     try:
-        cursos = {}
-        total_secciones = 0
-        total_archivos = 0
-
-        current_app.logger.debug(f"Escaneando directorio: {Config.CURSOS_DIR}")
-        if not os.path.exists(Config.CURSOS_DIR):
-            current_app.logger.error(f"El directorio {Config.CURSOS_DIR} no existe")
-            return {}
-        if not os.access(Config.CURSOS_DIR, os.R_OK):
-            current_app.logger.error(f"No hay permisos de lectura para {Config.CURSOS_DIR}")
-            return {}
-
-        for root, dirs, files in os.walk(Config.CURSOS_DIR):
-            if '_archive' in root or '_temp' in root:
-                continue
-            rel_path = os.path.relpath(root, Config.CURSOS_DIR)
-            if rel_path == '.':
-                continue
-            path_parts = rel_path.split(os.sep)
-            curso = path_parts[0]
-            seccion = '/'.join(path_parts[1:]) or ''
-            if curso not in cursos:
-                cursos[curso] = {}
-            if seccion not in cursos[curso]:
-                cursos[curso][seccion] = {'videos': [], 'pdfs': []}
-                total_secciones += 1  # Contar la sección
-            videos = [f for f in files if f.endswith('.mp4') and os.path.isfile(os.path.join(root, f))]
-            pdfs = [f for f in files if f.endswith('.pdf') and os.path.isfile(os.path.join(root, f))]
-            cursos[curso][seccion] = {'videos': videos, 'pdfs': pdfs}
-            total_archivos += len(videos) + len(pdfs)  # Sumar los archivos encontrados
-
-        # Registrar el resumen
-        current_app.logger.info(
-            f"Cursos encontrados: {len(cursos)}\n"
-            f"Secciones: {total_secciones}\n"
-            f"Archivos totales: {total_archivos}\n"
-            f"Ruta: {Config.CURSOS_DIR}"
-        )
-        return cursos
+        # El índice se construye una vez y se refresca en segundo plano
+        return get_cursos()
     except Exception as e:
         current_app.logger.error(f"Error en scan_cursos: {str(e)}", exc_info=True)
         return {}
 
-def scan_cursos_filtered(search_query):
-    try:
-        cursos = {}
-        total_secciones = 0
-        total_archivos = 0
-        search_query = search_query.lower()
-
-        current_app.logger.debug(f"Filtrando cursos con búsqueda: {search_query}")
-        if not os.path.exists(Config.CURSOS_DIR):
-            current_app.logger.error(f"El directorio {Config.CURSOS_DIR} no existe")
-            return {}
-        if not os.access(Config.CURSOS_DIR, os.R_OK):
-            current_app.logger.error(f"No hay permisos de lectura para {Config.CURSOS_DIR}")
-            return {}
-
-        for root, dirs, files in os.walk(Config.CURSOS_DIR):
-            if '_archive' in root or '_temp' in root:
-                continue
-            rel_path = os.path.relpath(root, Config.CURSOS_DIR)
-            if rel_path == '.':
-                continue
-            path_parts = rel_path.split(os.sep)
-            curso = path_parts[0]
-            seccion = '/'.join(path_parts[1:]) or ''
-            if curso not in cursos:
-                cursos[curso] = {}
-            if seccion not in cursos[curso]:
-                cursos[curso][seccion] = {'videos': [], 'pdfs': []}
-            videos = [f for f in files if f.endswith('.mp4') and os.path.isfile(os.path.join(root, f))]
-            pdfs = [f for f in files if f.endswith('.pdf') and os.path.isfile(os.path.join(root, f))]
+def _filter_cursos_substring(search_query):
+    # Búsqueda por subcadena sobre el índice en memoria (respaldo si el índice de búsqueda falla)
+    cursos = {}
+    for curso, secciones in get_cursos().items():
+        for seccion, contenido in secciones.items():
+            videos = contenido['videos']
+            pdfs = contenido['pdfs']
             if (search_query in curso.lower() or 
                 search_query in seccion.lower() or 
                 any(search_query in v.lower() for v in videos) or 
                 any(search_query in p.lower() for p in pdfs)):
-                cursos[curso][seccion] = {'videos': videos, 'pdfs': pdfs}
-                total_secciones += 1  # Contar la sección filtrada
-                total_archivos += len(videos) + len(pdfs)  # Sumar los archivos filtrados
+                cursos.setdefault(curso, {})[seccion] = contenido
+    return cursos
 
+def scan_cursos_filtered(search_query):
+    try:
+        search_query = search_query.lower()
+
+        current_app.logger.debug("Filtrando cursos con búsqueda: %s", search_query)
+        try:
+            results = search(search_query, limit=Config.SEARCH_MAX_RESULTS)
+            # Se muestran las secciones completas con coincidencias, ordenadas por relevancia
+            all_cursos = get_cursos()
+            cursos = {}
+            for result in results:
+                contenido = all_cursos.get(result['curso'], {}).get(result['seccion'])
+                if contenido is not None:
+                    cursos.setdefault(result['curso'], {})[result['seccion']] = contenido
+        except Exception as e:
+            current_app.logger.error(f"Error en el índice de búsqueda, usando filtrado por subcadena: {str(e)}", exc_info=True)
+            cursos = _filter_cursos_substring(search_query)
+
+        total_secciones = sum(len(secciones) for secciones in cursos.values())
+        total_archivos = sum(
+            len(contenido['videos']) + len(contenido['pdfs'])
+            for secciones in cursos.values()
+            for contenido in secciones.values()
+        )
         # Registrar el resumen
         current_app.logger.info(
-            f"Cursos encontrados (filtrados): {len(cursos)}\n"
-            f"Secciones: {total_secciones}\n"
-            f"Archivos totales: {total_archivos}\n"
-            f"Ruta: {Config.CURSOS_DIR}"
+            "Cursos encontrados (filtrados): %s, secciones: %s, archivos totales: %s (ruta: %s)",
+            len(cursos), total_secciones, total_archivos, Config.CURSOS_DIR
         )
         return cursos
     except Exception as e:
@@ -100,16 +66,30 @@ def scan_cursos_filtered(search_query):
 
 def serve_file(file_path, filename):
     try:
-        if os.path.isfile(file_path):
+        # Evitar que '..' en la sección saque la ruta de CURSOS_DIR
+        with fs_timer('resolve', file_path):
+            cursos_root = os.path.realpath(Config.CURSOS_DIR)
+            inside = os.path.commonpath([os.path.realpath(file_path), cursos_root]) == cursos_root
+            is_file = inside and os.path.isfile(file_path)
+        if not inside:
+            current_app.logger.warning(f"Ruta fuera de {Config.CURSOS_DIR} rechazada: {file_path}")
+            abort(404)
+        if is_file:
             if filename.endswith('.mp4'):
                 mimetype = 'video/mp4'
             elif filename.endswith('.pdf'):
                 mimetype = 'application/pdf'
+            elif filename.endswith('.m3u8'):
+                mimetype = 'application/vnd.apple.mpegurl'
+            elif filename.endswith('.ts'):
+                mimetype = 'video/mp2t'
             else:
                 mimetype = 'application/octet-stream'
-            return send_from_directory(os.path.dirname(file_path), filename, mimetype=mimetype)
+            return stream_file(file_path, mimetype)
         current_app.logger.warning(f"Archivo no encontrado para servir: {file_path}")
         abort(404)
+    except HTTPException:
+        raise
     except Exception as e:
         current_app.logger.error(f"Error en serve_file: {str(e)}", exc_info=True)
-        abort(500)
\ No newline at end of file
+        abort(500)
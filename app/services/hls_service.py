@@ -0,0 +1,102 @@
+# Empaquetado HLS: varias calidades (renditions) con playlists de segmentos y una master junto a cada lección
+import hashlib
+import os
+import shutil
+from flask import current_app
+from app.config import Config  # Importar Config
+
+HLS_SUFFIX = '_hls'
+MASTER_PLAYLIST = 'master.m3u8'
+
+# Altura -> (bitrate de video, bitrate máximo, buffer) en kbps
+BITRATE_LADDER = {
+    240: (400, 450, 600),
+    360: (800, 860, 1200),
+    480: (1400, 1500, 2100),
+    720: (2800, 3000, 4200),
+    1080: (5000, 5350, 7500),
+    1440: (8000, 8560, 12000),
+    2160: (14000, 15000, 21000),
+}
+AUDIO_BITRATE = '128k'
+
+def get_hls_dir(file_path):
+    stem = os.path.splitext(os.path.basename(file_path))[0]
+    return os.path.join(os.path.dirname(file_path), f"{stem}{HLS_SUFFIX}")
+
+def get_hls_dirname(filename):
+    return f"{os.path.splitext(filename)[0]}{HLS_SUFFIX}"
+
+def get_master_path(file_path):
+    return os.path.join(get_hls_dir(file_path), MASTER_PLAYLIST)
+
+def get_temp_hls_dir(file_path):
+    return os.path.join(Config.TEMP_DIR, f"{hashlib.md5(file_path.encode()).hexdigest()}{HLS_SUFFIX}_temp")
+
+def is_hls_dir(name):
+    return name.endswith(HLS_SUFFIX)
+
+def has_hls(file_path):
+    # Vigente si la master existe y es posterior al original (una conversión lo sustituye)
+    try:
+        return os.path.getmtime(get_master_path(file_path)) >= os.path.getmtime(file_path)
+    except OSError:
+        return False
+
+def get_renditions(source_height):
+    heights = sorted({int(h) for h in Config.HLS_RENDITIONS.split(',') if h.strip()})
+    if not source_height:
+        return heights[:1] or [360]
+    # No se escala hacia arriba; si el original es menor que todas, una sola calidad a su altura
+    selected = [h for h in heights if h <= source_height]
+    return selected or [source_height - source_height % 2]
+
+def _ladder_for(height):
+    known = [h for h in sorted(BITRATE_LADDER) if h >= height]
+    return BITRATE_LADDER[known[0] if known else max(BITRATE_LADDER)]
+
+def build_hls_command(file_path, output_dir, renditions, has_audio, threads):
+    count = len(renditions)
+    splits = ''.join(f'[v{i}]' for i in range(count))
+    filters = [f'[0:v]split={count}{splits}']
+    filters += [f'[v{i}]scale=-2:{height}[v{i}out]' for i, height in enumerate(renditions)]
+    command = ['ffmpeg', '-y', '-i', file_path, '-filter_complex', ';'.join(filters)]
+    stream_map = []
+    for i, height in enumerate(renditions):
+        bitrate, maxrate, bufsize = _ladder_for(height)
+        command += [
+            '-map', f'[v{i}out]', f'-c:v:{i}', 'libx264', f'-b:v:{i}', f'{bitrate}k',
+            f'-maxrate:v:{i}', f'{maxrate}k', f'-bufsize:v:{i}', f'{bufsize}k',
+        ]
+        stream_map.append(f'v:{i},a:{i},name:{height}p' if has_audio else f'v:{i},name:{height}p')
+    if has_audio:
+        for _ in renditions:
+            command += ['-map', '0:a:0']
+        command += ['-c:a', 'aac', '-b:a', AUDIO_BITRATE, '-ac', '2']
+    segment = Config.HLS_SEGMENT_SECONDS
+    command += [
+        '-preset', 'fast', '-threads', str(threads), '-pix_fmt', 'yuv420p',
+        # Keyframe al inicio de cada segmento: todas las calidades cortan en los mismos instantes
+        '-force_key_frames', f'expr:gte(t,n_forced*{segment})', '-sc_threshold', '0',
+        '-f', 'hls', '-hls_time', str(segment), '-hls_playlist_type', 'vod',
+        '-hls_flags', 'independent_segments',
+        '-hls_segment_filename', os.path.join(output_dir, '%v', 'seg_%05d.ts'),
+        '-master_pl_name', MASTER_PLAYLIST,
+        '-var_stream_map', ' '.join(stream_map),
+        '-progress', 'pipe:1',
+        os.path.join(output_dir, '%v', 'index.m3u8'),
+    ]
+    return command
+
+def publish_hls(file_path, temp_dir):
+    # Sustituye el paquete anterior solo cuando el nuevo está completo
+    final_dir = get_hls_dir(file_path)
+    old_dir = None
+    if os.path.exists(final_dir):
+        old_dir = f"{temp_dir}_old"
+        shutil.move(final_dir, old_dir)
+    shutil.move(temp_dir, final_dir)
+    if old_dir:
+        shutil.rmtree(old_dir, ignore_errors=True)
+    current_app.logger.info(f"Paquete HLS publicado en {final_dir}")
+    return final_dir
@@ -0,0 +1,370 @@
+# Ingesta de videos por eventos: inotify (o sondeo de directorios en montajes de red) detecta altas y bajas,
+# y cada archivo nuevo espera a que su tamaño y mtime dejen de cambiar antes de calcular huella, leer
+# metadatos y encolarlo. El escaneo completo de video_service queda como red de seguridad.
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import threading
+import time
+from app.config import Config  # Importar Config
+from app.services.conversion_planner import is_video_file
+from app.services.course_index import is_excluded
+from app.services.metrics_service import inc, observe
+
+# Constantes de <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+WATCH_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+              | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR)
+_EVENT_HEADER = struct.Struct('iIII')  # wd, mask, cookie, len
+
+# inotify no ve los cambios hechos desde otra máquina en estos sistemas de archivos
+NETWORK_FILESYSTEMS = ('nfs', 'nfs4', 'cifs', 'smb3', 'smbfs', '9p', 'fuse.sshfs', 'fuse.rclone', 'afs', 'ceph', 'glusterfs')
+TICK_SECONDS = 1.0
+
+_lock = threading.Lock()
+_pending = {}  # ruta -> {'stat': (tamaño, mtime_ns) o None, 'changed_at', 'first_seen'}
+_started = False
+ingest_stats = {
+    'watcher': None, 'watches': 0, 'pending': 0, 'ingested': 0, 'removed': 0, 'rescans': 0,
+    'last_ingest_at': None, 'last_latency_seconds': None, 'error': None,
+}
+
+class InotifyUnavailable(Exception):
+    pass
+
+def _rel_path(path):
+    return os.path.relpath(path, Config.CURSOS_DIR)
+
+def _is_candidate(path):
+    # Mismo criterio que el escaneo completo: videos dentro de una carpeta de curso, fuera de _archive/_temp/HLS
+    rel_path = _rel_path(path)
+    return is_video_file(path) and os.sep in rel_path and not rel_path.startswith(os.pardir) and not is_excluded(rel_path)
+
+def _watched_dir(path):
+    rel_path = _rel_path(path)
+    return rel_path == '.' or not is_excluded(rel_path)
+
+def _list_tree(path):
+    # (directorios, videos) bajo path, sin entrar en las carpetas excluidas
+    dirs, files = [], []
+    for root, subdirs, filenames in os.walk(path):
+        subdirs[:] = [d for d in subdirs if _watched_dir(os.path.join(root, d))]
+        dirs.append(root)
+        files.extend(os.path.join(root, name) for name in filenames if _is_candidate(os.path.join(root, name)))
+    return dirs, files
+
+class InotifyWatcher:
+    name = 'inotify'
+
+    def __init__(self, root):
+        libc_name = ctypes.util.find_library('c') or 'libc.so.6'
+        try:
+            self.libc = ctypes.CDLL(libc_name, use_errno=True)
+            self.fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        except (OSError, AttributeError) as e:
+            raise InotifyUnavailable(str(e))
+        if self.fd < 0:
+            raise InotifyUnavailable(os.strerror(ctypes.get_errno()))
+        self.paths = {}  # wd -> directorio
+        self.wds = {}  # directorio -> wd
+        self.buffer = b''
+        dirs, _ = _list_tree(root)
+        for path in dirs:
+            self._add_watch(path)
+
+    def _add_watch(self, path):
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            error = ctypes.get_errno()
+            if error == errno.ENOSPC:
+                # Límite fs.inotify.max_user_watches: no se pueden vigilar todas las carpetas
+                raise InotifyUnavailable('límite de inotify alcanzado (fs.inotify.max_user_watches)')
+            if error not in (errno.ENOENT, errno.ENOTDIR):
+                raise InotifyUnavailable(os.strerror(error))
+            return
+        self.paths[wd] = path
+        self.wds[path] = wd
+
+    def _remove_tree(self, path):
+        prefix = os.path.join(path, '')
+        for watched in [p for p in self.wds if p == path or p.startswith(prefix)]:
+            wd = self.wds.pop(watched)
+            self.paths.pop(wd, None)
+            self.libc.inotify_rm_watch(self.fd, wd)
+
+    def _read_events(self, timeout):
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        try:
+            self.buffer += os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        events = []
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(self.buffer):
+            wd, mask, _, length = _EVENT_HEADER.unpack_from(self.buffer, offset)
+            end = offset + _EVENT_HEADER.size + length
+            if end > len(self.buffer):
+                break
+            name = self.buffer[offset + _EVENT_HEADER.size:end].rstrip(b'\0')
+            events.append((wd, mask, os.fsdecode(name)))
+            offset = end
+        self.buffer = self.buffer[offset:]
+        return events
+
+    def poll(self, timeout):
+        # Devuelve (rutas cambiadas, rutas eliminadas, hay que reescanear todo). Los eventos se aplican en orden y
+        # el último de cada ruta decide: al convertir, el original se mueve a _archive y la salida se renombra
+        # con el mismo nombre, y muchas herramientas de subida borran y vuelven a crear
+        changed, removed, rescan = set(), set(), False
+        for wd, mask, name in self._read_events(timeout):
+            if mask & IN_Q_OVERFLOW:
+                rescan = True  # Se han perdido eventos
+                continue
+            directory = self.paths.get(wd)
+            if directory is None:
+                continue
+            if mask & IN_IGNORED:
+                self.paths.pop(wd, None)
+                self.wds.pop(directory, None)
+                continue
+            if mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+                continue  # Lo notifica también el padre con IN_DELETE / IN_MOVED_FROM
+            path = os.path.join(directory, name)
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO) and _watched_dir(path):
+                    # Carpeta nueva o movida dentro: se vigila y se ingiere lo que ya traiga
+                    dirs, files = _list_tree(path)
+                    for subdir in dirs:
+                        self._add_watch(subdir)
+                    changed.update(files)
+                    removed.discard(path)
+                    removed.difference_update(files)
+                elif mask & (IN_DELETE | IN_MOVED_FROM):
+                    self._remove_tree(path)
+                    removed.add(path)
+                    prefix = os.path.join(path, '')
+                    changed = {p for p in changed if not p.startswith(prefix)}
+            elif mask & (IN_DELETE | IN_MOVED_FROM):
+                removed.add(path)
+                changed.discard(path)
+            elif _is_candidate(path):
+                changed.add(path)
+                removed.discard(path)
+        return changed, removed, rescan
+
+    @property
+    def watches(self):
+        return len(self.wds)
+
+class PollingWatcher:
+    # Para montajes de red: compara el mtime de cada carpeta (barato) y solo relista las que cambian
+    name = 'poll'
+
+    def __init__(self, root):
+        self.root = root
+        self.dirs = {}  # directorio -> (mtime_ns, videos que contiene)
+        self.last_poll = 0
+        self._refresh(initial=True)
+
+    def _list_dir(self, path):
+        subdirs, files = [], set()
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    if _watched_dir(entry.path):
+                        subdirs.append(entry.path)
+                elif _is_candidate(entry.path):
+                    files.add(entry.path)
+        return subdirs, files
+
+    def _refresh(self, initial=False):
+        changed, removed = set(), set()
+        pending = [self.root]
+        visited = set()
+        while pending:
+            path = pending.pop()
+            visited.add(path)
+            try:
+                mtime = os.stat(path).st_mtime_ns
+            except OSError:
+                continue
+            previous = self.dirs.get(path)
+            if previous is not None and previous[0] == mtime:
+                # Sin cambios directos: se revisan sus subcarpetas conocidas
+                prefix = os.path.join(path, '')
+                pending.extend(p for p in self.dirs if p.startswith(prefix) and os.sep not in p[len(prefix):])
+                continue
+            try:
+                subdirs, files = self._list_dir(path)
+            except OSError:
+                continue
+            old_files = previous[1] if previous else set()
+            if not initial:
+                changed.update(files - old_files)
+                removed.update(old_files - files)
+            self.dirs[path] = (mtime, files)
+            pending.extend(subdirs)
+        for path in [p for p in self.dirs if p not in visited]:
+            # Carpeta eliminada o movida
+            removed.update(self.dirs.pop(path)[1])
+        return changed, removed
+
+    def poll(self, timeout):
+        now = time.monotonic()
+        if now - self.last_poll < Config.INGEST_POLL_INTERVAL:
+            time.sleep(timeout)
+            return set(), set(), False
+        self.last_poll = now
+        changed, removed = self._refresh()
+        return changed, removed, False
+
+    @property
+    def watches(self):
+        return len(self.dirs)
+
+def _is_network_mount(path):
+    # Sistema de archivos del punto de montaje más largo que contiene path, según /proc/mounts
+    try:
+        with open('/proc/mounts') as f:
+            mounts = [line.split()[1:3] for line in f if len(line.split()) >= 3]
+    except OSError:
+        return False
+    real_path = os.path.realpath(path)
+    best, fstype = '', ''
+    for mount_point, mount_type in mounts:
+        mount_point = mount_point.replace('\\040', ' ')
+        if (real_path == mount_point or real_path.startswith(os.path.join(mount_point, ''))) and len(mount_point) > len(best):
+            best, fstype = mount_point, mount_type
+    return fstype in NETWORK_FILESYSTEMS or fstype.startswith('fuse.')
+
+def create_watcher(app):
+    root = Config.CURSOS_DIR
+    mode = Config.INGEST_WATCHER
+    if mode == 'auto' and _is_network_mount(root):
+        app.logger.info(f"{root} es un montaje de red: ingesta por sondeo cada {Config.INGEST_POLL_INTERVAL}s")
+        mode = 'poll'
+    if mode in ('auto', 'inotify'):
+        try:
+            return InotifyWatcher(root)
+        except InotifyUnavailable as e:
+            app.logger.warning(f"inotify no disponible ({e}), ingesta por sondeo cada {Config.INGEST_POLL_INTERVAL}s")
+    return PollingWatcher(root)
+
+def track(paths):
+    # Archivos a seguir hasta que se estabilicen (eventos del vigilante o recientes del escaneo completo)
+    now = time.monotonic()
+    with _lock:
+        for path in paths:
+            entry = _pending.setdefault(path, {'stat': None, 'changed_at': now, 'first_seen': now})
+            entry['changed_at'] = now  # Rebote: cada evento reinicia la espera
+        ingest_stats['pending'] = len(_pending)
+
+def _take_stable():
+    # Archivos cuyo (tamaño, mtime) no ha cambiado en INGEST_STABLE_SECONDS; los que desaparecen se descartan
+    now = time.monotonic()
+    stable, vanished = [], []
+    with _lock:
+        for path, entry in list(_pending.items()):
+            try:
+                st = os.stat(path)
+            except OSError:
+                vanished.append(path)
+                del _pending[path]
+                continue
+            current = (st.st_size, st.st_mtime_ns)
+            if current != entry['stat']:
+                entry['stat'] = current
+                entry['changed_at'] = now
+            elif st.st_size > 0 and now - entry['changed_at'] >= Config.INGEST_STABLE_SECONDS:
+                stable.append((path, entry['first_seen']))
+                del _pending[path]
+        ingest_stats['pending'] = len(_pending)
+    return stable, vanished
+
+def _ingest(app, stable):
+    from app.services.video_service import ingest_files
+    ingested = ingest_files(app, [path for path, _ in stable])
+    now = time.monotonic()
+    for path, first_seen in stable:
+        observe('ingest_latency_seconds', now - first_seen)
+    inc('ingest_files_total', len(ingested))
+    ingest_stats['ingested'] += len(ingested)
+    ingest_stats['last_ingest_at'] = time.time()
+    ingest_stats['last_latency_seconds'] = round(now - min(first_seen for _, first_seen in stable), 2)
+    app.logger.info(f"Ingeridos {len(ingested)} de {len(stable)} videos nuevos o modificados "
+                    f"({ingest_stats['last_latency_seconds']}s desde el primer evento)")
+
+def _forget(app, paths):
+    from app.services.video_service import forget_files
+    with _lock:
+        for path in list(_pending):
+            if (path in paths or path.startswith(tuple(os.path.join(p, '') for p in paths))) and not os.path.exists(path):
+                del _pending[path]
+    dropped = forget_files(app, list(paths))
+    ingest_stats['removed'] += dropped
+    if dropped:
+        app.logger.info(f"Eliminados {dropped} videos que ya no están en {Config.CURSOS_DIR}")
+
+def ingest_loop(app):
+    try:
+        watcher = create_watcher(app)
+    except Exception as e:
+        ingest_stats['error'] = str(e)
+        app.logger.error(f"No se pudo iniciar la ingesta por eventos: {str(e)}", exc_info=True)
+        return
+    ingest_stats['watcher'] = watcher.name
+    ingest_stats['watches'] = watcher.watches
+    app.logger.info(f"Ingesta por eventos activa ({watcher.name}, {watcher.watches} carpetas vigiladas)")
+    while True:
+        try:
+            changed, removed, rescan = watcher.poll(TICK_SECONDS)
+            ingest_stats['watches'] = watcher.watches
+            if rescan:
+                # Cola de inotify desbordada: se releen todas las carpetas vigiladas
+                ingest_stats['rescans'] += 1
+                app.logger.warning("Cola de eventos desbordada, se revisa todo el árbol")
+                changed.update(_list_tree(Config.CURSOS_DIR)[1])
+            if changed:
+                track(changed)
+            stable, vanished = _take_stable()
+            if removed or vanished:
+                _forget(app, set(removed) | set(vanished))
+            if stable:
+                _ingest(app, stable)
+        except Exception as e:
+            app.logger.error(f"Error en la ingesta por eventos: {str(e)}", exc_info=True)
+            time.sleep(TICK_SECONDS)
+
+def start_ingest(app):
+    global _started
+    if Config.INGEST_WATCHER == 'off':
+        app.logger.info("Ingesta por eventos desactivada (INGEST_WATCHER=off)")
+        return
+    with _lock:
+        if _started:
+            return
+        _started = True
+    threading.Thread(target=ingest_loop, args=(app,), name='ingest', daemon=True).start()
+
+def is_running():
+    return _started and ingest_stats['error'] is None
+
+def get_ingest_stats():
+    return dict(ingest_stats)
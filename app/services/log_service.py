@@ -0,0 +1,281 @@
+# Consulta de logs (texto o JSON): lectura inversa por bloques sobre app.log y sus copias rotadas. El índice de
+# offsets solo se construye, archivo a archivo, cuando una página profunda o un filtro de fecha lo necesita
+import json
+import os
+import re
+import threading
+from app.config import Config  # Importar Config
+
+BLOCK_SIZE = 64 * 1024
+CHECKPOINT_EVERY = 256  # Un offset guardado cada N registros
+MAX_SCANNED_RECORDS = 200000  # Límite de registros leídos por consulta filtrada
+
+# Formato: "2025-03-20 21:30:00,123 - flask - WARNING - Mensaje" (las trazas ocupan varias líneas)
+HEADER = re.compile(r'^(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2},\d{3}) - (.*?) - ([A-Z]+) - (.*)$')
+HEADER_BYTES = re.compile(rb'^\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2},\d{3} - ')
+# Formato JSON (LOG_FORMAT=json): una línea por registro que empieza por {"ts": "2025-03-20 21:30:00,123"
+JSON_HEADER_BYTES = re.compile(rb'^\{"ts": "(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2},\d{3})"')
+
+# inodo -> {'size', 'count', 'checkpoints': [(offset, timestamp)]}; los archivos rotados conservan el inodo
+_index = {}
+_index_lock = threading.Lock()
+
+def get_log_files():
+    # Del más reciente al más antiguo: app.log, app.log.1 ... app.log.N
+    base = os.path.join(Config.LOG_DIR, 'app.log')
+    paths = [base] + [f"{base}.{i}" for i in range(1, Config.LOG_BACKUP_COUNT + 1)]
+    files = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        files.append({'path': path, 'inode': st.st_ino, 'size': st.st_size})
+    return files
+
+def _header_timestamp(line):
+    # Marca de tiempo si la línea abre un registro (texto o JSON); None si es continuación de una traza
+    if HEADER_BYTES.match(line):
+        return line[:23].decode('ascii', 'replace')
+    match = JSON_HEADER_BYTES.match(line)
+    return match.group(1).decode('ascii') if match else None
+
+def _update_index(log_file):
+    # Indexa solo los bytes añadidos desde la última vez (las copias rotadas no cambian)
+    with _index_lock:
+        entry = _index.get(log_file['inode'])
+        if entry is None or entry['size'] > log_file['size']:
+            entry = {'size': 0, 'count': 0, 'checkpoints': []}
+        if entry['size'] == log_file['size']:
+            _index[log_file['inode']] = entry
+            return entry
+        with open(log_file['path'], 'rb') as f:
+            f.seek(entry['size'])
+            offset = entry['size']
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break  # Línea a medio escribir: se indexa en la próxima consulta
+                timestamp = _header_timestamp(line)
+                if timestamp:
+                    if entry['count'] % CHECKPOINT_EVERY == 0:
+                        entry['checkpoints'].append((offset, timestamp))
+                    entry['count'] += 1
+                offset += len(line)
+        entry['size'] = offset
+        _index[log_file['inode']] = entry
+        return entry
+
+def _prune_index(files):
+    live = {log_file['inode'] for log_file in files}
+    with _index_lock:
+        for inode in [i for i in _index if i not in live]:
+            del _index[inode]
+
+def _indexed_total(files):
+    # Total de registros si todos los archivos tienen ya índice; del activo solo se lee lo añadido desde entonces
+    total = 0
+    for log_file in files:
+        with _index_lock:
+            if log_file['inode'] not in _index:
+                return None
+        total += _update_index(log_file)['count']
+    return total
+
+def _complete_size(f, size):
+    # Hasta el último salto de línea: la línea final puede estar a medio escribir
+    start = max(0, size - BLOCK_SIZE)
+    f.seek(start)
+    newline = f.read(size - start).rfind(b'\n')
+    return start + newline + 1 if newline >= 0 else start
+
+def _reverse_lines(f, end):
+    # (offset, línea) desde end hacia el principio del archivo, leyendo bloques de BLOCK_SIZE
+    position = end
+    remainder = b''
+    while position > 0:
+        read = min(BLOCK_SIZE, position)
+        position -= read
+        f.seek(position)
+        lines = (f.read(read) + remainder).split(b'\n')
+        remainder = lines[0]  # Puede ser el final de una línea del bloque anterior
+        offset = position + len(remainder) + 1
+        complete = []
+        for line in lines[1:]:
+            complete.append((offset, line))
+            offset += len(line) + 1
+        yield from reversed(complete)
+    if remainder:
+        yield 0, remainder
+
+def _make_record(match, continuation):
+    timestamp, name, level, message = match.groups()
+    if continuation:
+        message = '\n'.join([message] + continuation)
+    return {'timestamp': timestamp, 'name': name, 'level': level, 'message': message}
+
+def _make_json_record(line):
+    try:
+        data = json.loads(line)
+    except ValueError:
+        return None
+    message = data.get('message', '')
+    if data.get('exc'):
+        message = f"{message}\n{data['exc']}"
+    return {'timestamp': data.get('ts', ''), 'name': data.get('name', ''), 'level': data.get('level', ''), 'message': message}
+
+def _reverse_records(f, end):
+    # (offset de inicio, registro) del más reciente al más antiguo; las líneas de traza se unen a su cabecera
+    pending = []
+    for offset, raw in _reverse_lines(f, end):
+        if not raw.strip():
+            continue
+        line = raw.decode('utf-8', 'replace').rstrip('\r')
+        if line.startswith('{"ts": '):
+            record = _make_json_record(line)
+            if record:
+                # Los registros JSON ocupan una sola línea: lo pendiente no tiene cabecera y se descarta
+                yield offset, record
+                pending = []
+                continue
+        match = HEADER.match(line)
+        if match:
+            yield offset, _make_record(match, pending[::-1])
+            pending = []
+        else:
+            pending.append(line)
+
+def _record_start(f, entry, number):
+    # Offset del registro número `number` (desde el principio): checkpoint + avance de menos de CHECKPOINT_EVERY registros
+    if number >= entry['count']:
+        return entry['size']
+    offset = entry['checkpoints'][number // CHECKPOINT_EVERY][0]
+    skip = number % CHECKPOINT_EVERY
+    f.seek(offset)
+    for line in f:
+        if _header_timestamp(line):
+            if skip == 0:
+                return offset
+            skip -= 1
+        offset += len(line)
+    return entry['size']
+
+def _until_offset(entry, until):
+    # Primer checkpoint posterior a `until`: todo lo que sigue es más reciente y se puede saltar
+    for offset, timestamp in entry['checkpoints']:
+        if timestamp > until:
+            return offset
+    return entry['size']
+
+def _iter_records(files, start_file=0, start_offset=None, until=None):
+    # Registros del más reciente al más antiguo a partir de (archivo, offset), continuando por las copias rotadas.
+    # Solo el filtro `until` indexa: sin él se lee hacia atrás desde el final de cada archivo
+    for position in range(start_file, len(files)):
+        log_file = files[position]
+        with open(log_file['path'], 'rb') as f:
+            end = _complete_size(f, log_file['size'])
+            if position == start_file and start_offset is not None:
+                end = min(start_offset, end)
+            elif until:
+                end = _until_offset(_update_index(log_file), until)
+            for offset, record in _reverse_records(f, end):
+                yield log_file['inode'], offset, record
+
+def _parse_cursor(files, cursor):
+    try:
+        inode, offset = (int(part) for part in cursor.split(':'))
+    except (AttributeError, ValueError):
+        return None
+    for position, log_file in enumerate(files):
+        if log_file['inode'] == inode:
+            return position, offset
+    return None  # El archivo ya se eliminó en una rotación
+
+def _matches(record, level, since, until, text):
+    if level and record['level'] != level:
+        return False
+    if until and record['timestamp'] > until:
+        return False
+    if since and record['timestamp'] < since:
+        return False
+    if text and text not in record['message'].lower() and text not in record['name'].lower():
+        return False
+    return True
+
+def _normalize_time(value, end_of_minute=False):
+    # Acepta "YYYY-MM-DD HH:MM[:SS]" o "YYYY-MM-DDTHH:MM" (input datetime-local) y lo compara como texto
+    if not value:
+        return None
+    value = value.replace('T', ' ').strip()
+    if len(value) == 10:
+        value += ' 23:59:59,999' if end_of_minute else ' 00:00:00,000'
+    elif len(value) == 16:
+        value += ':59,999' if end_of_minute else ':00,000'
+    elif len(value) == 19:
+        value += ',999' if end_of_minute else ',000'
+    return value
+
+def query_logs(level=None, since=None, until=None, text=None, page=1, page_size=100, cursor=None):
+    files = get_log_files()
+    _prune_index(files)
+    level = (level or '').upper() or None
+    since = _normalize_time(since)
+    until = _normalize_time(until, end_of_minute=True)
+    text = (text or '').lower() or None
+    page = max(1, page)
+    filtered = bool(level or since or until or text)
+
+    start_file, start_offset = 0, None
+    skip = 0
+    if cursor:
+        parsed = _parse_cursor(files, cursor)
+        if parsed is None:
+            return {'logs': [], 'next_cursor': None, 'total': _indexed_total(files), 'page': page, 'filtered': filtered,
+                    'expired': True}
+        start_file, start_offset = parsed
+    elif not filtered and page > 1:
+        # Sin filtros la página K se localiza con el índice: registro global -> archivo y offset. Solo se indexan
+        # los archivos hasta el que contiene la página
+        remaining = (page - 1) * page_size
+        for position, log_file in enumerate(files):
+            entry = _update_index(log_file)
+            if remaining < entry['count']:
+                start_file = position
+                with open(files[position]['path'], 'rb') as f:
+                    start_offset = _record_start(f, entry, entry['count'] - remaining)
+                break
+            remaining -= entry['count']
+        else:
+            return {'logs': [], 'next_cursor': None, 'total': _indexed_total(files), 'page': page, 'filtered': filtered}
+    elif filtered:
+        # Con filtros y sin cursor hay que recorrer las coincidencias de las páginas anteriores
+        skip = (page - 1) * page_size
+
+    logs = []
+    next_cursor = None
+    scanned = 0
+    for inode, offset, record in _iter_records(files, start_file, start_offset, until if not cursor else None):
+        scanned += 1
+        if since and record['timestamp'] < since:
+            break  # Los registros están en orden cronológico: ya no habrá más coincidencias
+        if scanned > MAX_SCANNED_RECORDS:
+            next_cursor = f"{inode}:{offset}"
+            break
+        if not _matches(record, level, since, until, text):
+            continue
+        if skip:
+            skip -= 1
+            continue
+        logs.append(record)
+        if len(logs) == page_size:
+            next_cursor = f"{inode}:{offset}"
+            break
+    total = _indexed_total(files) if not filtered else None
+    return {
+        'logs': logs,
+        'next_cursor': next_cursor,
+        'total': total,
+        'page': page,
+        'pages': -(-total // page_size) if total is not None else None,
+        'filtered': filtered,
+        'scanned': scanned,
+    }
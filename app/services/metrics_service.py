@@ -0,0 +1,310 @@
+# Métricas operativas en formato Prometheus y JSON. Cada proceso (workers de gunicorn y worker.py) lleva su
+# propio registro en memoria y lo publica periódicamente en AppSetting; /api/stats suma todos los procesos vivos.
+import hmac
+import os
+import socket
+import threading
+import time
+from flask import g, request
+from app.config import Config  # Importar Config
+
+PREFIX = 'oposiciones_'
+SETTINGS_PREFIX = 'metrics.'
+STALE_FACTOR = 4  # Un proceso que no publica en STALE_FACTOR intervalos se considera caído
+PURGE_SECONDS = 3600
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SCAN_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300, 900)
+WAIT_BUCKETS = (1, 5, 15, 60, 300, 900, 3600, 14400, 86400)
+SPEED_BUCKETS = (0.25, 0.5, 1, 2, 4, 8, 16, 32, 64)
+
+# nombre -> (tipo, ayuda, buckets)
+METRICS = {
+    'http_request_duration_seconds': ('histogram', 'Latencia de las peticiones HTTP por endpoint', LATENCY_BUCKETS),
+    'http_requests_total': ('counter', 'Peticiones HTTP por endpoint y código de estado', None),
+    'file_bytes_served_total': ('counter', 'Bytes de archivos servidos por tipo (video, pdf, hls)', None),
+    'file_requests_total': ('counter', 'Archivos servidos por tipo', None),
+    'file_not_modified_total': ('counter', 'Respuestas 304 a peticiones condicionales', None),
+    'file_partial_total': ('counter', 'Respuestas 206 a peticiones con Range', None),
+    'file_offloaded_total': ('counter', 'Archivos delegados al proxy (X-Accel-Redirect / X-Sendfile)', None),
+    'file_active_streams': ('gauge', 'Transferencias de archivos en curso', None),
+    'scan_videos_duration_seconds': ('histogram', 'Duración de cada escaneo de videos', SCAN_BUCKETS),
+    'scan_cursos_duration_seconds': ('histogram', 'Duración de la construcción/refresco del índice de cursos', SCAN_BUCKETS),
+    'conversion_wait_seconds': ('histogram', 'Tiempo en cola de los trabajos hasta empezar', WAIT_BUCKETS),
+    'conversion_jobs_total': ('counter', 'Trabajos terminados por tipo y estado', None),
+    'conversion_dedup_hits_total': ('counter', 'Conversiones resueltas reutilizando la salida de un original idéntico', None),
+    'ffmpeg_speed_ratio': ('histogram', 'Velocidad de ffmpeg (segundos de video por segundo real)', SPEED_BUCKETS),
+    'conversion_throttle_level': ('gauge', 'Regulación de las conversiones: 0 normal, 1 reducida, 2 suspendida', None),
+    'conversion_suspensions_total': ('counter', 'Veces que se han detenido las conversiones por carga de servido', None),
+    'conversion_queue_depth': ('gauge', 'Trabajos en cola por tipo', None),
+    'conversion_running': ('gauge', 'Trabajos en ejecución por tipo', None),
+    'conversion_rejected_total': ('counter', 'Trabajos no encolados por tipo y motivo (cola llena, ya activo)', None),
+    'metadata_cache_hits_total': ('counter', 'Aciertos de la caché de metadatos de video', None),
+    'metadata_cache_misses_total': ('counter', 'Fallos de la caché de metadatos de video', None),
+    'metadata_cache_hit_ratio': ('gauge', 'Aciertos / consultas de la caché de metadatos', None),
+    'file_not_modified_ratio': ('gauge', 'Respuestas 304 / (304 + archivos servidos) (caché del navegador)', None),
+    'thumbnails_generated_total': ('counter', 'Pósters y sprites generados', None),
+    'thumbnails_evicted_total': ('counter', 'Miniaturas expulsadas de la caché en disco', None),
+    'thumbnail_cache_bytes': ('gauge', 'Tamaño de la caché de miniaturas', None),
+    'ingest_files_total': ('counter', 'Videos ingeridos por eventos al terminar de copiarse', None),
+    'ingest_latency_seconds': ('histogram', 'Tiempo desde el primer evento de un archivo hasta su ingesta', SCAN_BUCKETS),
+    'ingest_pending_files': ('gauge', 'Archivos detectados a la espera de que termine su copia', None),
+    'dedup_reclaimable_bytes': ('gauge', 'Espacio recuperable enlazando videos duplicados (último informe)', None),
+    'dedup_linked_bytes_total': ('counter', 'Bytes liberados sustituyendo duplicados por enlaces', None),
+    'archive_purged_bytes_total': ('counter', 'Bytes liberados purgando originales de _archive por retención', None),
+    'search_queries_total': ('counter', 'Consultas al índice de búsqueda', None),
+    'log_records_dropped_total': ('counter', 'Registros de log descartados por cola llena', None),
+    'processes': ('gauge', 'Procesos que han publicado métricas recientemente', None),
+}
+
+_lock = threading.Lock()
+_counters = {}    # nombre -> {etiquetas: valor}
+_histograms = {}  # nombre -> {etiquetas: {'buckets': [...], 'sum', 'count'}}
+_publisher_started = False
+
+def _process_key():
+    # Con el pid actual: los workers de gunicorn se crean con fork
+    return f"{SETTINGS_PREFIX}{socket.gethostname()}:{os.getpid()}"
+
+def _labels(labels):
+    # Etiquetas ya en formato Prometheus: sirven de clave y se pueden sumar entre procesos
+    def escape(value):
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return ','.join(f'{key}="{escape(value)}"' for key, value in sorted(labels.items()))
+
+def inc(name, value=1, **labels):
+    key = _labels(labels)
+    with _lock:
+        series = _counters.setdefault(name, {})
+        series[key] = series.get(key, 0) + value
+
+def observe(name, value, **labels):
+    buckets = METRICS[name][2]
+    key = _labels(labels)
+    with _lock:
+        series = _histograms.setdefault(name, {})
+        entry = series.get(key)
+        if entry is None:
+            entry = series[key] = {'buckets': [0] * (len(buckets) + 1), 'sum': 0.0, 'count': 0}
+        position = next((i for i, bound in enumerate(buckets) if value <= bound), len(buckets))
+        entry['buckets'][position] += 1
+        entry['sum'] += value
+        entry['count'] += 1
+
+def _collect_local():
+    # Registro propio más los contadores que ya llevan los servicios
+    from app.services.stream_service import get_stream_stats
+    from app.services.video_service import metadata_stats
+    from app.services.thumbnail_service import get_thumbnail_stats
+    from app.services.search_service import get_search_stats
+    from app.services.ingest_service import get_ingest_stats
+    from app.services.throttle_service import STATE_LEVELS, throttle_state
+    from app.services.dedup_service import get_dedup_stats
+    from app.logging_config import logging_stats
+    with _lock:
+        counters = {name: dict(series) for name, series in _counters.items()}
+        histograms = {
+            name: {key: {'buckets': list(e['buckets']), 'sum': e['sum'], 'count': e['count']} for key, e in series.items()}
+            for name, series in _histograms.items()
+        }
+    gauges = {}
+    stream = get_stream_stats()
+    for kind, values in stream['by_kind'].items():
+        counters.setdefault('file_bytes_served_total', {})[_labels({'kind': kind})] = values['bytes_sent']
+        counters.setdefault('file_requests_total', {})[_labels({'kind': kind})] = values['requests']
+    for key in ('not_modified', 'partial', 'offloaded'):
+        counters[f'file_{key}_total'] = {'': stream[key]}
+    gauges['file_active_streams'] = {'': stream['active']}
+    counters['metadata_cache_hits_total'] = {'': metadata_stats['hits']}
+    counters['metadata_cache_misses_total'] = {'': metadata_stats['misses']}
+    thumbnails = get_thumbnail_stats()
+    counters['thumbnails_generated_total'] = {'': thumbnails['generated']}
+    counters['thumbnails_evicted_total'] = {'': thumbnails['evicted']}
+    gauges['thumbnail_cache_bytes'] = {'': thumbnails['size_bytes']}
+    counters['search_queries_total'] = {'': get_search_stats()['queries']}
+    gauges['ingest_pending_files'] = {'': get_ingest_stats()['pending']}
+    gauges['conversion_throttle_level'] = {'': STATE_LEVELS[throttle_state['state']]}
+    counters['conversion_suspensions_total'] = {'': throttle_state['suspensions']}
+    dedup = get_dedup_stats()
+    if dedup['reclaimable_bytes'] is not None:
+        gauges['dedup_reclaimable_bytes'] = {'': dedup['reclaimable_bytes']}
+    counters['log_records_dropped_total'] = {'': logging_stats['dropped']}
+    return {'counters': counters, 'gauges': gauges, 'histograms': histograms}
+
+def publish_metrics():
+    from app.services.settings_service import delete_stale_settings, set_setting
+    set_setting(_process_key(), _collect_local())
+    delete_stale_settings(SETTINGS_PREFIX, PURGE_SECONDS)
+
+def metrics_publisher(app):
+    while True:
+        time.sleep(Config.METRICS_PUBLISH_INTERVAL)
+        with app.app_context():
+            try:
+                publish_metrics()
+            except Exception as e:
+                app.logger.error(f"Error al publicar métricas: {str(e)}", exc_info=True)
+
+def start_metrics_publisher(app):
+    global _publisher_started
+    with _lock:
+        if _publisher_started:
+            return
+        _publisher_started = True
+    app.logger.info(f"Publicando métricas cada {Config.METRICS_PUBLISH_INTERVAL}s como {_process_key()}")
+    threading.Thread(target=metrics_publisher, args=(app,), daemon=True).start()
+
+def _merge(total, snapshot):
+    for kind in ('counters', 'gauges'):
+        for name, series in snapshot.get(kind, {}).items():
+            merged = total[kind].setdefault(name, {})
+            for key, value in series.items():
+                merged[key] = merged.get(key, 0) + value
+    for name, series in snapshot.get('histograms', {}).items():
+        merged = total['histograms'].setdefault(name, {})
+        for key, entry in series.items():
+            current = merged.get(key)
+            if current is None or len(current['buckets']) != len(entry['buckets']):
+                merged[key] = {'buckets': list(entry['buckets']), 'sum': entry['sum'], 'count': entry['count']}
+                continue
+            current['buckets'] = [a + b for a, b in zip(current['buckets'], entry['buckets'])]
+            current['sum'] += entry['sum']
+            current['count'] += entry['count']
+
+def _ratio(numerator, denominator):
+    return round(numerator / denominator, 4) if denominator else 0
+
+def _total(snapshot, name):
+    return sum(snapshot['counters'].get(name, {}).values())
+
+def collect_metrics():
+    # Suma de este proceso (en vivo) y de los demás procesos (última publicación) más el estado de la cola
+    from app.services.settings_service import get_settings_with_prefix
+    from app.services.scheduler_service import get_queue_depths
+    total = {'counters': {}, 'gauges': {}, 'histograms': {}}
+    _merge(total, _collect_local())
+    processes = 1
+    own_key = _process_key()
+    max_age = Config.METRICS_PUBLISH_INTERVAL * STALE_FACTOR
+    for key, (snapshot, age) in get_settings_with_prefix(SETTINGS_PREFIX).items():
+        if key == own_key or age is None or age > max_age:
+            continue
+        _merge(total, snapshot)
+        processes += 1
+    depths = get_queue_depths()
+    total['gauges']['conversion_queue_depth'] = {_labels({'job_type': t}): d['queued'] for t, d in depths.items()}
+    total['gauges']['conversion_running'] = {_labels({'job_type': t}): d['processing'] for t, d in depths.items()}
+    hits, misses = _total(total, 'metadata_cache_hits_total'), _total(total, 'metadata_cache_misses_total')
+    total['gauges']['metadata_cache_hit_ratio'] = {'': _ratio(hits, hits + misses)}
+    # Los 304 no llegan a file_requests_total (solo cuenta cuerpos enviados): el total es la suma de ambos
+    not_modified, served = _total(total, 'file_not_modified_total'), _total(total, 'file_requests_total')
+    total['gauges']['file_not_modified_ratio'] = {'': _ratio(not_modified, not_modified + served)}
+    total['gauges']['processes'] = {'': processes}
+    return total
+
+def get_serving_load():
+    # Transferencias en curso e histograma de latencia HTTP (todas las rutas) sumados entre procesos vivos;
+    # el histograma es acumulado, quien lo use debe restar la muestra anterior
+    from app.services.settings_service import get_settings_with_prefix
+    total = {'counters': {}, 'gauges': {}, 'histograms': {}}
+    _merge(total, _collect_local())
+    own_key = _process_key()
+    max_age = Config.METRICS_PUBLISH_INTERVAL * STALE_FACTOR
+    for key, (snapshot, age) in get_settings_with_prefix(SETTINGS_PREFIX).items():
+        if key != own_key and age is not None and age <= max_age:
+            _merge(total, snapshot)
+    buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+    for entry in total['histograms'].get('http_request_duration_seconds', {}).values():
+        if len(entry['buckets']) == len(buckets):
+            buckets = [a + b for a, b in zip(buckets, entry['buckets'])]
+    return {
+        'active_streams': sum(total['gauges'].get('file_active_streams', {}).values()),
+        'latency_buckets': buckets,
+    }
+
+def latency_quantile(buckets, q):
+    return _quantile(LATENCY_BUCKETS, buckets, sum(buckets), q)
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+def _series_name(name, key, extra=''):
+    labels = ','.join(part for part in (key, extra) if part)
+    return f"{PREFIX}{name}{{{labels}}}" if labels else f"{PREFIX}{name}"
+
+def render_prometheus(snapshot):
+    lines = []
+    for name, (metric_type, help_text, buckets) in METRICS.items():
+        kind = {'counter': 'counters', 'gauge': 'gauges', 'histogram': 'histograms'}[metric_type]
+        series = snapshot[kind].get(name)
+        if not series:
+            continue
+        lines.append(f"# HELP {PREFIX}{name} {help_text}")
+        lines.append(f"# TYPE {PREFIX}{name} {metric_type}")
+        for key in sorted(series):
+            if metric_type != 'histogram':
+                lines.append(f"{_series_name(name, key)} {_format_value(series[key])}")
+                continue
+            entry = series[key]
+            cumulative = 0
+            for bound, count in zip(list(buckets) + ['+Inf'], entry['buckets']):
+                cumulative += count
+                le = 'le="%s"' % bound
+                lines.append(f"{_series_name(name + '_bucket', key, le)} {cumulative}")
+            lines.append(f"{_series_name(name + '_sum', key)} {_format_value(round(entry['sum'], 6))}")
+            lines.append(f"{_series_name(name + '_count', key)} {entry['count']}")
+    return '\n'.join(lines) + '\n'
+
+def _quantile(buckets, counts, count, q):
+    # Estimación por interpolación lineal dentro del bucket, como histogram_quantile de Prometheus
+    if not count:
+        return None
+    target = q * count
+    cumulative = 0
+    lower = 0
+    for bound, bucket_count in zip(buckets, counts):
+        if cumulative + bucket_count >= target and bucket_count:
+            return round(lower + (bound - lower) * (target - cumulative) / bucket_count, 4)
+        cumulative += bucket_count
+        lower = bound
+    return buckets[-1]  # En el bucket +Inf solo se conoce la cota inferior
+
+def render_json(snapshot):
+    histograms = {}
+    for name, series in snapshot['histograms'].items():
+        buckets = METRICS[name][2]
+        histograms[name] = {
+            key: {
+                'count': entry['count'],
+                'sum': round(entry['sum'], 4),
+                'avg': round(entry['sum'] / entry['count'], 4) if entry['count'] else None,
+                'p50': _quantile(buckets, entry['buckets'], entry['count'], 0.5),
+                'p95': _quantile(buckets, entry['buckets'], entry['count'], 0.95),
+                'p99': _quantile(buckets, entry['buckets'], entry['count'], 0.99),
+            } for key, entry in series.items()
+        }
+    return {
+        'generated_at': time.time(),
+        'counters': snapshot['counters'],
+        'gauges': snapshot['gauges'],
+        'histograms': histograms,
+    }
+
+def init_request_metrics(app):
+    @app.before_request
+    def start_request_timer():
+        g._metrics_started = time.perf_counter()
+
+    @app.after_request
+    def record_request_metrics(response):
+        started = g.pop('_metrics_started', None)
+        if started is not None:
+            endpoint = request.endpoint or 'unmatched'
+            observe('http_request_duration_seconds', time.perf_counter() - started, endpoint=endpoint, method=request.method)
+            inc('http_requests_total', endpoint=endpoint, status=response.status_code)
+        return response
+
+def is_authorized(token_header, is_admin):
+    if not Config.METRICS_TOKEN or is_admin:
+        return True
+    return hmac.compare_digest(token_header or '', f"Bearer {Config.METRICS_TOKEN}")
@@ -0,0 +1,245 @@
+# Lector nativo de ISO-BMFF (MP4/MOV/M4V): metadatos sin lanzar ffprobe
+import os
+import struct
+
+ISO_EXTENSIONS = ('.mp4', '.m4v', '.mov')
+FORMAT_NAME = 'mov,mp4,m4a,3gp,3g2,mj2'  # Mismo nombre que da ffprobe para toda la familia
+
+VIDEO_CODECS = {
+    b'avc1': 'h264', b'avc3': 'h264',
+    b'hvc1': 'hevc', b'hev1': 'hevc',
+    b'av01': 'av1', b'vp09': 'vp9', b'vp08': 'vp8',
+    b'mp4v': 'mpeg4', b'jpeg': 'mjpeg', b'apcn': 'prores', b'apch': 'prores', b'apcs': 'prores',
+}
+AUDIO_CODECS = {
+    b'ac-3': 'ac3', b'ec-3': 'eac3', b'Opus': 'opus', b'fLaC': 'flac', b'alac': 'alac',
+    b'.mp3': 'mp3', b'sowt': 'pcm_s16le', b'twos': 'pcm_s16be', b'lpcm': 'pcm_s16le',
+}
+# objectTypeIndication del descriptor esds (entradas mp4a)
+ESDS_OBJECT_TYPES = {0x40: 'aac', 0x66: 'aac', 0x67: 'aac', 0x68: 'aac', 0x69: 'mp3', 0x6B: 'mp3', 0xA5: 'ac3', 0xA6: 'eac3'}
+H264_PROFILES = {
+    66: ('Constrained Baseline', 'yuv420p'), 77: ('Main', 'yuv420p'), 88: ('Extended', 'yuv420p'),
+    100: ('High', 'yuv420p'), 110: ('High 10', 'yuv420p10le'), 122: ('High 4:2:2', 'yuv422p'),
+    244: ('High 4:4:4 Predictive', 'yuv444p'),
+}
+
+class Mp4ParseError(Exception):
+    pass
+
+def _read_header(f, offset, end):
+    # Devuelve (tipo, inicio del contenido, fin de la caja) o None al llegar a end
+    if offset + 8 > end:
+        return None
+    f.seek(offset)
+    header = f.read(8)
+    if len(header) < 8:
+        return None
+    size, box_type = struct.unpack('>I4s', header)
+    header_size = 8
+    if size == 1:
+        large = f.read(8)
+        if len(large) < 8:
+            raise Mp4ParseError('Caja truncada')
+        size = struct.unpack('>Q', large)[0]
+        header_size = 16
+    elif size == 0:
+        size = end - offset
+    if size < header_size or offset + size > end:
+        raise Mp4ParseError(f"Tamaño de caja inválido en {offset}")
+    return box_type, offset + header_size, offset + size
+
+def _children(f, start, end):
+    offset = start
+    while True:
+        box = _read_header(f, offset, end)
+        if box is None:
+            return
+        yield box
+        offset = box[2]
+
+def _find(f, start, end, box_type):
+    for child in _children(f, start, end):
+        if child[0] == box_type:
+            return child
+    return None
+
+def _read(f, start, length):
+    f.seek(start)
+    data = f.read(length)
+    if len(data) < length:
+        raise Mp4ParseError('Caja truncada')
+    return data
+
+def is_faststart(file_path):
+    # True si el moov está antes que el mdat; None si no se puede determinar
+    try:
+        with open(file_path, 'rb') as f:
+            for box_type, _, _ in _children(f, 0, os.fstat(f.fileno()).st_size):
+                if box_type == b'moov':
+                    return True
+                if box_type == b'mdat':
+                    return False
+    except (OSError, Mp4ParseError, struct.error):
+        return None
+    return None
+
+def _parse_duration(f, start):
+    # mvhd / mdhd: (timescale, duración) según la versión
+    version = _read(f, start, 1)[0]
+    if version == 1:
+        timescale, duration = struct.unpack('>IQ', _read(f, start + 20, 12))
+    else:
+        timescale, duration = struct.unpack('>II', _read(f, start + 12, 8))
+    return timescale, duration
+
+def _parse_esds(f, start, end):
+    # Recorre los descriptores hasta DecoderConfigDescriptor (tag 4) y devuelve su objectTypeIndication
+    data = _read(f, start, min(end - start, 256))
+    pos = 4  # versión y flags
+    while pos < len(data):
+        tag = data[pos]
+        pos += 1
+        length = 0
+        for _ in range(4):
+            byte = data[pos]
+            pos += 1
+            length = (length << 7) | (byte & 0x7F)
+            if not byte & 0x80:
+                break
+        if tag == 3:  # ES_Descriptor: id, flags y campos opcionales; sus hijos van dentro
+            flags = data[pos + 2]
+            pos += 3
+            if flags & 0x80:
+                pos += 2
+            if flags & 0x40:
+                pos += 1 + data[pos]
+            if flags & 0x20:
+                pos += 2
+            continue
+        if tag == 4:
+            return data[pos]
+        pos += length
+    return None
+
+def _parse_sample_entry(f, start, end, handler):
+    box = _read_header(f, start + 8, end)  # Primera entrada de stsd (tras versión/flags y número de entradas)
+    if box is None:
+        raise Mp4ParseError('stsd vacío')
+    fourcc, entry_start, entry_end = box
+    stream = {}
+    if handler == b'vide':
+        if fourcc not in VIDEO_CODECS:
+            raise Mp4ParseError(f"Códec de video no reconocido: {fourcc!r}")
+        stream['codec_name'] = VIDEO_CODECS[fourcc]
+        width, height = struct.unpack('>HH', _read(f, entry_start + 24, 4))
+        stream['width'], stream['height'] = width, height
+        if stream['codec_name'] == 'h264':
+            # Tras los 78 bytes de VisualSampleEntry vienen las cajas hijas (avcC, pasp, btrt...)
+            avcc = _find(f, entry_start + 78, entry_end, b'avcC')
+            if avcc:
+                profile_idc = _read(f, avcc[1] + 1, 1)[0]
+                profile, pix_fmt = H264_PROFILES.get(profile_idc, (str(profile_idc), None))
+                stream['profile'] = profile
+                if pix_fmt:
+                    stream['pix_fmt'] = pix_fmt
+    elif handler == b'soun':
+        # Las descripciones de sonido de QuickTime v1/v2 añaden campos antes de las cajas hijas
+        sound_version = struct.unpack('>H', _read(f, entry_start + 8, 2))[0]
+        children_start = entry_start + {1: 44, 2: 64}.get(sound_version, 28)
+        if fourcc == b'mp4a':
+            esds = _find(f, children_start, entry_end, b'esds')
+            wave = _find(f, children_start, entry_end, b'wave') if not esds else None
+            if wave:
+                esds = _find(f, wave[1], wave[2], b'esds')
+            object_type = _parse_esds(f, esds[1], esds[2]) if esds else None
+            if object_type not in ESDS_OBJECT_TYPES:
+                raise Mp4ParseError(f"Audio mp4a con tipo {object_type} no reconocido")
+            stream['codec_name'] = ESDS_OBJECT_TYPES[object_type]
+        elif fourcc in AUDIO_CODECS:
+            stream['codec_name'] = AUDIO_CODECS[fourcc]
+        else:
+            raise Mp4ParseError(f"Códec de audio no reconocido: {fourcc!r}")
+        if sound_version == 2:
+            sample_rate, channels = struct.unpack('>dI', _read(f, entry_start + 32, 12))
+            stream['channels'] = channels
+            stream['sample_rate'] = str(int(sample_rate))
+        else:
+            channels, _, _, _, sample_rate = struct.unpack('>HHHHI', _read(f, entry_start + 16, 12))
+            stream['channels'] = channels
+            stream['sample_rate'] = str(sample_rate >> 16)
+    return stream
+
+def _parse_trak(f, start, end):
+    mdia = _find(f, start, end, b'mdia')
+    if not mdia:
+        return None
+    hdlr = _find(f, mdia[1], mdia[2], b'hdlr')
+    if not hdlr:
+        return None
+    handler = _read(f, hdlr[1] + 8, 4)
+    if handler not in (b'vide', b'soun'):
+        return None  # Subtítulos, timecode, etc.
+    stream = {'codec_type': 'video' if handler == b'vide' else 'audio'}
+    mdhd = _find(f, mdia[1], mdia[2], b'mdhd')
+    if mdhd:
+        timescale, duration = _parse_duration(f, mdhd[1])
+        if timescale:
+            stream['duration'] = duration / timescale
+    minf = _find(f, mdia[1], mdia[2], b'minf')
+    stbl = _find(f, minf[1], minf[2], b'stbl') if minf else None
+    stsd = _find(f, stbl[1], stbl[2], b'stsd') if stbl else None
+    if not stsd:
+        raise Mp4ParseError('Pista sin stsd')
+    stream.update(_parse_sample_entry(f, stsd[1], stsd[2], handler))
+    return stream
+
+def parse_mp4(file_path):
+    # Devuelve el mismo diccionario que get_video_info, más 'faststart'; Mp4ParseError si no se puede leer
+    with open(file_path, 'rb') as f:
+        file_size = os.fstat(f.fileno()).st_size
+        moov = None
+        faststart = None
+        for box_type, start, end in _children(f, 0, file_size):
+            if box_type == b'moov':
+                moov = (start, end)
+                if faststart is None:
+                    faststart = True
+            elif box_type == b'mdat' and faststart is None:
+                faststart = False
+        if moov is None:
+            raise Mp4ParseError('No hay caja moov')
+        mvhd = _find(f, moov[0], moov[1], b'mvhd')
+        if not mvhd:
+            raise Mp4ParseError('No hay caja mvhd')
+        timescale, duration_units = _parse_duration(f, mvhd[1])
+        duration = duration_units / timescale if timescale else 0
+        streams = []
+        for box_type, start, end in _children(f, moov[0], moov[1]):
+            if box_type != b'trak':
+                continue
+            stream = _parse_trak(f, start, end)
+            if stream:
+                stream['index'] = len(streams)
+                streams.append(stream)
+    if not duration:
+        # MP4 fragmentado: la duración está repartida por los fragmentos
+        duration = max((s.get('duration', 0) for s in streams), default=0)
+    if not duration:
+        raise Mp4ParseError('Duración desconocida (¿MP4 fragmentado?)')
+    video_stream = next((s for s in streams if s['codec_type'] == 'video'), None)
+    audio_stream = next((s for s in streams if s['codec_type'] == 'audio'), None)
+    for stream in streams:
+        stream.pop('duration', None)
+    return {
+        'file_path': file_path,
+        'size_mb': round(file_size / (1024 * 1024), 2),
+        'format': FORMAT_NAME,
+        'video_codec': video_stream['codec_name'] if video_stream else 'N/A',
+        'audio_codec': audio_stream['codec_name'] if audio_stream else 'N/A',
+        'duration': duration,
+        'bit_rate': int(file_size * 8 / duration),
+        'width': video_stream.get('width') if video_stream else None,
+        'height': video_stream.get('height') if video_stream else None,
+        'streams': streams,
+        'faststart': faststart,
+    }
@@ -0,0 +1,316 @@
+# Perfilado bajo demanda de peticiones: cProfile o muestreo estadístico, más tiempos de SQL, plantillas y disco.
+# Los perfiles se guardan en PROFILING_DIR (anillo de PROFILING_BUFFER_SIZE archivos) para verlos desde
+# cualquier proceso web.
+import cProfile
+import io
+import json
+import os
+import pstats
+import queue
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+from flask import g, has_request_context, request, before_render_template, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from app.config import Config  # Importar Config
+
+SETTINGS_KEY = 'profiling.settings'
+MODES = ('cprofile', 'sample')
+DEFAULT_SETTINGS = {'enabled': False, 'sample_rate': 0.1, 'mode': 'cprofile', 'endpoints': ''}
+SETTINGS_TTL = 5  # Segundos que cada proceso reutiliza los ajustes leídos de la base de datos
+SLOWEST_QUERIES = 10
+TOP_FUNCTIONS = 40
+MAX_EVENTS = 200  # Llamadas a disco / plantillas guardadas por petición
+
+_settings_cache = {'value': None, 'loaded_at': 0}
+_write_queue = queue.Queue(maxsize=50)
+_lock = threading.Lock()
+_started = False
+
+# Muestreo estadístico: un único hilo toma la pila de los hilos con una petición perfilada
+_sampled_threads = {}  # thread_id -> Counter de pilas plegadas
+_sampler_wakeup = threading.Event()
+
+def get_profiling_settings():
+    from app.services.settings_service import get_setting
+    now = time.monotonic()
+    if _settings_cache['value'] is None or now - _settings_cache['loaded_at'] > SETTINGS_TTL:
+        settings = dict(DEFAULT_SETTINGS)
+        settings.update(get_setting(SETTINGS_KEY) or {})
+        _settings_cache.update(value=settings, loaded_at=now)
+    return _settings_cache['value']
+
+def set_profiling_settings(enabled, sample_rate, mode, endpoints=''):
+    from app.services.settings_service import set_setting
+    settings = {
+        'enabled': bool(enabled),
+        'sample_rate': min(1.0, max(0.0, float(sample_rate))),
+        'mode': mode if mode in MODES else 'cprofile',
+        'endpoints': ','.join(e.strip() for e in endpoints.split(',') if e.strip()),
+    }
+    set_setting(SETTINGS_KEY, settings)
+    _settings_cache['value'] = None
+    return settings
+
+def _current():
+    # Perfil de la petición actual, o None (camino rápido cuando el perfilado está apagado)
+    if not has_request_context():
+        return None
+    return g.get('_profile')
+
+@contextmanager
+def fs_timer(operation, path):
+    profile = _current()
+    if profile is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = (time.perf_counter() - start) * 1000
+        profile['fs']['count'] += 1
+        profile['fs']['total_ms'] += elapsed
+        if len(profile['fs']['calls']) < MAX_EVENTS:
+            profile['fs']['calls'].append({'op': operation, 'path': path, 'ms': round(elapsed, 3)})
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current() is not None:
+        conn.info.setdefault('_profile_query_start', []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = _current()
+    starts = conn.info.get('_profile_query_start')
+    if profile is None or not starts:
+        return
+    elapsed = (time.perf_counter() - starts.pop()) * 1000
+    profile['db']['count'] += 1
+    profile['db']['total_ms'] += elapsed
+    profile['db']['queries'].append((round(elapsed, 3), ' '.join(statement.split())[:500]))
+
+def _before_render(sender, template, context, **extra):
+    profile = _current()
+    if profile is not None:
+        profile['_template_starts'].append(time.perf_counter())
+
+def _after_render(sender, template, context, **extra):
+    profile = _current()
+    if profile is None or not profile['_template_starts']:
+        return
+    elapsed = (time.perf_counter() - profile['_template_starts'].pop()) * 1000
+    if len(profile['templates']) < MAX_EVENTS:
+        profile['templates'].append({'name': template.name, 'ms': round(elapsed, 3)})
+
+def _fold_stack(frame):
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}")
+        frame = frame.f_back
+    return ';'.join(reversed(stack))
+
+def _sampler_loop():
+    interval = Config.PROFILING_SAMPLE_INTERVAL_MS / 1000
+    while True:
+        _sampler_wakeup.wait()
+        frames = sys._current_frames()
+        with _lock:
+            for thread_id, stacks in _sampled_threads.items():
+                frame = frames.get(thread_id)
+                if frame is not None:
+                    stacks[_fold_stack(frame)] += 1
+            if not _sampled_threads:
+                _sampler_wakeup.clear()
+        del frames
+        time.sleep(interval)
+
+def _start_profiler(profile):
+    if profile['mode'] == 'sample':
+        with _lock:
+            _sampled_threads[threading.get_ident()] = Counter()
+        _sampler_wakeup.set()
+        return
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # Python 3.12+: solo un cProfile activo por proceso; la petición se registra sin perfil de funciones
+        profile['profile_error'] = 'Otro perfil de cProfile estaba activo'
+        return
+    profile['_profiler'] = profiler
+
+def _stop_profiler(profile):
+    if profile['mode'] == 'sample':
+        with _lock:
+            stacks = _sampled_threads.pop(threading.get_ident(), Counter())
+        profile['samples'] = sum(stacks.values())
+        profile['stacks'] = dict(stacks.most_common(TOP_FUNCTIONS * 5))
+        return None
+    profiler = profile.pop('_profiler', None)
+    if profiler is None:
+        return None
+    profiler.disable()
+    output = io.StringIO()
+    stats = pstats.Stats(profiler, stream=output)
+    stats.sort_stats('cumulative').print_stats(TOP_FUNCTIONS)
+    profile['functions'] = output.getvalue()
+    return stats
+
+def _should_profile(settings):
+    if not settings['enabled'] or request.endpoint in (None, 'static') or request.endpoint.startswith('profiling'):
+        return False
+    endpoints = settings['endpoints']
+    if endpoints and request.endpoint not in endpoints.split(','):
+        return False
+    return random.random() < settings['sample_rate']
+
+def _finish(response_status):
+    profile = g.pop('_profile', None)
+    if profile is None:
+        return
+    stats = _stop_profiler(profile)
+    profile['status'] = response_status
+    profile['duration_ms'] = round((time.perf_counter() - profile.pop('_started')) * 1000, 3)
+    profile.pop('_template_starts', None)
+    queries = profile['db'].pop('queries')
+    profile['db']['total_ms'] = round(profile['db']['total_ms'], 3)
+    profile['db']['slowest'] = sorted(queries, reverse=True)[:SLOWEST_QUERIES]
+    profile['fs']['total_ms'] = round(profile['fs']['total_ms'], 3)
+    try:
+        _write_queue.put_nowait((profile, stats))
+    except queue.Full:
+        pass  # El escritor va atrasado: se pierde este perfil, nunca se frena la petición
+
+def _profile_path(profile_id, extension='json'):
+    return os.path.join(Config.PROFILING_DIR, f"{profile_id}.{extension}")
+
+def _prune():
+    names = sorted(name for name in os.listdir(Config.PROFILING_DIR) if name.endswith('.json'))
+    for name in names[:max(0, len(names) - Config.PROFILING_BUFFER_SIZE)]:
+        profile_id = name[:-len('.json')]
+        for extension in ('json', 'prof'):
+            try:
+                os.remove(_profile_path(profile_id, extension))
+            except OSError:
+                pass
+
+def profile_writer(app):
+    os.makedirs(Config.PROFILING_DIR, exist_ok=True)
+    while True:
+        profile, stats = _write_queue.get()
+        try:
+            if stats is not None:
+                stats.dump_stats(_profile_path(profile['id'], 'prof'))
+                profile['has_prof'] = True
+            temp_path = _profile_path(profile['id'], 'json.tmp')
+            with open(temp_path, 'w') as f:
+                json.dump(profile, f)
+            os.replace(temp_path, _profile_path(profile['id']))
+            _prune()
+        except Exception as e:
+            app.logger.error(f"Error al guardar el perfil {profile['id']}: {str(e)}", exc_info=True)
+
+def init_profiling(app):
+    global _started
+    with _lock:
+        if not _started:
+            _started = True
+            event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+            threading.Thread(target=profile_writer, args=(app,), daemon=True).start()
+            threading.Thread(target=_sampler_loop, daemon=True).start()
+    before_render_template.connect(_before_render, app)
+    template_rendered.connect(_after_render, app)
+
+    @app.before_request
+    def start_request_profile():
+        try:
+            settings = get_profiling_settings()
+            if not _should_profile(settings):
+                return
+        except Exception as e:
+            app.logger.error(f"Error al leer los ajustes de perfilado: {str(e)}", exc_info=True)
+            return
+        # El id empieza por la fecha: el orden alfabético de los archivos es el cronológico
+        profile = {
+            'id': f"{datetime.utcnow().strftime('%Y%m%dT%H%M%S%f')}-{uuid.uuid4().hex[:6]}",
+            'timestamp': datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S'),
+            'endpoint': request.endpoint,
+            'method': request.method,
+            'path': request.full_path.rstrip('?'),
+            'process': os.getpid(),
+            'mode': settings['mode'],
+            'db': {'count': 0, 'total_ms': 0.0, 'queries': []},
+            'fs': {'count': 0, 'total_ms': 0.0, 'calls': []},
+            'templates': [],
+            '_template_starts': [],
+            '_started': time.perf_counter(),
+        }
+        g._profile = profile
+        _start_profiler(profile)
+
+    @app.after_request
+    def finish_request_profile(response):
+        _finish(response.status_code)
+        return response
+
+    @app.teardown_request
+    def abort_request_profile(exc):
+        # Si after_request no llegó a ejecutarse (excepción) el perfilador no puede quedar activo
+        _finish(500)
+
+def list_profiles(limit=None):
+    if not os.path.isdir(Config.PROFILING_DIR):
+        return []
+    names = sorted((name for name in os.listdir(Config.PROFILING_DIR) if name.endswith('.json')), reverse=True)
+    profiles = []
+    for name in names[:limit]:
+        try:
+            with open(os.path.join(Config.PROFILING_DIR, name)) as f:
+                profile = json.load(f)
+        except (OSError, ValueError):
+            continue  # Eliminado por el anillo mientras se listaba
+        summary = {key: profile.get(key) for key in (
+            'id', 'timestamp', 'endpoint', 'method', 'path', 'status', 'duration_ms', 'mode', 'process'
+        )}
+        summary.update({
+            'db_ms': profile['db']['total_ms'],
+            'db_count': profile['db']['count'],
+            'fs_ms': profile['fs']['total_ms'],
+            'template_ms': round(sum(t['ms'] for t in profile['templates']), 3),
+        })
+        profiles.append(summary)
+    return profiles
+
+def get_profile(profile_id):
+    if not profile_id.replace('-', '').isalnum():
+        return None
+    try:
+        with open(_profile_path(profile_id)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def get_profile_file(profile_id, extension):
+    # Ruta del archivo descargable (.json o .prof de cProfile) o None
+    if extension not in ('json', 'prof') or not profile_id.replace('-', '').isalnum():
+        return None
+    path = _profile_path(profile_id, extension)
+    return path if os.path.isfile(path) else None
+
+def clear_profiles():
+    removed = 0
+    if os.path.isdir(Config.PROFILING_DIR):
+        for name in os.listdir(Config.PROFILING_DIR):
+            try:
+                os.remove(os.path.join(Config.PROFILING_DIR, name))
+                removed += 1
+            except OSError:
+                pass
+    return removed
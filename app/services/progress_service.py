@@ -0,0 +1,138 @@
+# Progreso de ffmpeg (-progress) y difusión del estado de la cola a la interfaz (Server-Sent Events)
+import queue
+import re
+import threading
+import time
+from app.config import Config  # Importar Config
+
+_KEY_VALUE = re.compile(r'^([a-z_0-9]+)=(.*)$')
+
+_subscribers = set()
+_subscribers_lock = threading.Lock()
+_poller_started = False
+_last_snapshot = None
+
+def parse_progress(lines):
+    # Agrupa las líneas key=value de -progress en bloques; cada bloque termina con progress=continue|end
+    block = {}
+    for line in lines:
+        match = _KEY_VALUE.match(line.strip())
+        if not match:
+            continue
+        key, value = match.groups()
+        block[key] = value.strip()
+        if key == 'progress':
+            yield block
+            block = {}
+
+def _to_float(value):
+    try:
+        return float(str(value).rstrip('x').replace('kbits/s', ''))
+    except (TypeError, ValueError):
+        return None
+
+def summarize_progress(block, duration):
+    # Convierte un bloque de -progress en progreso, ETA y estadísticas de la codificación
+    out_time_us = block.get('out_time_us') or block.get('out_time_ms')  # out_time_ms también va en microsegundos
+    elapsed = (_to_float(out_time_us) or 0) / 1_000_000
+    speed = _to_float(block.get('speed'))
+    summary = {
+        'elapsed': round(elapsed, 2),
+        'fps': _to_float(block.get('fps')),
+        'speed': speed,
+        'bitrate_kbps': _to_float(block.get('bitrate')),
+        'total_size': int(block['total_size']) if block.get('total_size', '').isdigit() else None,
+        'finished': block.get('progress') == 'end',
+        'progress': None,
+        'eta_seconds': None,
+    }
+    if duration and duration > 0:
+        summary['progress'] = 100 if summary['finished'] else min(99, int(elapsed / duration * 100))
+        remaining = max(0.0, duration - elapsed)
+        # La ETA usa la velocidad real de codificación (speed=2.5x => 2,5 s de video por segundo)
+        summary['eta_seconds'] = round(remaining / speed) if speed else None
+    return summary
+
+def format_eta(seconds):
+    if seconds is None:
+        return 'Calculando...'
+    if seconds <= 0:
+        return 'Finalizando...'
+    return f"{int(seconds // 60)}m {int(seconds % 60)}s"
+
+def format_message(verb, summary):
+    parts = [f"{verb} ({summary['progress']}%)" if summary['progress'] is not None else verb]
+    if summary['speed']:
+        parts.append(f"{summary['speed']:g}x")
+    if summary['fps']:
+        parts.append(f"{summary['fps']:g} fps")
+    return ' · '.join(parts)
+
+def subscribe(app):
+    # Cada cliente SSE recibe instantáneas por su propia cola; un único hilo por proceso consulta la base de datos
+    subscriber = queue.Queue(maxsize=5)
+    with _subscribers_lock:
+        _subscribers.add(subscriber)
+        if _last_snapshot is not None:
+            subscriber.put_nowait(_last_snapshot)
+    _start_poller(app)
+    return subscriber
+
+def unsubscribe(subscriber):
+    with _subscribers_lock:
+        _subscribers.discard(subscriber)
+
+def _broadcast(snapshot):
+    with _subscribers_lock:
+        for subscriber in _subscribers:
+            try:
+                subscriber.put_nowait(snapshot)
+            except queue.Full:
+                # Cliente lento: se descarta la instantánea más antigua, solo importa la última
+                try:
+                    subscriber.get_nowait()
+                except queue.Empty:
+                    pass
+                subscriber.put_nowait(snapshot)
+
+def _take_snapshot():
+    from app.services import scheduler_service
+    status = scheduler_service.get_scheduler_status()
+    return {
+        'jobs': scheduler_service.get_active_jobs(),
+        'queued': status['queued'],
+        'running': status['running'],
+        'max_queue_size': status['max_queue_size'],
+        'paused': status['paused'],
+        'throttle': status['throttle'],
+    }
+
+def _poll_loop(app):
+    global _last_snapshot
+    from app.__init__ import db
+    while True:
+        time.sleep(Config.PROGRESS_PUBLISH_INTERVAL)
+        with _subscribers_lock:
+            idle = not _subscribers
+        if idle:
+            _last_snapshot = None
+            continue
+        with app.app_context():
+            try:
+                snapshot = _take_snapshot()
+            except Exception as e:
+                app.logger.error(f"Error al leer el estado de la cola: {str(e)}", exc_info=True)
+                continue
+            finally:
+                db.session.remove()
+        if snapshot != _last_snapshot:
+            _last_snapshot = snapshot
+            _broadcast(snapshot)
+
+def _start_poller(app):
+    global _poller_started
+    with _subscribers_lock:
+        if _poller_started:
+            return
+        _poller_started = True
+    threading.Thread(target=_poll_loop, args=(app,), name='progress-poller', daemon=True).start()
@@ -0,0 +1,393 @@
+# Planificador de conversiones: cola persistente en base de datos y pool de workers
+import hashlib
+import json
+import os
+import shutil
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from flask import current_app
+from app.__init__ import db
+from app.config import Config  # Importar Config
+from app.models.job_model import ConversionJob
+from app.services.settings_service import get_setting, set_setting
+from app.services.metrics_service import inc, observe
+from app.services import throttle_service
+
+# Prioridades: menor valor = antes
+PRIORITY_ADMIN = 0
+PRIORITY_AUTO = 1
+
+ACTIVE_STATES = ('queued', 'processing')
+FINISHED_STATES = ('completed', 'failed')
+JOB_PURGE_INTERVAL = 3600  # Segundos entre limpiezas del historial de trabajos
+
+# Solo despierta a los workers de este proceso; los demás sondean cada JOB_POLL_INTERVAL
+_condition = threading.Condition()
+# Identifica este arranque: distingue trabajos huérfanos de un proceso anterior en el mismo host
+_boot_id = uuid.uuid4().hex[:8]
+
+def get_cpu_count():
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+def get_worker_count():
+    # Sin valor explícito, tantos workers como quepan con FFMPEG_THREADS hilos cada uno
+    if Config.CONVERSION_WORKERS > 0:
+        return Config.CONVERSION_WORKERS
+    return max(1, get_cpu_count() // max(1, Config.FFMPEG_THREADS))
+
+def make_worker_id():
+    return f"{socket.gethostname()}:{_boot_id}:{threading.current_thread().name}"
+
+def _job_to_dict(job):
+    return {
+        'id': job.id,
+        'file_path': job.file_path,
+        'job_type': job.job_type,
+        'attempts': job.attempts,
+        'duration': job.duration,
+        'temp_path': job.temp_path,
+        'payload': json.loads(job.payload) if job.payload else {},
+    }
+
+def get_temp_prefix(file_path):
+    # Prefijo común de todos los temporales de un archivo en TEMP_DIR
+    return hashlib.md5(file_path.encode()).hexdigest()
+
+def submit(file_path, priority=PRIORITY_AUTO, duration=0, job_type='convert', payload=None, temp_path=None,
+           follow_up=False):
+    # follow_up: continuación de un trabajo ya admitido (HLS tras convertir), no cuenta para MAX_QUEUE_SIZE
+    try:
+        active = ConversionJob.query.filter(
+            ConversionJob.file_path == file_path,
+            ConversionJob.job_type == job_type,
+            ConversionJob.state.in_(ACTIVE_STATES)
+        ).first()
+        if active and active.state == 'queued' and priority < active.priority:
+            # Un administrador adelanta un trabajo automático ya encolado (fuera de la ventana no arrancaría)
+            active.priority = priority
+            if payload:
+                active.payload = json.dumps({**(json.loads(active.payload) if active.payload else {}), **payload})
+            db.session.commit()
+            with _condition:
+                _condition.notify()
+            return True
+        # El límite solo frena lo que encola el escaneo: los trabajos automáticos no se pueden reclamar fuera de
+        # la ventana de conversión y, si contaran para todo, dejarían sin sitio a los que pide un administrador
+        if active:
+            _reject(file_path, job_type, priority, 'activo', follow_up)
+            return False
+        if priority != PRIORITY_ADMIN and not follow_up and auto_qsize() >= get_max_queue_size():
+            _reject(file_path, job_type, priority, 'cola llena', follow_up)
+            return False
+        db.session.add(ConversionJob(
+            file_path=file_path, job_type=job_type, priority=priority, duration=duration or 0,
+            max_attempts=Config.JOB_MAX_ATTEMPTS, temp_path=temp_path, message='En cola', eta='Esperando...',
+            payload=json.dumps(payload) if payload else None, created_at=datetime.utcnow()
+        ))
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Error en submit: {str(e)}", exc_info=True)
+        return False
+    with _condition:
+        _condition.notify()
+    return True
+
+def _reject(file_path, job_type, priority, reason, follow_up):
+    # Lo que encola el escaneo se vuelve a intentar en cada pasada: solo se anota en DEBUG
+    inc('conversion_rejected_total', job_type=job_type, reason=reason)
+    log = current_app.logger.debug if priority == PRIORITY_AUTO and not follow_up else current_app.logger.info
+    log(f"No se encola {job_type} de {file_path}: {reason}")
+
+def _claim_job(worker_id):
+    query = ConversionJob.query.filter_by(state='queued')
+    if not throttle_service.in_conversion_window():
+        # Fuera de la ventana de baja demanda solo arranca lo que pide un administrador
+        query = query.filter(ConversionJob.priority == PRIORITY_ADMIN)
+    if Config.CONVERSION_ORDER == 'shortest':
+        query = query.order_by(ConversionJob.priority, ConversionJob.duration, ConversionJob.id)
+    else:
+        query = query.order_by(ConversionJob.priority, ConversionJob.id)
+    # SKIP LOCKED: varios procesos/contenedores pueden reclamar a la vez sin pisarse
+    job = query.with_for_update(skip_locked=True).first()
+    if not job:
+        db.session.rollback()
+        return None
+    now = datetime.utcnow()
+    job.state = 'processing'
+    job.worker_id = worker_id
+    job.attempts += 1
+    job.started_at = now
+    job.heartbeat_at = now
+    job.lease_expires_at = now + timedelta(seconds=Config.JOB_LEASE_SECONDS)
+    job.message = 'Iniciando'
+    db.session.commit()
+    observe('conversion_wait_seconds', (now - job.created_at).total_seconds(), job_type=job.job_type)
+    return _job_to_dict(job)
+
+def next_job(worker_id):
+    # Bloquea hasta reclamar un trabajo; requiere contexto de aplicación
+    while True:
+        # Con el servido saturado no se empiezan trabajos nuevos (los que corren están detenidos)
+        if not is_paused() and not throttle_service.is_suspended():
+            try:
+                job = _claim_job(worker_id)
+            except Exception as e:
+                db.session.rollback()
+                current_app.logger.error(f"Error al reclamar trabajo: {str(e)}", exc_info=True)
+                job = None
+            if job:
+                return job
+        with _condition:
+            _condition.wait(timeout=Config.JOB_POLL_INTERVAL)
+
+def heartbeat(job_id, worker_id, progress=None, message=None, eta=None):
+    # Renueva el lease; devuelve False si el trabajo ya no pertenece a este worker
+    try:
+        now = datetime.utcnow()
+        values = {
+            'heartbeat_at': now,
+            'lease_expires_at': now + timedelta(seconds=Config.JOB_LEASE_SECONDS),
+        }
+        if progress is not None:
+            values['progress'] = progress
+        if message is not None:
+            values['message'] = message
+        if eta is not None:
+            values['eta'] = eta
+        updated = ConversionJob.query.filter_by(id=job_id, worker_id=worker_id, state='processing').update(values)
+        db.session.commit()
+        return updated == 1
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Error en heartbeat del trabajo {job_id}: {str(e)}", exc_info=True)
+        return True
+
+def finish_job(job_id, worker_id, state, message='', progress=None, result=None):
+    try:
+        values = {'state': state, 'message': message, 'finished_at': datetime.utcnow(), 'lease_expires_at': None}
+        if progress is not None:
+            values['progress'] = progress
+        if result is not None:
+            values['result'] = json.dumps(result)
+        ConversionJob.query.filter_by(id=job_id, worker_id=worker_id).update(values)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Error en finish_job: {str(e)}", exc_info=True)
+
+def _remove_temp(path):
+    # Los trabajos HLS usan un directorio temporal en lugar de un archivo
+    if path and os.path.exists(path):
+        try:
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            else:
+                os.remove(path)
+            current_app.logger.info(f"Archivo temporal huérfano eliminado: {path}")
+        except OSError as e:
+            current_app.logger.warning(f"No se pudo eliminar {path}: {str(e)}")
+
+def recover_jobs(startup=False):
+    # Reencola (o marca como fallidos) los trabajos cuyo lease expiró y limpia temporales huérfanos.
+    # Al arrancar también se recuperan sin esperar al lease los de un arranque anterior de este host
+    # (las conversiones se ejecutan en un único proceso por host).
+    now = datetime.utcnow()
+    try:
+        interrupted = ConversionJob.lease_expires_at < now
+        if startup:
+            host_prefix = f"{socket.gethostname()}:"
+            interrupted = db.or_(interrupted, db.and_(
+                ConversionJob.worker_id.startswith(host_prefix),
+                ~ConversionJob.worker_id.startswith(f"{host_prefix}{_boot_id}:")
+            ))
+        expired = ConversionJob.query.filter(
+            ConversionJob.state == 'processing', interrupted
+        ).with_for_update(skip_locked=True).all()
+        for job in expired:
+            _remove_temp(job.temp_path)
+            if job.attempts >= job.max_attempts:
+                job.state = 'failed'
+                job.finished_at = now
+                job.message = f"Interrumpido {job.attempts} veces, se abandona"
+            else:
+                job.state = 'queued'
+                job.message = f"Reencolado tras interrupción (intento {job.attempts}/{job.max_attempts})"
+            job.worker_id = None
+            job.lease_expires_at = None
+            job.progress = 0
+            job.eta = 'Esperando...'
+            current_app.logger.warning(f"Trabajo {job.id} ({job.file_path}) interrumpido: {job.message}")
+        db.session.commit()
+
+        # Los temporales en uso pertenecen a trabajos con lease vigente. Además de temp_path, un trabajo usa
+        # otros temporales con el mismo prefijo (md5 de su ruta): trozos de la conversión por segmentos y
+        # clips de la estimación. El mtime de esos directorios no cambia mientras ffmpeg escribe en un trozo
+        rows = db.session.query(ConversionJob.file_path, ConversionJob.temp_path).filter(ConversionJob.state == 'processing').all()
+        in_use = {temp_path for _, temp_path in rows if temp_path}
+        in_use_prefixes = {get_temp_prefix(file_path) for file_path, _ in rows}
+        if os.path.isdir(Config.TEMP_DIR):
+            cutoff = time.time() - Config.JOB_LEASE_SECONDS
+            for name in os.listdir(Config.TEMP_DIR):
+                path = os.path.join(Config.TEMP_DIR, name)
+                if path in in_use or name.split('_', 1)[0] in in_use_prefixes:
+                    continue
+                if os.path.getmtime(path) < cutoff:
+                    _remove_temp(path)
+        return len(expired)
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Error en recover_jobs: {str(e)}", exc_info=True)
+        return 0
+
+def purge_finished_jobs(retention_days=None):
+    # Borra los trabajos terminados hace más de JOB_RETENTION_DAYS. Se conserva el último de cada archivo, tipo y
+    # estado: el estado que muestra el gestor y el último completado (p. ej. el paquete HLS publicado)
+    retention_days = Config.JOB_RETENTION_DAYS if retention_days is None else retention_days
+    if retention_days <= 0:
+        return 0
+    try:
+        cutoff = datetime.utcnow() - timedelta(days=retention_days)
+        latest = db.select(db.func.max(ConversionJob.id)) \
+            .group_by(ConversionJob.file_path, ConversionJob.job_type, ConversionJob.state)
+        deleted = ConversionJob.query.filter(
+            ConversionJob.state.in_(FINISHED_STATES),
+            ConversionJob.finished_at < cutoff,
+            ConversionJob.id.not_in(latest)
+        ).delete(synchronize_session=False)
+        db.session.commit()
+        if deleted:
+            current_app.logger.info(f"Historial de trabajos: {deleted} trabajos antiguos eliminados")
+        return deleted
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Error en purge_finished_jobs: {str(e)}", exc_info=True)
+        return 0
+
+def job_janitor(app):
+    last_purge = 0
+    while True:
+        time.sleep(Config.JOB_LEASE_SECONDS)
+        with app.app_context():
+            recover_jobs()
+            if time.monotonic() - last_purge >= JOB_PURGE_INTERVAL:
+                purge_finished_jobs()
+                last_purge = time.monotonic()
+
+def get_active_jobs():
+    jobs = ConversionJob.query.filter(ConversionJob.state.in_(ACTIVE_STATES)) \
+        .order_by(ConversionJob.state.desc(), ConversionJob.priority, ConversionJob.id).all()
+    return [{
+        'id': job.id,
+        'file_path': job.file_path,
+        'job_type': job.job_type,
+        'status': job.state,
+        'message': job.message,
+        'progress': job.progress,
+        'eta': job.eta,
+        'attempts': job.attempts,
+        'worker_id': job.worker_id,
+    } for job in jobs]
+
+def get_recent_results(job_type, limit=10):
+    # Últimos trabajos terminados de un tipo, con su resultado (p. ej. las estimaciones para el gestor de videos)
+    jobs = ConversionJob.query.filter(ConversionJob.job_type == job_type, ConversionJob.state.in_(FINISHED_STATES)) \
+        .order_by(ConversionJob.finished_at.desc(), ConversionJob.id.desc()).limit(limit).all()
+    return [{
+        'id': job.id,
+        'file_path': job.file_path,
+        'status': job.state,
+        'message': job.message,
+        'result': json.loads(job.result) if job.result else {},
+        'finished_at': job.finished_at,
+    } for job in jobs]
+
+def get_job_states(job_type='convert'):
+    # Último estado conocido de cada archivo: solo se lee la fila más reciente de cada uno (ix_conversion_job_latest)
+    latest = db.select(db.func.max(ConversionJob.id)) \
+        .filter(ConversionJob.job_type == job_type).group_by(ConversionJob.file_path)
+    rows = db.session.query(ConversionJob.file_path, ConversionJob.state, ConversionJob.message) \
+        .filter(ConversionJob.id.in_(latest))
+    return {file_path: {'status': state, 'message': message or ''} for file_path, state, message in rows}
+
+def get_jobs_version():
+    # Cambia al encolar, arrancar o terminar un trabajo: una sola consulta de agregados para saber si los
+    # estados que muestra el gestor siguen vigentes
+    row = db.session.query(db.func.max(ConversionJob.id), db.func.max(ConversionJob.started_at),
+                           db.func.max(ConversionJob.finished_at),
+                           db.func.sum(db.case((ConversionJob.state == 'queued', 1), else_=0))).one()
+    return tuple(str(value) for value in row)
+
+def get_completed_at(job_type):
+    # Ruta -> fin del último trabajo completado de ese tipo (p. ej. paquetes HLS publicados)
+    rows = db.session.query(ConversionJob.file_path, db.func.max(ConversionJob.finished_at)) \
+        .filter(ConversionJob.job_type == job_type, ConversionJob.state == 'completed') \
+        .group_by(ConversionJob.file_path)
+    return {file_path: finished_at for file_path, finished_at in rows if finished_at}
+
+def get_queue_depths():
+    # {tipo: {'queued': n, 'processing': n}} para las métricas
+    depths = {}
+    rows = db.session.query(ConversionJob.job_type, ConversionJob.state, db.func.count(ConversionJob.id)) \
+        .filter(ConversionJob.state.in_(ACTIVE_STATES)).group_by(ConversionJob.job_type, ConversionJob.state)
+    for job_type in ('convert', 'hls'):
+        depths[job_type] = {'queued': 0, 'processing': 0}
+    for job_type, state, count in rows:
+        depths.setdefault(job_type, {'queued': 0, 'processing': 0})[state] = count
+    return depths
+
+def pause():
+    # La pausa se guarda en la base de datos para que la vean todos los procesos
+    set_setting('scheduler.paused', True)
+
+def resume():
+    set_setting('scheduler.paused', False)
+    with _condition:
+        _condition.notify_all()
+
+def is_paused():
+    return bool(get_setting('scheduler.paused', False))
+
+def qsize():
+    return ConversionJob.query.filter_by(state='queued').count()
+
+def auto_qsize():
+    return ConversionJob.query.filter_by(state='queued', priority=PRIORITY_AUTO).count()
+
+def get_max_queue_size():
+    return get_setting('scheduler.max_queue_size', Config.MAX_QUEUE_SIZE)
+
+def is_full():
+    return auto_qsize() >= get_max_queue_size()
+
+def running_count():
+    return ConversionJob.query.filter_by(state='processing').count()
+
+def set_queue_size(new_size):
+    # Reducir el tamaño nunca descarta trabajos: solo impide encolar más hasta bajar del límite
+    new_size = max(1, new_size)
+    set_setting('scheduler.max_queue_size', new_size)
+    return max(0, auto_qsize() - new_size)
+
+def publish_worker_info():
+    # El proceso de conversiones anuncia su configuración para la interfaz web
+    set_setting('scheduler.workers', {'workers': get_worker_count(), 'ffmpeg_threads': Config.FFMPEG_THREADS})
+
+def get_scheduler_status():
+    workers = get_setting('scheduler.workers', {}) or {}
+    return {
+        'queued': qsize(),
+        'running': running_count(),
+        'max_queue_size': get_max_queue_size(),
+        'paused': is_paused(),
+        'workers': workers.get('workers', get_worker_count()),
+        'ffmpeg_threads': workers.get('ffmpeg_threads', Config.FFMPEG_THREADS),
+        'order': Config.CONVERSION_ORDER,
+        'throttle': throttle_service.get_published_throttle_status(),
+    }
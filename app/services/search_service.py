@@ -0,0 +1,153 @@
+# Índice de búsqueda persistente (SQLite FTS5) sobre cursos, secciones y archivos
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from contextlib import closing
+from flask import current_app
+from app.config import Config  # Importar Config
+from app.services import course_index
+
+_init_lock = threading.Lock()
+_initialized = False
+search_stats = {'status': 'empty', 'last_sync_seconds': None, 'queries': 0, 'last_query_ms': None}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS dirs (
+    rel_path TEXT PRIMARY KEY,
+    mtime INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS entries (
+    id INTEGER PRIMARY KEY,
+    rel_dir TEXT NOT NULL,
+    curso TEXT NOT NULL,
+    seccion TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    kind TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_entries_rel_dir ON entries (rel_dir);
+CREATE VIRTUAL TABLE IF NOT EXISTS entries_fts USING fts5(
+    curso, seccion, filename,
+    content='entries', content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS entries_ai AFTER INSERT ON entries BEGIN
+    INSERT INTO entries_fts (rowid, curso, seccion, filename)
+    VALUES (new.id, new.curso, new.seccion, new.filename);
+END;
+CREATE TRIGGER IF NOT EXISTS entries_ad AFTER DELETE ON entries BEGIN
+    INSERT INTO entries_fts (entries_fts, rowid, curso, seccion, filename)
+    VALUES ('delete', old.id, old.curso, old.seccion, old.filename);
+END;
+"""
+
+def normalize_text(text):
+    # Minúsculas y sin tildes: "Lección" y "leccion" deben coincidir
+    decomposed = unicodedata.normalize('NFKD', text)
+    return ''.join(c for c in decomposed if not unicodedata.combining(c)).casefold()
+
+def _connect():
+    # "with conn" solo confirma o deshace la transacción: quien llama la cierra con closing()
+    conn = sqlite3.connect(Config.SEARCH_INDEX_PATH, timeout=10)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    return conn
+
+def _ensure_schema():
+    global _initialized
+    with _init_lock:
+        if _initialized:
+            return
+        os.makedirs(os.path.dirname(Config.SEARCH_INDEX_PATH), exist_ok=True)
+        with closing(_connect()) as conn, conn:
+            conn.executescript(_SCHEMA)
+        _initialized = True
+
+def _reindex_dirs(conn, changed, removed):
+    for rel_path in removed:
+        conn.execute('DELETE FROM entries WHERE rel_dir = ?', (rel_path,))
+        conn.execute('DELETE FROM dirs WHERE rel_path = ?', (rel_path,))
+    for rel_path in changed:
+        if rel_path == '.':
+            continue
+        entry = course_index.get_dir_entry(rel_path)
+        conn.execute('DELETE FROM entries WHERE rel_dir = ?', (rel_path,))
+        if entry is None:
+            conn.execute('DELETE FROM dirs WHERE rel_path = ?', (rel_path,))
+            continue
+        path_parts = rel_path.split(os.sep)
+        curso = path_parts[0]
+        seccion = '/'.join(path_parts[1:]) or ''
+        rows = [(rel_path, curso, seccion, '', 'seccion')]
+        rows += [(rel_path, curso, seccion, name, 'video') for name in entry['videos']]
+        rows += [(rel_path, curso, seccion, name, 'pdf') for name in entry['pdfs']]
+        conn.executemany(
+            'INSERT INTO entries (rel_dir, curso, seccion, filename, kind) VALUES (?, ?, ?, ?, ?)', rows
+        )
+        conn.execute('INSERT OR REPLACE INTO dirs (rel_path, mtime) VALUES (?, ?)', (rel_path, entry['mtime']))
+
+def _on_index_change(changed, removed):
+    try:
+        _ensure_schema()
+        with closing(_connect()) as conn, conn:
+            _reindex_dirs(conn, changed, removed)
+    except Exception as e:
+        current_app.logger.error(f"Error al actualizar el índice de búsqueda: {str(e)}", exc_info=True)
+
+def sync_search_index():
+    # Compara los mtimes persistidos con el índice de cursos y solo reindexa las diferencias
+    start = time.perf_counter()
+    _ensure_schema()
+    course_index.get_cursos()
+    current = course_index.get_dir_mtimes()
+    current.pop('.', None)
+    with closing(_connect()) as conn, conn:
+        stored = dict(conn.execute('SELECT rel_path, mtime FROM dirs').fetchall())
+        changed = [p for p, mtime in current.items() if stored.get(p) != mtime]
+        removed = [p for p in stored if p not in current]
+        _reindex_dirs(conn, changed, removed)
+    search_stats['last_sync_seconds'] = round(time.perf_counter() - start, 4)
+    search_stats['status'] = 'ready'
+    current_app.logger.info(
+        f"Índice de búsqueda sincronizado en {search_stats['last_sync_seconds']}s: "
+        f"{len(changed)} directorios reindexados, {len(removed)} eliminados"
+    )
+
+def start_search_index(app):
+    course_index.register_listener(_on_index_change)
+    with app.app_context():
+        try:
+            sync_search_index()
+        except Exception as e:
+            search_stats['status'] = 'error'
+            app.logger.error(f"Error al sincronizar el índice de búsqueda: {str(e)}", exc_info=True)
+
+def _build_match_query(query):
+    tokens = re.findall(r'\w+', normalize_text(query))
+    # Cada término es un prefijo; todos deben aparecer (AND implícito de FTS5)
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+def search(query, limit=50):
+    match_query = _build_match_query(query)
+    if not match_query:
+        return []
+    _ensure_schema()
+    start = time.perf_counter()
+    with closing(_connect()) as conn, conn:
+        rows = conn.execute(
+            'SELECT e.curso, e.seccion, e.filename, e.kind, bm25(entries_fts, 2.0, 3.0, 5.0) AS score '
+            'FROM entries_fts JOIN entries e ON e.id = entries_fts.rowid '
+            'WHERE entries_fts MATCH ? ORDER BY score LIMIT ?',
+            (match_query, limit)
+        ).fetchall()
+    search_stats['queries'] += 1
+    search_stats['last_query_ms'] = round((time.perf_counter() - start) * 1000, 2)
+    return [
+        {'curso': curso, 'seccion': seccion, 'filename': filename, 'kind': kind, 'score': round(-score, 4)}
+        for curso, seccion, filename, kind, score in rows
+    ]
+
+def get_search_stats():
+    return dict(search_stats)
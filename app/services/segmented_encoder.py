@@ -0,0 +1,292 @@
+# Codificación por segmentos de videos largos: el original se corta por keyframes (copia, sin recodificar),
+# los trozos se codifican a la vez en varios procesos de ffmpeg y se unen sin pérdida con el demuxer concat.
+# El audio se extrae en la misma pasada que el corte y se añade al unir.
+import csv
+import os
+import shutil
+import signal
+import subprocess
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from app.config import Config  # Importar Config
+from app.services.conversion_planner import audio_args, video_encode_args
+from app.services.progress_service import parse_progress, summarize_progress
+from app.services.scheduler_service import get_cpu_count
+from app.services import throttle_service
+
+# Peso de cada fase en el progreso total: cortar y unir son copias, casi todo el tiempo es codificar
+PHASE_WEIGHTS = {'split': 5, 'encode': 90, 'concat': 5}
+PHASE_VERBS = {
+    'split': 'Dividiendo por keyframes',
+    'encode': 'Convirtiendo por segmentos',
+    'concat': 'Uniendo segmentos',
+}
+PROGRESS_UPDATE_SECONDS = 1.0
+
+# Presupuesto de CPU compartido por todos los workers del proceso, en plazas de FFMPEG_THREADS hilos: cada
+# trabajo en curso ocupa una y una conversión por segmentos solo añade trozos en paralelo con las que estén libres
+_slots_lock = threading.Lock()
+_slots_in_use = 0
+
+def get_cpu_budget():
+    return max(1, get_cpu_count() // max(1, Config.FFMPEG_THREADS))
+
+def hold_job_slot():
+    # La plaza del propio trabajo se cuenta siempre, aunque haya más workers que plazas
+    global _slots_in_use
+    with _slots_lock:
+        _slots_in_use += 1
+
+def release_slots(count):
+    global _slots_in_use
+    with _slots_lock:
+        _slots_in_use = max(0, _slots_in_use - count)
+
+def reserve_extra_slots(count):
+    # Toma sin esperar hasta count plazas libres y devuelve cuántas ha conseguido
+    global _slots_in_use
+    with _slots_lock:
+        granted = max(0, min(count, get_cpu_budget() - _slots_in_use))
+        _slots_in_use += granted
+    return granted
+
+def get_parallelism():
+    # Máximo de trozos a la vez de una conversión con la CPU libre
+    if Config.SEGMENT_PARALLELISM > 0:
+        return Config.SEGMENT_PARALLELISM
+    return get_cpu_budget()
+
+def get_free_parallelism():
+    # Trozos a la vez que tendría ahora un trabajo que ya ocupa su plaza
+    with _slots_lock:
+        free = max(0, get_cpu_budget() - _slots_in_use)
+    return 1 + min(get_parallelism() - 1, free)
+
+def should_segment(plan, duration):
+    # Solo compensa al recodificar videos largos: copiar o reempaquetar ya va a velocidad de disco
+    return plan['operation'] == 'reencode' and Config.SEGMENTED_ENCODE_MIN_MINUTES > 0 \
+        and (duration or 0) >= Config.SEGMENTED_ENCODE_MIN_MINUTES * 60 and get_parallelism() > 1
+
+def get_work_dir(output_path):
+    # Junto a la salida temporal y con su prefijo: mientras la conversión tenga lease el limpiador no lo borra
+    return os.path.splitext(output_path)[0] + '_segments'
+
+class _Runner:
+    # Procesos de ffmpeg de una misma conversión: si un trozo falla se terminan los demás
+    def __init__(self):
+        self.processes = set()
+        self.cancelled = False
+        self.failure = None  # (código, error) del primer trozo que falló
+        self.lock = threading.Lock()
+
+    def run(self, command, on_block=None):
+        command = command[:1] + ['-nostats', '-loglevel', 'error'] + command[1:]
+        with self.lock:
+            if self.cancelled:
+                return -1, 'cancelado por el fallo de otro segmento'
+            process = subprocess.Popen(throttle_service.wrap_command(command), stdout=subprocess.PIPE,
+                                       stderr=subprocess.PIPE, universal_newlines=True)
+            self.processes.add(process)
+        throttle_service.register(process)
+        errors = deque(maxlen=20)
+        stderr_reader = threading.Thread(target=errors.extend, args=(process.stderr,), daemon=True)
+        stderr_reader.start()
+        for block in parse_progress(process.stdout):
+            if on_block:
+                on_block(block)
+        process.wait()
+        throttle_service.unregister(process)
+        stderr_reader.join(timeout=5)
+        with self.lock:
+            self.processes.discard(process)
+        return process.returncode, ' '.join(line.strip() for line in errors)[-500:]
+
+    def fail(self, returncode, error):
+        with self.lock:
+            if self.cancelled:
+                return  # Este trozo lo ha terminado la cancelación, el error que cuenta es el primero
+            self.failure = (returncode, error)
+            self.cancelled = True
+            for process in self.processes:
+                process.terminate()
+                process.send_signal(signal.SIGCONT)  # Si el regulador lo tiene detenido, SIGTERM no llega hasta reanudarlo
+
+class _Progress:
+    # Suma el avance de todos los trozos en un único progreso, velocidad y ETA para la interfaz
+    def __init__(self, duration, on_progress):
+        self.duration = duration
+        self.on_progress = on_progress
+        self.lock = threading.Lock()
+        self.phase = 'split'
+        self.phase_fraction = 0.0
+        self.segments = []
+        self.encoded = {}  # índice del trozo -> segundos de video ya codificados
+        self.fps = {}
+        self.encode_started = None
+        self.last_update = 0
+
+    def start_encode(self, segments):
+        with self.lock:
+            self.phase = 'encode'
+            self.phase_fraction = 0.0
+            self.segments = segments
+            self.encode_started = time.monotonic()
+        self._publish(force=True)
+
+    def update_phase(self, phase, block):
+        # Corte y unión: una sola pasada de ffmpeg sobre el video completo
+        summary = summarize_progress(block, self.duration)
+        with self.lock:
+            self.phase = phase
+            self.phase_fraction = 1.0 if summary['finished'] else (summary['progress'] or 0) / 100
+        self._publish(force=summary['finished'])
+
+    def update_segment(self, index, block):
+        summary = summarize_progress(block, None)
+        with self.lock:
+            segment_duration = self.segments[index][1]
+            self.encoded[index] = segment_duration if summary['finished'] else min(segment_duration, summary['elapsed'])
+            self.fps[index] = 0 if summary['finished'] else summary['fps'] or 0
+        self._publish()
+
+    def _publish(self, force=False):
+        with self.lock:
+            now = time.monotonic()
+            if not force and now - self.last_update < PROGRESS_UPDATE_SECONDS:
+                return
+            self.last_update = now
+            summary = self._summary(now)
+            verb = PHASE_VERBS[self.phase]
+            if self.phase == 'encode':
+                done = sum(1 for index, (_, duration) in enumerate(self.segments) if self.encoded.get(index) == duration)
+                verb = f"{verb} {done}/{len(self.segments)}"
+        self.on_progress(verb, summary)
+
+    def _summary(self, now):
+        encoded = sum(self.encoded.values())
+        speed = None
+        eta_seconds = None
+        if self.phase == 'encode':
+            fraction = encoded / self.duration if self.duration else 0
+            wall = now - self.encode_started
+            # Segundos de video codificados por segundo real, sumando todos los trozos en curso
+            speed = round(encoded / wall, 2) if wall > 0 and encoded else None
+            eta_seconds = round((self.duration - encoded) / speed) if speed else None
+        else:
+            fraction = self.phase_fraction
+        completed = {'split': 0, 'encode': PHASE_WEIGHTS['split'],
+                     'concat': PHASE_WEIGHTS['split'] + PHASE_WEIGHTS['encode']}[self.phase]
+        progress = min(99, int(completed + PHASE_WEIGHTS[self.phase] * min(1.0, fraction)))
+        return {
+            'elapsed': round(encoded, 2),
+            'fps': round(sum(self.fps.values()), 1) or None,
+            'speed': speed,
+            'bitrate_kbps': None,
+            'total_size': None,
+            'finished': False,
+            'progress': progress,
+            'eta_seconds': eta_seconds,
+            'phase': self.phase,
+            'segments': len(self.segments),
+        }
+
+def _split_command(file_path, plan, work_dir, has_audio, profile):
+    # El muxer segment solo corta en keyframes: cada trozo empieza con uno y se decodifica por sí solo
+    command = [
+        'ffmpeg', '-y', '-progress', 'pipe:1', '-i', file_path, '-map', '0:v:0', '-c:v', 'copy',
+        '-f', 'segment', '-segment_time', str(Config.SEGMENT_SECONDS), '-reset_timestamps', '1',
+        '-segment_list', os.path.join(work_dir, 'segments.csv'), '-segment_list_type', 'csv',
+        os.path.join(work_dir, 'source_%05d.mkv'),
+    ]
+    if has_audio:
+        command += ['-map', '0:a', *audio_args(plan, profile), os.path.join(work_dir, 'audio.mka')]
+    return command
+
+def _read_segments(work_dir):
+    # segments.csv: nombre,inicio,fin por trozo -> [(ruta, duración)]
+    segments = []
+    with open(os.path.join(work_dir, 'segments.csv'), newline='') as f:
+        for row in csv.reader(f):
+            if len(row) >= 3:
+                segments.append((os.path.join(work_dir, row[0]), max(0.0, float(row[2]) - float(row[1]))))
+    return segments
+
+def _encode_command(source_path, output_path, profile):
+    return ['ffmpeg', '-y', '-i', source_path, '-map', '0:v:0',
+            *video_encode_args(throttle_service.get_encoder_threads(), profile),
+            '-f', 'mp4', '-progress', 'pipe:1', output_path]
+
+def _concat_command(list_path, audio_path, output_path):
+    command = ['ffmpeg', '-y', '-f', 'concat', '-safe', '0', '-i', list_path]
+    if audio_path:
+        command += ['-i', audio_path, '-map', '0:v', '-map', '1:a']
+    else:
+        command += ['-map', '0:v']
+    return command + ['-c', 'copy', '-movflags', '+faststart', '-f', 'mp4', '-progress', 'pipe:1', output_path]
+
+def _encoded_path(source_path):
+    directory, name = os.path.split(source_path)
+    return os.path.join(directory, 'encoded_' + os.path.splitext(name)[0][len('source_'):] + '.mp4')
+
+def _encode_segment(runner, progress, index, source_path, profile):
+    returncode, error = runner.run(_encode_command(source_path, _encoded_path(source_path), profile),
+                                   lambda block: progress.update_segment(index, block))
+    if returncode != 0:
+        runner.fail(returncode, f"Segmento {index + 1}: {error}")
+
+def _cancel_on(runner, cancel, done):
+    # Si el trabajo pierde su lease se terminan todos los trozos, también los detenidos por el regulador
+    while not done.is_set():
+        if cancel.wait(1.0):
+            runner.fail(-1, 'Cancelado: el trabajo lo ha reclamado otro worker')
+            return
+
+def encode_segmented(file_path, plan, output_path, duration, has_audio, on_progress, profile=None, cancel=None):
+    # Devuelve (código de salida, error) como run_ffmpeg; on_progress(verbo, resumen) recibe el avance agregado.
+    # cancel es un Event que detiene la conversión (lease perdido)
+    work_dir = get_work_dir(output_path)
+    shutil.rmtree(work_dir, ignore_errors=True)  # Restos de un intento anterior interrumpido
+    os.makedirs(work_dir)
+    runner = _Runner()
+    progress = _Progress(duration, on_progress)
+    done = threading.Event()
+    if cancel is not None:
+        threading.Thread(target=_cancel_on, args=(runner, cancel, done), daemon=True).start()
+    try:
+        audio_path = os.path.join(work_dir, 'audio.mka') if has_audio else None
+        returncode, error = runner.run(_split_command(file_path, plan, work_dir, has_audio, profile),
+                                       lambda block: progress.update_phase('split', block))
+        if returncode != 0:
+            return returncode, f"Al dividir: {error}"
+        segments = _read_segments(work_dir)
+        if not segments:
+            return 1, 'No se generaron segmentos'
+        progress.start_encode(segments)
+        # El primer trozo usa la plaza del trabajo; el resto solo las que no ocupen otros workers
+        extra = reserve_extra_slots(min(get_parallelism(), len(segments)) - 1)
+        try:
+            with ThreadPoolExecutor(max_workers=1 + extra, thread_name_prefix='segment') as pool:
+                for future in [pool.submit(_encode_segment, runner, progress, index, path, profile)
+                               for index, (path, _) in enumerate(segments)]:
+                    future.result()
+        finally:
+            release_slots(extra)
+        if runner.failure:
+            return runner.failure
+        list_path = os.path.join(work_dir, 'concat.txt')
+        with open(list_path, 'w') as f:
+            for path, _ in segments:
+                escaped = _encoded_path(path).replace("'", "'\\''")
+                f.write(f"file '{escaped}'\n")
+        returncode, error = runner.run(_concat_command(list_path, audio_path, output_path),
+                                       lambda block: progress.update_phase('concat', block))
+        if returncode != 0:
+            return returncode, f"Al unir: {error}"
+        return 0, ''
+    finally:
+        done.set()
+        # Con el lease perdido el directorio ya es del worker que ha reclamado el trabajo
+        if cancel is None or not cancel.is_set():
+            shutil.rmtree(work_dir, ignore_errors=True)
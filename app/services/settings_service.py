@@ -0,0 +1,68 @@
+# Ajustes y estado compartido entre procesos (web y worker) guardados en la base de datos
+import json
+from datetime import datetime, timedelta
+from flask import current_app
+from app.__init__ import db
+from app.models.setting_model import AppSetting
+
+def get_setting(key, default=None):
+    try:
+        setting = db.session.get(AppSetting, key)
+        if setting is None or setting.value is None:
+            return default
+        return json.loads(setting.value)
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Error al leer el ajuste {key}: {str(e)}", exc_info=True)
+        return default
+
+def get_setting_with_age(key, default=None):
+    # Devuelve (valor, segundos desde la última escritura)
+    try:
+        setting = db.session.get(AppSetting, key)
+        if setting is None or setting.value is None:
+            return default, None
+        age = (datetime.utcnow() - setting.updated_at).total_seconds() if setting.updated_at else None
+        return json.loads(setting.value), age
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Error al leer el ajuste {key}: {str(e)}", exc_info=True)
+        return default, None
+
+def set_setting(key, value):
+    try:
+        db.session.merge(AppSetting(key=key, value=json.dumps(value), updated_at=datetime.utcnow()))
+        db.session.commit()
+        return True
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Error al guardar el ajuste {key}: {str(e)}", exc_info=True)
+        return False
+
+def get_settings_with_prefix(prefix):
+    # {clave: (valor, segundos desde la última escritura)} de todos los ajustes que empiezan por prefix
+    try:
+        now = datetime.utcnow()
+        settings = AppSetting.query.filter(AppSetting.key.startswith(prefix, autoescape=True)).all()
+        return {
+            setting.key: (json.loads(setting.value), (now - setting.updated_at).total_seconds() if setting.updated_at else None)
+            for setting in settings if setting.value is not None
+        }
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Error al leer los ajustes {prefix}*: {str(e)}", exc_info=True)
+        return {}
+
+def delete_stale_settings(prefix, max_age_seconds):
+    # Elimina los ajustes de procesos que ya no existen (no se han actualizado en max_age_seconds)
+    try:
+        cutoff = datetime.utcnow() - timedelta(seconds=max_age_seconds)
+        deleted = AppSetting.query.filter(
+            AppSetting.key.startswith(prefix, autoescape=True), AppSetting.updated_at < cutoff
+        ).delete(synchronize_session=False)
+        db.session.commit()
+        return deleted
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Error al limpiar los ajustes {prefix}*: {str(e)}", exc_info=True)
+        return 0
@@ -0,0 +1,107 @@
+# Arranque de la base de datos y de los servicios en segundo plano
+import os
+import threading
+import time
+from tenacity import retry, stop_after_attempt, wait_fixed, retry_if_exception_type
+from alembic.config import Config as AlembicConfig
+from alembic.migration import MigrationContext
+from alembic.script import ScriptDirectory
+from flask_migrate import stamp, upgrade
+from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError
+from app.__init__ import db, MIGRATIONS_DIR
+from app.config import Config  # Importar Config
+from app.logging_config import start_log_rotation
+from app.services.user_service import create_user
+from app.services.course_index import start_course_index
+from app.services.search_service import start_search_index
+from app.services.scheduler_service import recover_jobs
+from app.services.video_service import scan_videos, start_conversion_workers
+from app.services.thumbnail_service import start_thumbnail_worker
+from app.services.ingest_service import start_ingest
+from app.services.throttle_service import start_throttle
+from app.services.dedup_service import start_dedup_maintenance
+from app.services.metrics_service import start_metrics_publisher
+
+# Inicializar la base de datos
+@retry(stop=stop_after_attempt(20), wait=wait_fixed(5), retry=retry_if_exception_type(OperationalError))
+def init_db(app):
+    with app.app_context():
+        migrate_db(app)
+        admin_password = os.getenv('ADMIN_PASSWORD', 'default_password')
+        app.logger.info("Creando o actualizando el usuario admin...")
+        success, message = create_user('admin', admin_password, is_admin=True)
+        if not success and "ya existe" not in message:
+            raise Exception(f"Error al crear el usuario admin: {message}")
+        app.logger.info("Base de datos inicializada con éxito")
+
+# Revisión que corresponde al esquema que creaba db.create_all() antes de las migraciones (user y converted_video)
+BASELINE_REVISION = '0001'
+
+def migrate_db(app):
+    # Solo el worker migra (los procesos web no llaman a init_db), así que no hay dos upgrades a la vez
+    tables = set(db.inspect(db.engine).get_table_names())
+    if tables and 'alembic_version' not in tables:
+        # Base de datos anterior a las migraciones: tiene el esquema base, se marca como tal y las revisiones
+        # siguientes crean el resto. Nada se crea aquí desde los modelos actuales
+        app.logger.info("Base de datos sin versión de esquema, marcando la revisión base...")
+        stamp(directory=MIGRATIONS_DIR, revision=BASELINE_REVISION)
+    app.logger.info("Aplicando migraciones de la base de datos...")
+    upgrade(directory=MIGRATIONS_DIR)
+
+SCHEMA_POLL_SECONDS = 5
+
+def get_head_revision():
+    alembic_config = AlembicConfig()
+    alembic_config.set_main_option('script_location', MIGRATIONS_DIR)
+    return ScriptDirectory.from_config(alembic_config).get_current_head()
+
+def wait_for_schema(logger, timeout=None):
+    # Los procesos web no migran: gunicorn espera, antes de arrancar sus workers, a que el worker deje la base de
+    # datos en la última revisión. Así las primeras peticiones no encuentran tablas o columnas que aún no existen
+    timeout = Config.SCHEMA_WAIT_TIMEOUT if timeout is None else timeout
+    head = get_head_revision()
+    engine = create_engine(Config.SQLALCHEMY_DATABASE_URI)
+    deadline = time.monotonic() + timeout
+    try:
+        while True:
+            try:
+                with engine.connect() as connection:
+                    current = MigrationContext.configure(connection).get_current_revision()
+            except OperationalError:
+                current = None  # Base de datos aún no disponible
+            if current == head:
+                return current
+            if time.monotonic() >= deadline:
+                raise RuntimeError(f"La base de datos sigue en la revisión {current} tras {timeout}s (se esperaba {head})")
+            logger.info(f"Esperando a que el worker migre la base de datos ({current or 'sin esquema'} -> {head})...")
+            time.sleep(SCHEMA_POLL_SECONDS)
+    finally:
+        engine.dispose()
+
+def start_web_services(app):
+    # Cada proceso web mantiene su propio índice de cursos en memoria
+    app.logger.info("Iniciando el índice de cursos...")
+    start_course_index(app)
+    start_metrics_publisher(app)
+
+def start_worker_services(app):
+    # Escaneo, conversiones e índice de búsqueda: una sola instancia por despliegue
+    start_log_rotation(app, Config)
+    with app.app_context():
+        recovered = recover_jobs(startup=True)
+        app.logger.info(f"Trabajos de conversión recuperados: {recovered}")
+
+    app.logger.info("Sincronizando el índice de búsqueda...")
+    start_course_index(app)
+    start_search_index(app)
+
+    app.logger.info("Iniciando workers de conversión de videos...")
+    start_throttle(app)
+    start_conversion_workers(app)
+    start_thumbnail_worker(app)
+    app.logger.info("Iniciando hilo de escaneo de caché de videos...")
+    threading.Thread(target=scan_videos, args=(app,), daemon=True).start()
+    start_ingest(app)
+    start_dedup_maintenance(app)
+    start_metrics_publisher(app)
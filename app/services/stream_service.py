@@ -0,0 +1,228 @@
+# Entrega de archivos con soporte de Range (206), peticiones condicionales y descarga delegada al proxy
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from urllib.parse import quote
+from flask import Response, request
+from werkzeug.http import http_date, parse_date
+from werkzeug.wsgi import wrap_file
+from app.config import Config  # Importar Config
+from app.services.profiling_service import fs_timer
+
+MAX_RANGES = 16
+CHUNK_SIZE = 256 * 1024
+
+_stats_lock = threading.Lock()
+stream_stats = {
+    'requests': 0,
+    'active': 0,
+    'not_modified': 0,
+    'partial': 0,
+    'offloaded': 0,
+    'bytes_sent': 0,
+    'by_kind': {},
+    'recent': deque(maxlen=200),  # (kind, bytes, segundos)
+}
+
+def get_kind(filename):
+    if filename.endswith('.mp4'):
+        return 'video'
+    if filename.endswith('.pdf'):
+        return 'pdf'
+    if filename.endswith('.m3u8') or filename.endswith('.ts'):
+        return 'hls'
+    return 'other'
+
+def _record_start():
+    with _stats_lock:
+        stream_stats['requests'] += 1
+        stream_stats['active'] += 1
+
+def _record_end(kind, sent, started):
+    elapsed = time.perf_counter() - started
+    with _stats_lock:
+        stream_stats['active'] -= 1
+        stream_stats['bytes_sent'] += sent
+        by_kind = stream_stats['by_kind'].setdefault(kind, {'requests': 0, 'bytes_sent': 0})
+        by_kind['requests'] += 1
+        by_kind['bytes_sent'] += sent
+        stream_stats['recent'].append((kind, sent, elapsed))
+
+def _count(key):
+    with _stats_lock:
+        stream_stats[key] += 1
+
+def get_stream_stats():
+    with _stats_lock:
+        stats = {k: v for k, v in stream_stats.items() if k != 'recent'}
+        stats['by_kind'] = {k: dict(v) for k, v in stream_stats['by_kind'].items()}
+        recent = list(stream_stats['recent'])
+    # Rendimiento por petición (MB/s) sobre las últimas transferencias
+    rates = sorted(sent / elapsed / (1024 * 1024) for _, sent, elapsed in recent if elapsed > 0 and sent > 0)
+    stats['recent_transfers'] = len(recent)
+    stats['recent_mbps_median'] = round(rates[len(rates) // 2], 2) if rates else None
+    stats['recent_mbps_min'] = round(rates[0], 2) if rates else None
+    return stats
+
+class _RangeFile:
+    # Vista de [start, start + length) de un archivo. Expone fileno() y queda posicionada en start,
+    # de modo que servidores como gunicorn usen os.sendfile (copia cero) sobre wsgi.file_wrapper.
+    def __init__(self, path, start, length, kind):
+        self._file = open(path, 'rb')
+        self._file.seek(start)
+        self._remaining = length
+        self._length = length
+        self._kind = kind
+        self._read_bytes = 0
+        self._started = time.perf_counter()
+        self._closed = False
+        _record_start()
+
+    def fileno(self):
+        return self._file.fileno()
+
+    def read(self, size=CHUNK_SIZE):
+        if self._remaining <= 0:
+            return b''
+        data = self._file.read(min(size if size and size > 0 else CHUNK_SIZE, self._remaining))
+        self._remaining -= len(data)
+        self._read_bytes += len(data)
+        return data
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._file.close()
+        # Con sendfile no pasamos por read(): se asume enviada la longitud completa
+        _record_end(self._kind, self._read_bytes or self._length, self._started)
+
+def _make_etag(st):
+    return f'"{st.st_ino:x}-{st.st_size:x}-{st.st_mtime_ns:x}"'
+
+def _not_modified(etag, mtime):
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match:
+        candidates = [tag.strip() for tag in if_none_match.split(',')]
+        return '*' in candidates or etag in candidates or f'W/{etag}' in candidates
+    if_modified_since = parse_date(request.headers.get('If-Modified-Since'))
+    return if_modified_since is not None and int(mtime) <= if_modified_since.timestamp()
+
+def _if_range_matches(etag, mtime):
+    if_range = request.headers.get('If-Range')
+    if not if_range:
+        return True
+    if if_range.startswith('"') or if_range.startswith('W/'):
+        return if_range == etag
+    date = parse_date(if_range)
+    return date is not None and int(mtime) <= date.timestamp()
+
+def _resolve_ranges(size):
+    # Devuelve None (sin Range), [] (no satisfacible) o una lista de (inicio, fin_exclusivo)
+    parsed = request.range
+    if parsed is None or parsed.units != 'bytes':
+        return None
+    ranges = []
+    for start, stop in parsed.ranges:
+        if start < 0:
+            start, stop = max(0, size + start), size
+        elif stop is None or stop > size:
+            stop = size
+        if start < stop:
+            ranges.append((start, stop))
+    if len(ranges) > MAX_RANGES:
+        return None
+    return ranges
+
+def _base_headers(etag, mtime, mimetype):
+    return {
+        'Accept-Ranges': 'bytes',
+        'ETag': etag,
+        'Last-Modified': http_date(mtime),
+        'Cache-Control': f'private, max-age={Config.FILE_CACHE_MAX_AGE}',
+        'Content-Type': mimetype,
+    }
+
+def _offload_response(file_path, mimetype, headers):
+    # El proxy frontal sirve los bytes; Flask solo ha validado la sesión
+    _count('offloaded')
+    if Config.FILE_OFFLOAD == 'x-accel':
+        rel_path = os.path.relpath(file_path, Config.CURSOS_DIR)
+        headers['X-Accel-Redirect'] = Config.ACCEL_REDIRECT_PREFIX.rstrip('/') + '/' + quote(rel_path)
+    else:
+        headers['X-Sendfile'] = file_path
+    return Response(status=200, headers=headers)
+
+def stream_file(file_path, mimetype):
+    with fs_timer('stat', file_path):
+        st = os.stat(file_path)
+    size = st.st_size
+    etag = _make_etag(st)
+    headers = _base_headers(etag, st.st_mtime, mimetype)
+    kind = get_kind(file_path)
+
+    if Config.FILE_OFFLOAD in ('x-accel', 'x-sendfile'):
+        return _offload_response(file_path, mimetype, headers)
+
+    if _not_modified(etag, st.st_mtime):
+        _count('not_modified')
+        headers.pop('Content-Type')
+        return Response(status=304, headers=headers)
+
+    ranges = _resolve_ranges(size) if _if_range_matches(etag, st.st_mtime) else None
+    if ranges == []:
+        headers['Content-Range'] = f'bytes */{size}'
+        return Response(status=416, headers=headers)
+
+    if ranges is None or len(ranges) == 1:
+        start, stop = ranges[0] if ranges else (0, size)
+        status = 206 if ranges else 200
+        if ranges:
+            _count('partial')
+            headers['Content-Range'] = f'bytes {start}-{stop - 1}/{size}'
+        headers['Content-Length'] = str(stop - start)
+        body = wrap_file(request.environ, _RangeFile(file_path, start, stop - start, kind), CHUNK_SIZE)
+        return Response(body, status=status, headers=headers, direct_passthrough=True)
+
+    # Varios rangos: multipart/byteranges (sin sendfile, los trozos van intercalados con cabeceras)
+    _count('partial')
+    boundary = uuid.uuid4().hex
+    parts = []
+    total = 0
+    for start, stop in ranges:
+        part_header = (
+            f'--{boundary}\r\nContent-Type: {mimetype}\r\n'
+            f'Content-Range: bytes {start}-{stop - 1}/{size}\r\n\r\n'
+        ).encode()
+        parts.append((part_header, start, stop))
+        total += len(part_header) + (stop - start) + 2
+    closing = f'--{boundary}--\r\n'.encode()
+    total += len(closing)
+
+    def generate():
+        started = time.perf_counter()
+        sent = 0
+        _record_start()
+        try:
+            with open(file_path, 'rb') as f:
+                for part_header, start, stop in parts:
+                    yield part_header
+                    f.seek(start)
+                    remaining = stop - start
+                    while remaining > 0:
+                        chunk = f.read(min(CHUNK_SIZE, remaining))
+                        if not chunk:
+                            break
+                        remaining -= len(chunk)
+                        sent += len(chunk)
+                        yield chunk
+                    yield b'\r\n'
+            yield closing
+        finally:
+            _record_end(kind, sent, started)
+
+    headers['Content-Type'] = f'multipart/byteranges; boundary={boundary}'
+    headers['Content-Length'] = str(total)
+    return Response(generate(), status=206, headers=headers, direct_passthrough=True)
@@ -0,0 +1,210 @@
+# Regulación de las conversiones según la carga de servido: ffmpeg corre con nice/ionice, con menos hilos
+# cuando hay alumnos viendo videos y detenido (SIGSTOP/SIGCONT) si las transferencias o la latencia se disparan.
+# Fuera de las ventanas de baja demanda solo arrancan los trabajos encolados por un administrador.
+import os
+import shutil
+import signal
+import threading
+import time
+from datetime import datetime
+from app.config import Config  # Importar Config
+from app.services.metrics_service import get_serving_load, latency_quantile
+from app.services.settings_service import get_setting, set_setting
+
+STATE_NORMAL = 'normal'
+STATE_REDUCED = 'reduced'
+STATE_SUSPENDED = 'suspended'
+STATE_LEVELS = {STATE_NORMAL: 0, STATE_REDUCED: 1, STATE_SUSPENDED: 2}
+STATUS_PUBLISH_SECONDS = 30  # Aunque no cambie, para que la interfaz sepa que el regulador sigue vivo
+
+_lock = threading.Lock()
+_processes = set()
+_started = False
+throttle_state = {
+    'state': STATE_NORMAL,
+    'reason': None,
+    'since': time.time(),
+    'active_streams': 0,
+    'latency_p95_ms': None,
+    'in_window': True,
+    'suspended_processes': 0,
+    'suspensions': 0,
+    'suspended_seconds': 0.0,
+}
+
+def _parse_windows(value):
+    # "01:00-07:30,14:00-16:00" -> [(minuto inicial, minuto final)]; una ventana puede cruzar la medianoche
+    windows = []
+    for part in value.split(','):
+        if '-' not in part:
+            continue
+        start, end = (piece.strip() for piece in part.split('-', 1))
+        try:
+            start_hour, start_minute = (int(x) for x in start.split(':'))
+            end_hour, end_minute = (int(x) for x in end.split(':'))
+        except ValueError:
+            continue
+        windows.append((start_hour * 60 + start_minute, end_hour * 60 + end_minute))
+    return windows
+
+def in_conversion_window(now=None):
+    windows = _parse_windows(Config.CONVERSION_WINDOWS)
+    if not windows:
+        return True
+    now = now or datetime.now()
+    minute = now.hour * 60 + now.minute
+    return any(start <= minute < end if start <= end else minute >= start or minute < end for start, end in windows)
+
+def wrap_command(command):
+    # nice e ionice hacen exec de ffmpeg: el pid de Popen sigue siendo el de ffmpeg y recibe las señales
+    prefix = []
+    if Config.CONVERSION_NICE > 0 and shutil.which('nice'):
+        prefix += ['nice', '-n', str(Config.CONVERSION_NICE)]
+    if Config.CONVERSION_IONICE in ('idle', 'best-effort') and shutil.which('ionice'):
+        prefix += ['ionice', '-c', '3'] if Config.CONVERSION_IONICE == 'idle' else ['ionice', '-c', '2', '-n', '7']
+    return prefix + command
+
+def get_encoder_threads():
+    # Los procesos que arrancan con alumnos conectados usan menos hilos (los que ya corren no cambian)
+    if Config.THROTTLE_ENABLED and throttle_state['state'] != STATE_NORMAL:
+        return max(1, min(Config.THROTTLE_REDUCED_THREADS, Config.FFMPEG_THREADS))
+    return Config.FFMPEG_THREADS
+
+def is_suspended():
+    return throttle_state['state'] == STATE_SUSPENDED
+
+def register(process):
+    # Un proceso que arranca durante una suspensión se detiene al momento
+    with _lock:
+        _processes.add(process)
+        if is_suspended():
+            _signal(process, signal.SIGSTOP)
+
+def unregister(process):
+    with _lock:
+        _processes.discard(process)
+
+def _signal(process, signum):
+    try:
+        os.kill(process.pid, signum)
+    except ProcessLookupError:
+        pass
+
+def _signal_all(signum):
+    # Requiere _lock
+    for process in _processes:
+        if process.poll() is None:
+            _signal(process, signum)
+    return len(_processes)
+
+def _target_state(load, latency_ms):
+    streams = load['active_streams']
+    if Config.THROTTLE_SUSPEND_STREAMS > 0 and streams >= Config.THROTTLE_SUSPEND_STREAMS:
+        return STATE_SUSPENDED, f"{streams} transferencias activas"
+    if Config.THROTTLE_SUSPEND_LATENCY_MS > 0 and latency_ms is not None and latency_ms >= Config.THROTTLE_SUSPEND_LATENCY_MS:
+        return STATE_SUSPENDED, f"latencia p95 de {latency_ms:.0f} ms"
+    if Config.THROTTLE_REDUCE_STREAMS > 0 and streams >= Config.THROTTLE_REDUCE_STREAMS:
+        return STATE_REDUCED, f"{streams} transferencias activas"
+    if Config.THROTTLE_REDUCE_LATENCY_MS > 0 and latency_ms is not None and latency_ms >= Config.THROTTLE_REDUCE_LATENCY_MS:
+        return STATE_REDUCED, f"latencia p95 de {latency_ms:.0f} ms"
+    return STATE_NORMAL, None
+
+def _apply(app, state, reason):
+    # Estado y señales bajo el mismo cerrojo: un proceso que se registre a la vez no se queda sin detener
+    now = time.time()
+    with _lock:
+        previous = throttle_state['state']
+        if previous == STATE_SUSPENDED:
+            throttle_state['suspended_seconds'] += now - throttle_state['since']
+        throttle_state.update({'state': state, 'reason': reason, 'since': now})
+        if previous == STATE_SUSPENDED and state != STATE_SUSPENDED:
+            count = _signal_all(signal.SIGCONT)
+        elif state == STATE_SUSPENDED and previous != STATE_SUSPENDED:
+            throttle_state['suspensions'] += 1
+            count = _signal_all(signal.SIGSTOP)
+        else:
+            count = None
+    if state == STATE_SUSPENDED:
+        app.logger.info(f"Conversiones suspendidas por carga de servido: {reason} ({count} procesos de ffmpeg)")
+    elif previous == STATE_SUSPENDED:
+        app.logger.info(f"Conversiones reanudadas ({count} procesos de ffmpeg)")
+    else:
+        app.logger.info(f"Regulación de conversiones: {previous} -> {state}" + (f" ({reason})" if reason else ''))
+
+def throttle_loop(app):
+    previous_buckets = None
+    calm_since = None
+    last_publish = 0
+    while True:
+        time.sleep(Config.THROTTLE_CHECK_INTERVAL)
+        with app.app_context():
+            try:
+                load = get_serving_load()
+                # Latencia de las peticiones desde la muestra anterior, no acumulada desde el arranque
+                buckets = load['latency_buckets']
+                latency_ms = None
+                if previous_buckets is not None:
+                    delta = [current - before for current, before in zip(buckets, previous_buckets)]
+                    if min(delta) >= 0 and sum(delta) >= Config.THROTTLE_MIN_REQUESTS:
+                        latency_ms = round(latency_quantile(delta, 0.95) * 1000)
+                previous_buckets = buckets
+                target, reason = _target_state(load, latency_ms)
+                current = throttle_state['state']
+                now = time.monotonic()
+                if STATE_LEVELS[target] > STATE_LEVELS[current]:
+                    # Se endurece en cuanto sube la carga...
+                    calm_since = None
+                    _apply(app, target, reason)
+                elif STATE_LEVELS[target] < STATE_LEVELS[current]:
+                    # ...y se relaja solo tras THROTTLE_RESUME_SECONDS de calma, para no oscilar
+                    calm_since = calm_since or now
+                    if now - calm_since >= Config.THROTTLE_RESUME_SECONDS:
+                        calm_since = None
+                        _apply(app, target, reason)
+                else:
+                    calm_since = None
+                with _lock:
+                    suspended = len(_processes) if is_suspended() else 0
+                changed = (load['active_streams'], latency_ms, suspended) != \
+                    (throttle_state['active_streams'], throttle_state['latency_p95_ms'], throttle_state['suspended_processes'])
+                throttle_state.update({
+                    'active_streams': load['active_streams'],
+                    'latency_p95_ms': latency_ms,
+                    'in_window': in_conversion_window(),
+                    'suspended_processes': suspended,
+                })
+                if changed or current != throttle_state['state'] or time.time() - last_publish >= STATUS_PUBLISH_SECONDS:
+                    set_setting('throttle.status', get_throttle_status())
+                    last_publish = time.time()
+            except Exception as e:
+                app.logger.error(f"Error en throttle_loop: {str(e)}", exc_info=True)
+
+def start_throttle(app):
+    global _started
+    if not Config.THROTTLE_ENABLED:
+        app.logger.info("Regulación de conversiones por carga desactivada (THROTTLE_ENABLED=false)")
+        return
+    with _lock:
+        if _started:
+            return
+        _started = True
+    app.logger.info(f"Regulación de conversiones activa (comprobación cada {Config.THROTTLE_CHECK_INTERVAL}s)")
+    threading.Thread(target=throttle_loop, args=(app,), name='throttle', daemon=True).start()
+
+def get_throttle_status():
+    status = dict(throttle_state)
+    status.update({
+        'enabled': Config.THROTTLE_ENABLED,
+        'windows': Config.CONVERSION_WINDOWS,
+        'encoder_threads': get_encoder_threads(),
+        'updated_at': time.time(),
+    })
+    return status
+
+def get_published_throttle_status():
+    # Estado publicado por el proceso de conversiones, para los procesos web
+    status = get_setting('throttle.status')
+    if status is None:
+        status = get_throttle_status()
+        status.update({'in_window': in_conversion_window(), 'updated_at': None})
+    return status
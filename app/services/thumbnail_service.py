@@ -0,0 +1,274 @@
+# Pósters y sprites de previsualización por video, en una caché en disco con tamaño limitado (LRU)
+import json
+import math
+import os
+import queue
+import shutil
+import subprocess
+import threading
+import time
+from datetime import datetime, timedelta
+from flask import current_app, url_for
+from sqlalchemy.exc import IntegrityError
+from app.__init__ import db
+from app.config import Config  # Importar Config
+from app.models.thumbnail_model import ThumbnailFailure, ThumbnailRequest
+from app.models.video_model import VideoMetadata
+from app.services.throttle_service import wrap_command
+
+POSTER_NAME = 'poster.jpg'
+SPRITE_NAME = 'sprite.jpg'
+SPRITE_INFO_NAME = 'sprite.json'
+THUMB_FILES = (POSTER_NAME, SPRITE_NAME, SPRITE_INFO_NAME)
+# Marcar uso como mucho una vez por hora: evita una escritura por cada petición
+TOUCH_INTERVAL = 3600
+# Peticiones de las páginas de curso (procesos web): el hilo de miniaturas las recoge cada REQUEST_POLL_SECONDS
+REQUEST_POLL_SECONDS = 5
+MAX_REQUESTED = 500
+# Un video con el que ffmpeg ha fallado no se vuelve a pedir hasta pasado este tiempo (p. ej. un error de disco)
+FAILURE_RETRY_SECONDS = 24 * 3600
+
+_pending = queue.Queue()
+_pending_hashes = set()
+_pending_lock = threading.Lock()
+_worker_started = False
+thumbnail_stats = {'generated': 0, 'failed': 0, 'evicted': 0, 'size_bytes': 0, 'entries': 0, 'last_generation_seconds': None}
+
+def get_thumb_dir(file_hash):
+    # Las imágenes dependen solo del contenido: la huella del video es la clave (y permite cachearlas para siempre)
+    return os.path.join(Config.THUMBNAIL_DIR, file_hash[:2], file_hash)
+
+def get_thumb_path(file_hash, name):
+    return os.path.join(get_thumb_dir(file_hash), name)
+
+def has_thumbnails(file_hash):
+    return os.path.isfile(get_thumb_path(file_hash, POSTER_NAME))
+
+def touch(file_hash):
+    # El mtime del directorio es la marca de último uso para la expulsión LRU
+    thumb_dir = get_thumb_dir(file_hash)
+    try:
+        if time.time() - os.path.getmtime(thumb_dir) > TOUCH_INTERVAL:
+            os.utime(thumb_dir)
+    except OSError:
+        pass
+
+def _sprite_layout(duration, width, height):
+    count = max(1, min(Config.SPRITE_MAX_TILES, int(duration // 10) or 1))
+    interval = duration / count if duration else 10
+    tile_width = Config.SPRITE_TILE_WIDTH
+    tile_height = int(tile_width * height / width) // 2 * 2 if width and height else tile_width * 9 // 16
+    columns = min(Config.SPRITE_COLUMNS, count)
+    return {
+        'count': count,
+        'interval': round(interval, 3),
+        'columns': columns,
+        'rows': math.ceil(count / columns),
+        'tile_width': tile_width,
+        'tile_height': tile_height,
+    }
+
+def _run(command):
+    result = subprocess.run(wrap_command(command), capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg falló: {result.stderr[-500:]}")
+
+def generate_thumbnails(file_path, file_hash, duration, width=None, height=None):
+    if has_thumbnails(file_hash):
+        return True
+    start = time.perf_counter()
+    final_dir = get_thumb_dir(file_hash)
+    temp_dir = f"{final_dir}.tmp{os.getpid()}"
+    try:
+        os.makedirs(temp_dir, exist_ok=True)
+        # Póster: un fotograma al 10% (máximo 30 s) para evitar negros y cortinillas iniciales
+        offset = min(duration * 0.1, 30) if duration else 0
+        _run(['ffmpeg', '-y', '-ss', f"{offset:.2f}", '-i', file_path, '-frames:v', '1',
+              '-vf', f"scale={Config.THUMBNAIL_WIDTH}:-2", '-q:v', '4', '-threads', '1',
+              os.path.join(temp_dir, POSTER_NAME)])
+        if duration:
+            layout = _sprite_layout(duration, width, height)
+            # Solo se decodifican keyframes: la posición de cada miniatura es aproximada, pero es mucho más rápido
+            _run(['ffmpeg', '-y', '-skip_frame', 'nokey', '-i', file_path,
+                  '-vf', (f"fps=1/{layout['interval']},scale={layout['tile_width']}:{layout['tile_height']},"
+                          f"tile={layout['columns']}x{layout['rows']}"),
+                  '-frames:v', '1', '-q:v', '5', '-threads', '1',
+                  os.path.join(temp_dir, SPRITE_NAME)])
+            with open(os.path.join(temp_dir, SPRITE_INFO_NAME), 'w') as f:
+                json.dump(layout, f)
+        shutil.rmtree(final_dir, ignore_errors=True)
+        os.makedirs(os.path.dirname(final_dir), exist_ok=True)
+        os.rename(temp_dir, final_dir)
+        thumbnail_stats['generated'] += 1
+        thumbnail_stats['last_generation_seconds'] = round(time.perf_counter() - start, 3)
+        _set_failure(file_hash, None)
+        return True
+    except Exception as e:
+        thumbnail_stats['failed'] += 1
+        current_app.logger.error(f"Error al generar miniaturas de {file_path}: {str(e)}")
+        _set_failure(file_hash, str(e))
+        return False
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+def _set_failure(file_hash, message):
+    # En la base de datos para que los procesos web también dejen de pedir el video; None borra el fallo
+    try:
+        if message is None:
+            ThumbnailFailure.query.filter_by(file_hash=file_hash).delete()
+        else:
+            db.session.merge(ThumbnailFailure(file_hash=file_hash, message=message[-500:], failed_at=datetime.utcnow()))
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Error al registrar el fallo de miniaturas de {file_hash}: {str(e)}", exc_info=True)
+
+def _failed(file_hashes):
+    # Huellas con un fallo reciente
+    if not file_hashes:
+        return set()
+    cutoff = datetime.utcnow() - timedelta(seconds=FAILURE_RETRY_SECONDS)
+    rows = db.session.query(ThumbnailFailure.file_hash) \
+        .filter(ThumbnailFailure.file_hash.in_(list(file_hashes)), ThumbnailFailure.failed_at >= cutoff)
+    return {file_hash for file_hash, in rows}
+
+def enforce_cache_limit():
+    # Expulsa los videos usados hace más tiempo hasta quedar por debajo del límite
+    if not os.path.isdir(Config.THUMBNAIL_DIR):
+        return 0
+    entries = []
+    total = 0
+    for prefix in os.scandir(Config.THUMBNAIL_DIR):
+        if not prefix.is_dir():
+            continue
+        for entry in os.scandir(prefix.path):
+            if not entry.is_dir() or '.tmp' in entry.name:
+                continue
+            size = sum(f.stat().st_size for f in os.scandir(entry.path) if f.is_file())
+            entries.append((entry.stat().st_mtime, size, entry.path))
+            total += size
+    limit = Config.THUMBNAIL_CACHE_MAX_MB * 1024 * 1024
+    evicted = 0
+    for _, size, path in sorted(entries):
+        if total <= limit:
+            break
+        shutil.rmtree(path, ignore_errors=True)
+        total -= size
+        evicted += 1
+    thumbnail_stats['evicted'] += evicted
+    thumbnail_stats['size_bytes'] = total
+    thumbnail_stats['entries'] = len(entries) - evicted
+    if evicted:
+        current_app.logger.info(f"Caché de miniaturas: {evicted} entradas expulsadas, {round(total / 1024 / 1024, 1)} MB en uso")
+    return evicted
+
+def request_thumbnails(file_path, file_hash, duration, width=None, height=None):
+    # Encola la generación en el hilo de miniaturas (sin duplicados). Se llama cuando cambia la huella de un video
+    # o cuando se muestra su curso: nunca en cada escaneo, que regeneraría lo que la LRU acaba de expulsar
+    if not Config.THUMBNAILS_ENABLED or not file_hash or has_thumbnails(file_hash) or _failed({file_hash}):
+        return False
+    with _pending_lock:
+        if file_hash in _pending_hashes:
+            return False
+        _pending_hashes.add(file_hash)
+    _pending.put((file_path, file_hash, duration, width, height))
+    return True
+
+def _request_missing(file_paths):
+    # Proceso web: una fila por video mostrado sin miniaturas (nuevo o expulsado) para el worker. Solo se insertan
+    # filas: nunca se pisan las peticiones de otro proceso ni las que el worker está recogiendo
+    try:
+        requested = {path for path, in db.session.query(ThumbnailRequest.file_path)
+                     .filter(ThumbnailRequest.file_path.in_(file_paths))}
+        missing = [path for path in file_paths if path not in requested]
+        if missing:
+            now = datetime.utcnow()
+            db.session.add_all([ThumbnailRequest(file_path=path, requested_at=now) for path in missing])
+            db.session.commit()
+    except IntegrityError:
+        # Otro proceso web ha pedido alguno a la vez; los demás se vuelven a pedir en la siguiente visita
+        db.session.rollback()
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Error al pedir miniaturas: {str(e)}", exc_info=True)
+
+def _take_requested():
+    # Worker: recoge las peticiones más antiguas y borra exactamente esas filas
+    requested = [path for path, in db.session.query(ThumbnailRequest.file_path)
+                 .order_by(ThumbnailRequest.requested_at).limit(MAX_REQUESTED)]
+    if not requested:
+        return 0
+    ThumbnailRequest.query.filter(ThumbnailRequest.file_path.in_(requested)).delete(synchronize_session=False)
+    db.session.commit()
+    queued = 0
+    for meta in VideoMetadata.query.filter(VideoMetadata.file_path.in_(requested), VideoMetadata.fingerprint.isnot(None)):
+        streams = json.loads(meta.streams) if meta.streams else []
+        video_stream = next((s for s in streams if s.get('codec_type') == 'video'), {})
+        queued += request_thumbnails(meta.file_path, meta.fingerprint, meta.duration or 0,
+                                     video_stream.get('width'), video_stream.get('height'))
+    return queued
+
+def thumbnail_worker(app):
+    generated = 0
+    while True:
+        try:
+            file_path, file_hash, duration, width, height = _pending.get(timeout=REQUEST_POLL_SECONDS)
+        except queue.Empty:
+            with app.app_context():
+                try:
+                    _take_requested()
+                except Exception as e:
+                    db.session.rollback()
+                    app.logger.error(f"Error en thumbnail_worker: {str(e)}", exc_info=True)
+                finally:
+                    db.session.remove()
+            continue
+        with app.app_context():
+            try:
+                if os.path.exists(file_path):
+                    generate_thumbnails(file_path, file_hash, duration, width, height)
+                    generated += 1
+                if _pending.empty() or generated % 50 == 0:
+                    enforce_cache_limit()
+            except Exception as e:
+                app.logger.error(f"Error en thumbnail_worker: {str(e)}", exc_info=True)
+            finally:
+                with _pending_lock:
+                    _pending_hashes.discard(file_hash)
+
+def start_thumbnail_worker(app):
+    global _worker_started
+    if _worker_started or not Config.THUMBNAILS_ENABLED:
+        return
+    _worker_started = True
+    threading.Thread(target=thumbnail_worker, args=(app,), name='thumbnails', daemon=True).start()
+
+def get_thumbnails(file_paths):
+    # Para la página de un curso: ruta -> {'poster', 'sprite', 'sprite_info'} de los videos con miniaturas
+    if not Config.THUMBNAILS_ENABLED or not file_paths:
+        return {}
+    rows = db.session.query(VideoMetadata.file_path, VideoMetadata.fingerprint) \
+        .filter(VideoMetadata.file_path.in_(file_paths), VideoMetadata.fingerprint.isnot(None))
+    thumbnails = {}
+    missing = {}
+    for file_path, file_hash in rows:
+        if not has_thumbnails(file_hash):
+            missing[file_path] = file_hash
+            continue
+        thumbs = {'poster': url_for('serve_thumbnail', file_hash=file_hash, name=POSTER_NAME)}
+        try:
+            with open(get_thumb_path(file_hash, SPRITE_INFO_NAME)) as f:
+                thumbs['sprite_info'] = json.load(f)
+            thumbs['sprite'] = url_for('serve_thumbnail', file_hash=file_hash, name=SPRITE_NAME)
+        except (OSError, ValueError):
+            pass
+        thumbnails[file_path] = thumbs
+    if missing:
+        failed = _failed(set(missing.values()))
+        missing = [file_path for file_path, file_hash in missing.items() if file_hash not in failed]
+        if missing:
+            _request_missing(missing)
+    return thumbnails
+
+def get_thumbnail_stats():
+    return dict(thumbnail_stats)
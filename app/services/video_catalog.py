@@ -0,0 +1,135 @@
+# Vista indexada en memoria de los videos candidatos para el gestor: orden y filtros sin recorrer la lista entera
+import base64
+import json
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from app.services import scheduler_service
+from app.services.settings_service import get_setting
+from app.services.video_service import get_video_candidates
+
+STATUS_ORDER = {'processing': 0, 'queued': 1, 'failed': 2, 'none': 3, 'completed': 4}
+SORT_KEYS = {
+    'path': lambda v: '',
+    'size': lambda v: v.get('size_mb') or 0,
+    'duration': lambda v: v.get('duration') or 0,
+    'codec': lambda v: v.get('codec') or '',
+    'status': lambda v: STATUS_ORDER.get(v.get('status'), len(STATUS_ORDER)),
+}
+MAX_PAGE_SIZE = 500
+
+_lock = threading.Lock()
+_view = None
+
+class _CatalogView:
+    def __init__(self, videos, version):
+        self.rows = sorted(videos, key=lambda v: v['file_path'])
+        self.by_path = {row['file_path']: row for row in self.rows}
+        self.cursos = sorted({row['curso'] for row in self.rows})
+        self.version = version
+        self.built_at = time.time()
+        self._orders = {}  # (orden, curso) -> (claves ordenadas, filas en ese orden)
+        self._counts = {}  # (curso, needs_conversion, processed) -> total
+        self._lock = threading.Lock()
+
+    def order(self, sort, curso):
+        # Índices por criterio (y curso) construidos la primera vez que se piden
+        key = (sort, curso)
+        with self._lock:
+            if key not in self._orders:
+                rows = [row for row in self.rows if curso is None or row['curso'] == curso]
+                # file_path desempata: las claves son únicas y el cursor identifica una sola fila
+                entries = sorted(((SORT_KEYS[sort](row), row['file_path']), row) for row in rows)
+                self._orders[key] = ([entry[0] for entry in entries], [entry[1] for entry in entries])
+            return self._orders[key]
+
+    def count(self, curso, needs_conversion, processed):
+        key = (curso, needs_conversion, processed)
+        with self._lock:
+            if key not in self._counts:
+                self._counts[key] = sum(1 for row in self.rows if _matches(row, curso, needs_conversion, processed))
+            return self._counts[key]
+
+def _matches(row, curso, needs_conversion, processed):
+    if curso is not None and row['curso'] != curso:
+        return False
+    if needs_conversion is not None and row['needs_conversion'] != needs_conversion:
+        return False
+    if processed is not None and row['processed'] != processed:
+        return False
+    return True
+
+def _version():
+    # La vista se reconstruye (solo con consultas, sin E/S por archivo) cuando termina un escaneo o una
+    # ingesta y cuando cambia el estado de la cola; si no, se reutiliza indefinidamente
+    return ((get_setting('scan.status', {}) or {}).get('finished_at'), scheduler_service.get_jobs_version())
+
+def get_view():
+    global _view
+    version = _version()
+    view = _view
+    if view is not None and view.version == version:
+        return view
+    with _lock:
+        # Otra petición puede haberla reconstruido mientras esperábamos
+        if _view is None or _view is view:
+            _view = _CatalogView(get_video_candidates(), version)
+        return _view
+
+def invalidate():
+    global _view
+    _view = None
+
+def get_video(file_path):
+    return get_view().by_path.get(file_path)
+
+def encode_cursor(sort_key):
+    return base64.urlsafe_b64encode(json.dumps(list(sort_key)).encode()).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    try:
+        value, file_path = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        return (value, file_path)
+    except (ValueError, TypeError):
+        return None
+
+def query_videos(sort='path', descending=False, curso=None, needs_conversion=None, processed=None,
+                 limit=50, cursor=None):
+    # Paginación por cursor: el cursor es la clave de orden de la última fila devuelta, así que sigue
+    # siendo válido aunque la vista se reconstruya entre páginas
+    if sort not in SORT_KEYS:
+        raise ValueError(f"Orden no soportado: {sort}")
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    view = get_view()
+    keys, rows = view.order(sort, curso)
+    after = decode_cursor(cursor) if cursor else None
+    if cursor and after is None:
+        raise ValueError("Cursor inválido")
+    try:
+        if descending:
+            position = (bisect_left(keys, after) if after else len(keys)) - 1
+            step = -1
+        else:
+            position = bisect_right(keys, after) if after else 0
+            step = 1
+    except TypeError:
+        raise ValueError("El cursor no corresponde a este orden")
+    videos = []
+    last_key = None
+    has_more = False
+    while 0 <= position < len(keys):
+        row = rows[position]
+        if _matches(row, curso, needs_conversion, processed):
+            if len(videos) == limit:
+                has_more = True
+                break
+            videos.append(row)
+            last_key = keys[position]
+        position += step
+    return {
+        'videos': videos,
+        'next_cursor': encode_cursor(last_key) if has_more else None,
+        'total': view.count(curso, needs_conversion, processed),
+        'cursos': view.cursos,
+        'built_at': view.built_at,
+    }
@@ -3,33 +3,111 @@ import os
 import subprocess
 import threading
 import hashlib
-import re
+import struct
 import time
 import json
-from queue import Queue
+import shutil
+import signal
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
 from app.__init__ import db
 from app.config import Config  # Importar Config
-from app.models.video_model import ConvertedVideo
+from app.models.video_model import ConvertedVideo, VideoMetadata
+from app.services import scheduler_service, hls_service, segmented_encoder, ingest_service, throttle_service, encode_estimator, dedup_service
+from app.services.thumbnail_service import request_thumbnails
+from app.services.conversion_planner import ENCODING_PROFILES, plan_conversion, build_ffmpeg_command, get_profile, is_video_file
+from app.services.mp4_parser import ISO_EXTENSIONS, Mp4ParseError, is_faststart, parse_mp4
+from app.services.settings_service import get_setting, set_setting
+from app.services.metrics_service import inc, observe
+from app.services.progress_service import parse_progress, summarize_progress, format_eta, format_message
 from flask import current_app
 
-# Colas y estado global
-conversion_queue = Queue(maxsize=Config.MAX_QUEUE_SIZE)
+# Estado global (la cola vive en la tabla ConversionJob)
+# conversion_status: progreso en vivo de las conversiones de este proceso
 conversion_status = {}
+_scan_lock = threading.Lock()  # El escaneo completo y la ingesta por eventos no se ejecutan a la vez
+_refill_lock = threading.Lock()
 video_candidates_cache = []
 cache_status = "scanning"
+metadata_stats = {
+    'hits': 0, 'misses': 0, 'invalidations': 0, 'evictions': 0, 'content_unchanged': 0, 'full_hashes': 0,
+    'probe_native': 0, 'probe_ffprobe': 0, 'last_scan_seconds': None, 'last_scan_files': 0, 'last_scan_inspected': 0, 'scan_workers': None
+}
+_scanner_in_process = False
+PROGRESS_UPDATE_SECONDS = 1.0
+LEASE_LOST_MESSAGE = 'Lease perdido: el trabajo lo ha reclamado otro worker'
+_job_context = threading.local()  # Evento de cancelación del trabajo que ejecuta cada hilo de conversión
+PROCESSED_LOOKUP_CHUNK = 500  # Rutas por consulta IN (los límites de parámetros de SQLite rondan 999)
 
 def get_file_hash(file_path):
     try:
         sha256 = hashlib.sha256()
         with open(file_path, 'rb') as f:
-            while chunk := f.read(8192):
+            while chunk := f.read(1024 * 1024):
                 sha256.update(chunk)
         return sha256.hexdigest()
     except Exception as e:
         current_app.logger.error(f"Error en get_file_hash: {str(e)}", exc_info=True)
         return None
 
+def get_full_hash(file_path):
+    # SHA-256 completo bajo demanda (conversión y archivo); se guarda mientras el archivo no cambie
+    try:
+        st = os.stat(file_path)
+    except OSError as e:
+        current_app.logger.error(f"Error al leer {file_path}: {str(e)}")
+        return None
+    meta = VideoMetadata.query.filter_by(file_path=file_path).first()
+    if meta and meta.file_hash and _stat_matches(meta, st):
+        return meta.file_hash
+    file_hash = get_file_hash(file_path)
+    metadata_stats['full_hashes'] += 1
+    if file_hash and meta and _stat_matches(meta, st):
+        meta.file_hash = file_hash
+        try:
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.error(f"Error al guardar el hash de {file_path}: {str(e)}", exc_info=True)
+    return file_hash
+
+def compute_fingerprint(file_path):
+    # Huella rápida para detectar cambios: tamaño + bloques del principio, la mitad y el final
+    block = Config.FINGERPRINT_BLOCK_KB * 1024
+    sha256 = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        sha256.update(str(size).encode())
+        if size <= block * 3:
+            sha256.update(f.read())
+        else:
+            for offset in (0, size // 2 - block // 2, size - block):
+                f.seek(offset)
+                sha256.update(f.read(block))
+    return sha256.hexdigest()
+
+def _compact_stream(stream):
+    keys = ('index', 'codec_type', 'codec_name', 'profile', 'pix_fmt', 'width', 'height',
+            'bit_rate', 'channels', 'sample_rate')
+    return {k: stream[k] for k in keys if k in stream}
+
 def get_video_info(file_path):
+    # MP4/MOV se leen directamente; ffprobe solo para otros contenedores o lo que el lector no entienda
+    if Config.PROBE_BACKEND != 'ffprobe' and file_path.lower().endswith(ISO_EXTENSIONS):
+        try:
+            video_info = parse_mp4(file_path)
+            metadata_stats['probe_native'] += 1
+            return video_info
+        except (Mp4ParseError, struct.error, IndexError) as e:
+            current_app.logger.debug("Lector MP4 nativo no válido para %s, usando ffprobe: %s", file_path, e)
+        except OSError as e:
+            current_app.logger.error(f"Error al leer {file_path}: {str(e)}")
+            return {'error': str(e)}
+    return probe_video_info(file_path)
+
+def probe_video_info(file_path):
+    metadata_stats['probe_ffprobe'] += 1
     try:
         result = subprocess.run(
             ['ffprobe', '-i', file_path, '-show_streams', '-show_format', '-print_format', 'json'],
@@ -38,140 +116,869 @@ def get_video_info(file_path):
         if result.returncode == 0:
             info = json.loads(result.stdout)
             video_stream = next((s for s in info['streams'] if s['codec_type'] == 'video'), None)
+            audio_stream = next((s for s in info['streams'] if s['codec_type'] == 'audio'), None)
             return {
                 'file_path': file_path,
                 'size_mb': round(os.path.getsize(file_path) / (1024 * 1024), 2),
                 'format': info['format']['format_name'],
                 'video_codec': video_stream['codec_name'] if video_stream else 'N/A',
-                'duration': float(info['format'].get('duration', 0))
+                'audio_codec': audio_stream['codec_name'] if audio_stream else 'N/A',
+                'duration': float(info['format'].get('duration', 0)),
+                'bit_rate': int(info['format'].get('bit_rate', 0) or 0),
+                'width': video_stream.get('width') if video_stream else None,
+                'height': video_stream.get('height') if video_stream else None,
+                'streams': [_compact_stream(s) for s in info['streams']]
             }
         current_app.logger.error(f"ffprobe falló: {result.stderr}")
-        return {'error': f"ffprobe falló: {result.stderr}"}
+        return {'error': f"ffprobe falló: {result.stderr}", 'probe_failed': True}
     except Exception as e:
         current_app.logger.error(f"Error en get_video_info: {str(e)}", exc_info=True)
         return {'error': str(e)}
 
+def _metadata_to_info(meta):
+    if meta.probe_error:
+        return {'error': meta.probe_error}
+    streams = json.loads(meta.streams) if meta.streams else []
+    video_stream = next((s for s in streams if s.get('codec_type') == 'video'), {})
+    return {
+        'file_path': meta.file_path,
+        'size_mb': round(meta.size / (1024 * 1024), 2),
+        'format': meta.format_name,
+        'video_codec': meta.video_codec,
+        'audio_codec': meta.audio_codec,
+        'duration': meta.duration or 0,
+        'bit_rate': meta.bit_rate or 0,
+        'width': video_stream.get('width'),
+        'height': video_stream.get('height'),
+        'streams': streams,
+        'faststart': meta.faststart,
+    }
+
+def _stat_matches(meta, st):
+    return (meta.size, meta.mtime_ns, meta.inode) == (st.st_size, st.st_mtime_ns, st.st_ino)
+
+def _read_faststart(file_path, info=None):
+    # El lector nativo ya lo devuelve; con ffprobe se recorren las cajas de primer nivel del MP4
+    if info and info.get('faststart') is not None:
+        return info['faststart']
+    return is_faststart(file_path) if file_path.lower().endswith('.mp4') else None
+
+def _previous(meta):
+    # Copia plana para los hilos del pool (los objetos de la sesión no se comparten entre hilos)
+    if meta is None or not meta.fingerprint:
+        return None
+    return {'fingerprint': meta.fingerprint, 'size': meta.size, 'faststart': meta.faststart}
+
+def _inspect_file(file_path, st, previous):
+    # Trabajo pesado de un archivo (huella y ffprobe); no usa la sesión de base de datos
+    try:
+        fingerprint = compute_fingerprint(file_path)
+    except OSError as e:
+        return {'error': str(e)}
+    if previous and previous['fingerprint'] == fingerprint and previous['size'] == st.st_size:
+        # Mismo contenido (solo cambió mtime o inodo): se reutiliza el ffprobe anterior
+        faststart = previous['faststart'] if previous['faststart'] is not None else _read_faststart(file_path)
+        return {'fingerprint': fingerprint, 'reused': True, 'faststart': faststart}
+    info = get_video_info(file_path)
+    if 'error' not in info:
+        info['faststart'] = _read_faststart(file_path, info)
+    return {'fingerprint': fingerprint, 'reused': False, 'info': info}
+
+def _inspect_in_context(app, file_path, st, previous):
+    with app.app_context():
+        return _inspect_file(file_path, st, previous)
+
+def _store_metadata(meta, file_path, st, inspection, commit=True):
+    # Devuelve (huella, info) y actualiza la caché
+    fingerprint = inspection['fingerprint']
+    if meta and inspection['reused']:
+        metadata_stats['content_unchanged'] += 1
+        meta.size, meta.mtime_ns, meta.inode = st.st_size, st.st_mtime_ns, st.st_ino
+        meta.faststart = inspection['faststart']
+        meta.updated_at = datetime.utcnow()
+        info = _metadata_to_info(meta)
+    else:
+        info = inspection['info']
+        if 'error' in info and not info.get('probe_failed'):
+            # ffprobe no llegó a ejecutarse: no se guarda
+            return fingerprint, info
+        if meta:
+            metadata_stats['invalidations'] += 1
+        else:
+            meta = VideoMetadata(file_path=file_path)
+            db.session.add(meta)
+        meta.size, meta.mtime_ns, meta.inode = st.st_size, st.st_mtime_ns, st.st_ino
+        meta.fingerprint = fingerprint
+        meta.file_hash = None  # El contenido cambió: el hash completo se recalcula cuando haga falta
+        meta.probe_error = info.get('error')
+        meta.format_name = info.get('format')
+        meta.video_codec = info.get('video_codec')
+        meta.audio_codec = info.get('audio_codec')
+        meta.duration = info.get('duration')
+        meta.bit_rate = info.get('bit_rate')
+        meta.faststart = info.get('faststart')
+        meta.streams = json.dumps(info.get('streams', []))
+        meta.updated_at = datetime.utcnow()
+    if commit:
+        try:
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.error(f"Error al guardar metadatos de {file_path}: {str(e)}", exc_info=True)
+    return fingerprint, info
+
+def get_cached_metadata(file_path):
+    # Devuelve (huella, info); solo se recalculan si cambió (tamaño, mtime, inodo)
+    try:
+        st = os.stat(file_path)
+    except OSError as e:
+        current_app.logger.error(f"Error al leer {file_path}: {str(e)}")
+        return None, {'error': str(e)}
+    meta = VideoMetadata.query.filter_by(file_path=file_path).first()
+    if meta and meta.fingerprint and _stat_matches(meta, st):
+        metadata_stats['hits'] += 1
+        return meta.fingerprint, _metadata_to_info(meta)
+
+    metadata_stats['misses'] += 1
+    inspection = _inspect_file(file_path, st, _previous(meta))
+    if 'error' in inspection:
+        # Un fallo de lectura puede ser transitorio: no se guarda en caché
+        return None, {'error': inspection['error']}
+    return _store_metadata(meta, file_path, st, inspection)
+
+def get_scan_workers():
+    # Hashing y ffprobe esperan sobre todo a disco y subprocesos: hilos de sobra frente a núcleos
+    if Config.SCAN_WORKERS > 0:
+        return Config.SCAN_WORKERS
+    return min(8, scheduler_service.get_cpu_count() * 2)
+
+def evict_stale_metadata(seen_paths):
+    # Elimina entradas de archivos que ya no existen
+    try:
+        stale_ids = [
+            meta_id for meta_id, path in db.session.query(VideoMetadata.id, VideoMetadata.file_path)
+            if path not in seen_paths and not os.path.exists(path)
+        ]
+        if stale_ids:
+            VideoMetadata.query.filter(VideoMetadata.id.in_(stale_ids)).delete(synchronize_session=False)
+            db.session.commit()
+            metadata_stats['evictions'] += len(stale_ids)
+        return len(stale_ids)
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Error en evict_stale_metadata: {str(e)}", exc_info=True)
+        return 0
+
+def get_metadata_stats():
+    stats = dict(metadata_stats)
+    lookups = stats['hits'] + stats['misses']
+    stats['hit_ratio'] = round(stats['hits'] / lookups, 4) if lookups else None
+    return stats
+
+def _build_video_data(file_path, video_info, status, processed, hls):
+    # Sin E/S: el plan sale de los metadatos (faststart incluido) y hls lo decide quien llama
+    rel_path = os.path.relpath(os.path.dirname(file_path), Config.CURSOS_DIR)
+    path_parts = rel_path.split(os.sep)
+    plan = plan_conversion(file_path, video_info)
+    return {
+        'curso': path_parts[0],
+        'seccion': '/'.join(path_parts[1:]) or '',
+        'filename': os.path.basename(file_path),
+        'codec': video_info.get('video_codec', 'N/A'),
+        'size_mb': video_info.get('size_mb', 0),
+        'needs_conversion': plan['operation'] != 'none',
+        'operation': plan['operation'],
+        'reason': '; '.join(plan['reasons']),
+        'status': status['status'],
+        'message': status['message'],
+        'file_path': file_path,
+        'duration': video_info.get('duration', 0),
+        'processed': processed,
+        'hls': hls
+    }
+
+def _walk_videos():
+    files = []
+    for root, dirs, filenames in os.walk(Config.CURSOS_DIR):
+        if '_archive' in root or '_temp' in root:
+            continue
+        # Los paquetes HLS no se recorren
+        dirs[:] = [d for d in dirs if not hls_service.is_hls_dir(d)]
+        if os.path.relpath(root, Config.CURSOS_DIR) == '.':
+            continue
+        files.extend(os.path.join(root, filename) for filename in filenames if is_video_file(filename))
+    return files
+
+def _known_metadata(files):
+    known = {}
+    for start in range(0, len(files), PROCESSED_LOOKUP_CHUNK):
+        chunk = files[start:start + PROCESSED_LOOKUP_CHUNK]
+        known.update((meta.file_path, meta) for meta in VideoMetadata.query.filter(VideoMetadata.file_path.in_(chunk)))
+    return known
+
+def _inspect_changed(app, files, seen_paths, skip_recent=False):
+    # Devuelve ruta -> (huella, info), el número de inspeccionados y las rutas cuya huella es nueva (sus miniaturas
+    # se piden al volver). Solo los archivos con (tamaño, mtime, inodo) distintos pasan por el pool.
+    # skip_recent: los modificados hace menos de INGEST_STABLE_SECONDS pueden estar copiándose todavía;
+    # se dejan a la ingesta por eventos, que espera a que dejen de cambiar
+    known = _known_metadata(files)
+    results = {}
+    pending = []
+    recent = []
+    now = time.time()
+    for file_path in files:
+        seen_paths.add(file_path)
+        try:
+            st = os.stat(file_path)
+        except OSError as e:
+            app.logger.warning(f"No se pudo leer {file_path}: {str(e)}")
+            continue
+        if skip_recent and now - st.st_mtime < Config.INGEST_STABLE_SECONDS:
+            recent.append(file_path)
+            continue
+        meta = known.get(file_path)
+        if meta and meta.fingerprint and _stat_matches(meta, st):
+            metadata_stats['hits'] += 1
+            results[file_path] = (meta.fingerprint, _metadata_to_info(meta))
+        else:
+            metadata_stats['misses'] += 1
+            pending.append((file_path, st, meta))
+    if recent:
+        app.logger.info(f"{len(recent)} videos modificados hace menos de {Config.INGEST_STABLE_SECONDS}s, se esperará a que terminen de copiarse")
+        ingest_service.track(recent)
+    if not pending:
+        return results, 0, set()
+    workers = get_scan_workers()
+    metadata_stats['scan_workers'] = workers
+    stored = 0
+    renewed = set()
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='scan') as pool:
+        futures = {
+            pool.submit(_inspect_in_context, app, file_path, st, _previous(meta)): (file_path, st, meta)
+            for file_path, st, meta in pending
+        }
+        # Las escrituras se hacen en este hilo, que es el dueño de la sesión
+        for future in as_completed(futures):
+            file_path, st, meta = futures[future]
+            inspection = future.result()
+            if 'error' in inspection:
+                app.logger.warning(f"No se pudo inspeccionar {file_path}: {inspection['error']}")
+                continue
+            previous_fingerprint = meta.fingerprint if meta else None
+            results[file_path] = _store_metadata(meta, file_path, st, inspection, commit=False)
+            if results[file_path][0] != previous_fingerprint:
+                renewed.add(file_path)
+            stored += 1
+            if stored % 200 == 0:
+                db.session.commit()
+    try:
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        app.logger.error(f"Error al guardar metadatos del escaneo: {str(e)}", exc_info=True)
+    return results, len(pending), renewed
+
+def _process_inspected(app, files, results, job_states, hls_states, renewed):
+    # Filas del gestor para los archivos inspeccionados; encola conversión y HLS si hace falta, y miniaturas
+    # solo de los videos con huella nueva (el resto se piden al mostrar su curso)
+    videos = []
+    processed_videos = _processed_paths(list(results))
+    for file_path in files:
+        if file_path not in results:
+            continue
+        fingerprint, video_info = results[file_path]
+        status = job_states.get(file_path, {'status': 'none', 'message': ''})
+        if 'error' in video_info:
+            app.logger.warning(f"Error en ffprobe para {file_path}: {video_info['error']}")
+            continue
+        video_data = _build_video_data(file_path, video_info, status, file_path in processed_videos,
+                                       hls_service.has_hls(file_path))
+        videos.append(video_data)
+        if file_path in renewed:
+            request_thumbnails(file_path, fingerprint, video_data['duration'],
+                               video_info.get('width'), video_info.get('height'))
+        _queue_pending(video_data, video_data['status'], hls_states)
+    return videos
+
+def _queue_pending(video_data, status, hls_states):
+    # Encola la conversión o el empaquetado HLS que le falte a un video; False si la cola no lo admite
+    file_path = video_data['file_path']
+    if video_data['needs_conversion'] and status not in ['queued', 'processing', 'completed'] and not video_data['processed']:
+        return queue_conversion(file_path, duration=video_data['duration'],
+                                plan={'operation': video_data['operation'], 'reason': video_data['reason']})
+    if Config.HLS_ENABLED and not video_data['needs_conversion'] and not video_data['hls'] \
+            and hls_states.get(file_path, {}).get('status') not in ['queued', 'processing', 'failed']:
+        return queue_hls(file_path, duration=video_data['duration'])
+    return None
+
+def refill_queue(app):
+    # Cada trabajo automático reclamado deja un hueco bajo MAX_QUEUE_SIZE: se rellena con lo que el último escaneo
+    # (o la ingesta) dejó pendiente, en vez de esperar al siguiente recorrido completo, que con la ingesta por
+    # eventos puede tardar VIDEO_FULL_SCAN_INTERVAL
+    if not _scanner_in_process or not _refill_lock.acquire(blocking=False):
+        return 0
+    try:
+        if scheduler_service.is_full():
+            return 0
+        job_states = scheduler_service.get_job_states()
+        hls_states = scheduler_service.get_job_states('hls')
+        candidates = video_candidates_cache
+        if Config.CONVERSION_ORDER == 'shortest':
+            candidates = sorted(candidates, key=lambda video: video['duration'] or 0)
+        queued = 0
+        for video_data in candidates:
+            status = job_states.get(video_data['file_path'], {}).get('status', 'none')
+            if not video_data['needs_conversion'] and hls_states.get(video_data['file_path'], {}).get('status') == 'completed':
+                continue  # La marca 'hls' de la caché es del escaneo: un paquete hecho después no se repite
+            result = _queue_pending(video_data, status, hls_states)
+            if result is False and scheduler_service.is_full():
+                break
+            queued += bool(result)
+        if queued:
+            app.logger.info(f"Cola rellenada con {queued} trabajos pendientes del último escaneo")
+        return queued
+    except Exception as e:
+        db.session.rollback()
+        app.logger.error(f"Error en refill_queue: {str(e)}", exc_info=True)
+        return 0
+    finally:
+        _refill_lock.release()
+
+def scan_videos_once(app):
+    global video_candidates_cache, cache_status, _scanner_in_process
+    _scanner_in_process = True
+    with _scan_lock, app.app_context():
+        cache_status = "scanning"
+        set_setting('scan.status', {'status': cache_status, 'count': len(video_candidates_cache)})
+        app.logger.info("Iniciando escaneo recursivo de videos...")
+        start = time.perf_counter()
+        videos = []
+        seen_paths = set()
+        try:
+            job_states = scheduler_service.get_job_states()
+            hls_states = scheduler_service.get_job_states('hls')
+            files = _walk_videos()
+            results, inspected, renewed = _inspect_changed(app, files, seen_paths, skip_recent=True)
+            videos = _process_inspected(app, files, results, job_states, hls_states, renewed)
+            evicted = evict_stale_metadata(seen_paths)
+            metadata_stats['last_scan_seconds'] = round(time.perf_counter() - start, 3)
+            observe('scan_videos_duration_seconds', metadata_stats['last_scan_seconds'])
+            metadata_stats['last_scan_files'] = len(files)
+            metadata_stats['last_scan_inspected'] = inspected
+            app.logger.info(f"Caché de metadatos: {get_metadata_stats()} (eliminadas en este escaneo: {evicted})")
+        except Exception as e:
+            db.session.rollback()
+            app.logger.error(f"Error durante el escaneo de videos: {str(e)}", exc_info=True)
+        video_candidates_cache = videos
+        cache_status = "ready"
+        # Estado publicado para los procesos web, que no ejecutan el escaneo
+        set_setting('scan.status', {'status': cache_status, 'count': len(videos), 'finished_at': time.time()})
+        set_setting('metadata.stats', get_metadata_stats())
+        app.logger.info(f"Caché de videos actualizada: {len(videos)} videos encontrados")
+
+def ingest_files(app, paths):
+    # Ingesta por eventos (ingest_service): solo los archivos indicados, que ya han dejado de cambiar en disco
+    global video_candidates_cache
+    with _scan_lock, app.app_context():
+        files = [path for path in paths if os.path.isfile(path)]
+        try:
+            job_states = scheduler_service.get_job_states()
+            hls_states = scheduler_service.get_job_states('hls')
+            results, _, renewed = _inspect_changed(app, files, set())
+            videos = _process_inspected(app, files, results, job_states, hls_states, renewed)
+        except Exception as e:
+            db.session.rollback()
+            app.logger.error(f"Error en ingest_files: {str(e)}", exc_info=True)
+            return []
+        changed = set(paths)
+        video_candidates_cache = [v for v in video_candidates_cache if v['file_path'] not in changed] + videos
+        # finished_at cambia: los gestores de los procesos web reconstruyen su vista
+        set_setting('scan.status', {'status': cache_status, 'count': len(video_candidates_cache), 'finished_at': time.time()})
+        return [video['file_path'] for video in videos]
+
+def forget_files(app, paths):
+    # Archivos o carpetas que han desaparecido (borrados, movidos o archivados al convertir). También se borran
+    # sus metadatos: los procesos web listan los videos desde VideoMetadata
+    global video_candidates_cache
+    prefixes = tuple(os.path.join(path, '') for path in paths)
+    removed = set(paths)
+    with _scan_lock, app.app_context():
+        before = len(video_candidates_cache)
+        # Una ruta puede haberse vuelto a crear después del evento de borrado: solo se olvida lo que no existe
+        video_candidates_cache = [v for v in video_candidates_cache
+                                  if (v['file_path'] not in removed and not v['file_path'].startswith(prefixes))
+                                  or os.path.exists(v['file_path'])]
+        evicted = 0
+        try:
+            gone = db.or_(VideoMetadata.file_path.in_(list(removed)),
+                          *(VideoMetadata.file_path.startswith(prefix, autoescape=True) for prefix in prefixes))
+            stale_ids = [meta_id for meta_id, path in db.session.query(VideoMetadata.id, VideoMetadata.file_path).filter(gone)
+                         if not os.path.exists(path)]
+            if stale_ids:
+                VideoMetadata.query.filter(VideoMetadata.id.in_(stale_ids)).delete(synchronize_session=False)
+                db.session.commit()
+                metadata_stats['evictions'] += len(stale_ids)
+                evicted = len(stale_ids)
+        except Exception as e:
+            db.session.rollback()
+            app.logger.error(f"Error en forget_files: {str(e)}", exc_info=True)
+        if len(video_candidates_cache) != before or evicted:
+            set_setting('scan.status', {'status': cache_status, 'count': len(video_candidates_cache), 'finished_at': time.time()})
+        return before - len(video_candidates_cache)
+
+def _processed_paths(paths):
+    # Rutas de la lista que ya son salida de una conversión; consulta por el índice de converted_path
+    processed = set()
+    for start in range(0, len(paths), PROCESSED_LOOKUP_CHUNK):
+        chunk = paths[start:start + PROCESSED_LOOKUP_CHUNK]
+        processed.update(path for (path,) in db.session.query(ConvertedVideo.converted_path)
+                         .filter(ConvertedVideo.converted_path.in_(chunk)))
+    return processed
+
 def scan_videos(app):
-    global video_candidates_cache, cache_status
+    # Red de seguridad: con la ingesta por eventos activa el recorrido completo puede espaciarse mucho más
     while True:
-        with app.app_context():
-            cache_status = "scanning"
-            app.logger.info("Iniciando escaneo recursivo de videos...")
-            videos = []
-            try:
-                processed_videos = {cv.converted_path: cv for cv in ConvertedVideo.query.all()}
-                for root, dirs, files in os.walk(Config.CURSOS_DIR):
-                    if '_archive' in root or '_temp' in root:
-                        continue
-                    rel_path = os.path.relpath(root, Config.CURSOS_DIR)
-                    if rel_path == '.':
-                        continue
-                    path_parts = rel_path.split(os.sep)
-                    curso = path_parts[0]
-                    seccion = '/'.join(path_parts[1:]) or ''
-                    for filename in files:
-                        if filename.endswith('.mp4'):
-                            file_path = os.path.join(root, filename)
-                            file_hash = get_file_hash(file_path)
-                            if not file_hash:
-                                continue
-                            status = conversion_status.get(file_path, {'status': 'none', 'message': ''})
-                            video_info = get_video_info(file_path)
-                            if 'error' in video_info:
-                                app.logger.warning(f"Error en ffprobe para {file_path}: {video_info['error']}")
-                                continue
-                            video_data = {
-                                'curso': curso,
-                                'seccion': seccion,
-                                'filename': filename,
-                                'codec': video_info.get('video_codec', 'N/A'),
-                                'size_mb': video_info.get('size_mb', 0),
-                                'needs_conversion': video_info.get('video_codec') not in ['h264', 'h265'],
-                                'status': status['status'],
-                                'message': status['message'],
-                                'file_path': file_path,
-                                'duration': video_info.get('duration', 0),
-                                'processed': file_path in processed_videos
-                            }
-                            videos.append(video_data)
-                            if video_data['needs_conversion'] and video_data['status'] not in ['queued', 'processing', 'completed'] and not video_data['processed']:
-                                if not conversion_queue.full():
-                                    conversion_queue.put(file_path)
-                                    conversion_status[file_path] = {'status': 'queued', 'message': 'En cola', 'progress': 0, 'eta': 'Esperando...'}
-            except Exception as e:
-                app.logger.error(f"Error durante el escaneo de videos: {str(e)}", exc_info=True)
-            video_candidates_cache = videos
-            cache_status = "ready"
-            app.logger.info(f"Caché de videos actualizada: {len(videos)} videos encontrados")
-        time.sleep(300)
-
-def convert_video(file_path):
-    filename = os.path.basename(file_path)
-    temp_output_path = os.path.join(Config.TEMP_DIR, f"{hashlib.md5(filename.encode()).hexdigest()}_h264_temp.mp4")
-    archive_path = os.path.join(Config.ARCHIVE_DIR, filename)
-    original_hash = get_file_hash(file_path)
-    if not original_hash:
-        conversion_status[file_path] = {'status': 'failed', 'message': 'No se pudo calcular el hash del archivo', 'progress': 0, 'eta': 'N/A'}
+        scan_videos_once(app)
+        time.sleep(Config.VIDEO_FULL_SCAN_INTERVAL if ingest_service.is_running() else 300)
+
+def get_video_candidates():
+    # En el proceso que escanea se usa la caché; en los procesos web se reconstruye desde VideoMetadata
+    if _scanner_in_process:
+        return video_candidates_cache
+    job_states = scheduler_service.get_job_states()
+    # Sin tocar el disco: un paquete HLS está vigente si su trabajo terminó después del último cambio del original
+    hls_completed = scheduler_service.get_completed_at('hls')
+    prefix = os.path.join(Config.CURSOS_DIR, '')
+    videos = []
+    processed = db.exists().where(ConvertedVideo.converted_path == VideoMetadata.file_path)
+    rows = db.session.query(VideoMetadata, processed) \
+        .filter(VideoMetadata.probe_error.is_(None), VideoMetadata.fingerprint.isnot(None)) \
+        .order_by(VideoMetadata.file_path)
+    for meta, is_processed in rows:
+        rel_path = meta.file_path[len(prefix):]
+        if not meta.file_path.startswith(prefix) or os.sep not in rel_path \
+                or '_archive' in rel_path or '_temp' in rel_path or not is_video_file(rel_path) \
+                or any(hls_service.is_hls_dir(part) for part in rel_path.split(os.sep)[:-1]):
+            continue
+        status = job_states.get(meta.file_path, {'status': 'none', 'message': ''})
+        hls_at = hls_completed.get(meta.file_path)
+        hls = hls_at is not None and hls_at.replace(tzinfo=timezone.utc).timestamp() >= meta.mtime_ns / 1e9
+        videos.append(_build_video_data(meta.file_path, _metadata_to_info(meta), status, bool(is_processed), hls))
+    return videos
+
+def get_cache_status():
+    if _scanner_in_process:
+        return cache_status
+    return (get_setting('scan.status', {}) or {}).get('status', 'scanning')
+
+def get_published_metadata_stats():
+    if _scanner_in_process:
+        return get_metadata_stats()
+    return get_setting('metadata.stats') or get_metadata_stats()
+
+def get_temp_output_path(file_path):
+    return os.path.join(Config.TEMP_DIR, f"{scheduler_service.get_temp_prefix(file_path)}_h264_temp.mp4")
+
+def publish_progress(file_path, verb, summary):
+    conversion_status[file_path] = {
+        'status': 'processing',
+        'message': format_message(verb, summary),
+        'progress': summary['progress'] or 0,
+        'eta': format_eta(summary['eta_seconds']),
+        'stats': summary
+    }
+
+def get_cancel_event():
+    # Se activa si el trabajo de este hilo pierde su lease (otro worker lo ha reclamado). Fuera de un
+    # worker (llamadas directas) nunca se activa
+    if getattr(_job_context, 'cancel', None) is None:
+        _job_context.cancel = threading.Event()
+    return _job_context.cancel
+
+def is_cancelled():
+    return get_cancel_event().is_set()
+
+def _terminate_on_cancel(process, cancel):
+    # Aunque ffmpeg esté detenido por el regulador y no escriba progreso
+    while process.poll() is None:
+        if cancel.wait(1.0):
+            process.terminate()
+            process.send_signal(signal.SIGCONT)
+            return
+
+def run_segmented(file_path, plan, output_path, duration, has_audio, profile=None):
+    # Recodificación de un video largo en trozos paralelos; mismo contrato que run_ffmpeg
+    started = time.monotonic()
+    returncode, error = segmented_encoder.encode_segmented(
+        file_path, plan, output_path, duration, has_audio,
+        lambda verb, summary: publish_progress(file_path, verb, summary), profile, get_cancel_event()
+    )
+    elapsed = time.monotonic() - started
+    if returncode == 0 and duration and elapsed > 0:
+        observe('ffmpeg_speed_ratio', duration / elapsed, operation='reencode_segmented')
+    return returncode, error
+
+def run_ffmpeg(command, file_path, duration, verb, operation):
+    # Ejecuta ffmpeg y publica su progreso (bloques -progress por stdout) en conversion_status.
+    # Devuelve (código de salida, últimas líneas de error)
+    command = command[:1] + ['-nostats', '-loglevel', 'error'] + command[1:]
+    started = time.monotonic()
+    process = subprocess.Popen(throttle_service.wrap_command(command), stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                               universal_newlines=True)
+    throttle_service.register(process)
+    threading.Thread(target=_terminate_on_cancel, args=(process, get_cancel_event()), daemon=True).start()
+    errors = deque(maxlen=20)
+    stderr_reader = threading.Thread(target=errors.extend, args=(process.stderr,), daemon=True)
+    stderr_reader.start()
+    last_update = 0
+    for block in parse_progress(process.stdout):
+        summary = summarize_progress(block, duration)
+        now = time.monotonic()
+        if not summary['finished'] and now - last_update < PROGRESS_UPDATE_SECONDS:
+            continue
+        last_update = now
+        publish_progress(file_path, verb, summary)
+    process.wait()
+    throttle_service.unregister(process)
+    stderr_reader.join(timeout=5)
+    elapsed = time.monotonic() - started
+    if process.returncode == 0 and duration and elapsed > 0:
+        observe('ffmpeg_speed_ratio', duration / elapsed, operation=operation)
+    return process.returncode, ' '.join(line.strip() for line in errors)[-500:]
+
+OPERATION_VERBS = {
+    'faststart': 'Optimizando inicio',
+    'remux': 'Reempaquetando',
+    'audio': 'Transcodificando audio',
+    'reencode': 'Convirtiendo',
+}
+
+def get_archive_path(file_path):
+    # Se replica la ruta relativa a CURSOS_DIR: dos cursos con un "tema1.avi" no se pisan en el archivo
+    rel_path = os.path.relpath(file_path, Config.CURSOS_DIR)
+    if rel_path.startswith(os.pardir):
+        rel_path = os.path.basename(file_path)
+    return os.path.join(Config.ARCHIVE_DIR, rel_path)
+
+def find_reusable_conversion(original_hash, output_path, profile_name=None):
+    # Conversión anterior del mismo original (p. ej. el mismo video copiado en varios cursos) cuya salida
+    # sigue en disco sin cambios. Las filas antiguas sin converted_hash no se pueden verificar y se ignoran
+    extension = os.path.splitext(output_path)[1].lower()
+    candidates = ConvertedVideo.query.filter(ConvertedVideo.original_hash == original_hash,
+                                             ConvertedVideo.converted_hash.isnot(None))
+    if profile_name:
+        # Una recodificación solo vale con el mismo perfil; las anteriores a los perfiles se hicieron con 'standard'
+        same_profile = ConvertedVideo.profile == profile_name
+        if profile_name == 'standard':
+            same_profile = db.or_(same_profile, ConvertedVideo.profile.is_(None))
+        candidates = candidates.filter(same_profile)
+    candidates = candidates.order_by(ConvertedVideo.id.desc())
+    for converted in candidates:
+        if os.path.splitext(converted.converted_path)[1].lower() != extension:
+            continue
+        try:
+            if os.path.getsize(converted.converted_path) != converted.size:
+                continue
+        except OSError:
+            continue
+        if get_full_hash(converted.converted_path) == converted.converted_hash:
+            return converted
+    return None
+
+def stage_reused_output(source_path, temp_output_path):
+    # 'copy' copia; 'reflink' comparte bloques pero cada archivo tiene su inodo; 'hardlink' comparte el inodo,
+    # así que una escritura en el sitio sobre cualquiera de los dos cambia también el otro curso
+    if os.path.exists(temp_output_path):
+        os.remove(temp_output_path)
+    try:
+        if Config.CONVERSION_DEDUP == 'reflink':
+            dedup_service.clone_file(source_path, temp_output_path)
+            shutil.copystat(source_path, temp_output_path)
+            return 'reflink'
+        if Config.CONVERSION_DEDUP == 'hardlink':
+            os.link(source_path, temp_output_path)
+            return 'hardlink'
+    except OSError as e:
+        current_app.logger.info(f"No se pudo reutilizar {source_path} con {Config.CONVERSION_DEDUP} ({e}), se copia")
+    shutil.copy2(source_path, temp_output_path)
+    return 'copy'
+
+def get_course_profiles():
+    # {curso: perfil} elegidos en el gestor de videos; el resto usa ENCODING_PROFILE
+    return get_setting('encoding.course_profiles', {}) or {}
+
+def set_course_profile(curso, profile_name):
+    profiles = get_course_profiles()
+    if profile_name in ENCODING_PROFILES:
+        profiles[curso] = profile_name
+    else:
+        profiles.pop(curso, None)
+    set_setting('encoding.course_profiles', profiles)
+
+def resolve_profile(file_path, requested=None):
+    # Perfil del trabajo, si no el del curso y si no el global
+    if requested not in ENCODING_PROFILES:
+        curso = os.path.relpath(file_path, Config.CURSOS_DIR).split(os.sep)[0]
+        requested = get_course_profiles().get(curso)
+    return get_profile(requested)
+
+def estimate_output(file_path, plan, video_info, profile, parallelism=1):
+    # Estimación por muestras; si falla se convierte igualmente, solo se pierde la previsión
+    def on_sample(index, total):
+        conversion_status[file_path] = {'status': 'processing', 'progress': 0, 'eta': 'Calculando...',
+                                        'message': f"Estimando tamaño con el perfil {profile['name']} (muestra {index + 1}/{total})"}
+    try:
+        estimate = encode_estimator.estimate(file_path, plan, video_info, profile, parallelism, on_sample)
+    except Exception as e:
+        current_app.logger.warning(f"No se pudo estimar la conversión de {file_path}: {str(e)}")
+        return None
+    if estimate:
+        current_app.logger.info(
+            f"Estimación para {file_path} con el perfil {profile['name']}: {estimate['expected_size'] / (1024 * 1024):.1f} MB "
+            f"({estimate['expected_ratio']:.0%} del original), ~{format_eta(estimate['expected_seconds'])} "
+            f"(muestras en {estimate['estimate_seconds']}s)")
+    return estimate
+
+def convert_video(file_path, payload=None):
+    temp_output_path = get_temp_output_path(file_path)
+    archive_path = get_archive_path(file_path)
+    _, video_info = get_cached_metadata(file_path)
+    if 'error' in video_info:
+        conversion_status[file_path] = {'status': 'failed', 'message': video_info['error'], 'progress': 0, 'eta': 'N/A'}
         return
-    video_info = get_video_info(file_path)
     duration = video_info.get('duration', 0) if 'duration' in video_info else 0
-    conversion_status[file_path] = {'status': 'processing', 'message': 'Iniciando conversión', 'progress': 0, 'eta': 'Calculando...'}
+    # Se planifica de nuevo: el archivo puede haber cambiado desde que se encoló
+    plan = plan_conversion(file_path, video_info)
+    output_path = plan['output_path']
+    # El perfil solo cuenta al recodificar: copiar o reempaquetar da la misma salida con cualquiera
+    profile = resolve_profile(file_path, (payload or {}).get('profile'))
+    profile_name = profile['name'] if plan['operation'] == 'reencode' else None
+    result = {'operation': plan['operation'], 'reasons': plan['reasons'], 'output_path': output_path, 'profile': profile_name}
+    current_app.logger.info(f"Plan para {file_path}: {plan['operation']} ({'; '.join(plan['reasons'])})"
+                            + (f", perfil {profile_name}" if profile_name else ''))
+    if plan['operation'] == 'none':
+        conversion_status[file_path] = {'status': 'completed', 'message': 'No requiere conversión', 'progress': 100, 'eta': '0s', 'result': result}
+        return
+    if output_path != file_path and os.path.exists(output_path):
+        conversion_status[file_path] = {'status': 'failed', 'message': f'Ya existe {output_path}', 'progress': 0, 'eta': 'N/A'}
+        return
+    verb = OPERATION_VERBS[plan['operation']]
+    conversion_status[file_path] = {'status': 'processing', 'message': f'{verb}: iniciando', 'progress': 0, 'eta': 'Calculando...'}
 
     try:
-        process = subprocess.Popen(
-            ['ffmpeg', '-i', file_path, '-c:v', 'libx264', '-preset', 'fast', '-c:a', 'copy', '-progress', 'pipe:1', temp_output_path],
-            stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True
-        )
-        for line in process.stdout:
-            if 'time=' in line:
-                match = re.search(r'time=(\d+):(\d+):(\d+\.\d+)', line)
-                if match:
-                    hours, minutes, seconds = map(float, match.groups())
-                    elapsed = hours * 3600 + minutes * 60 + seconds
-                    if duration > 0:
-                        progress = min(100, int((elapsed / duration) * 100))
-                        eta = (duration - elapsed) if progress < 100 else 0
-                        conversion_status[file_path] = {
-                            'status': 'processing',
-                            'message': f'Convirtiendo ({progress}%)',
-                            'progress': progress,
-                            'eta': f"{int(eta // 60)}m {int(eta % 60)}s" if eta > 0 else "Finalizando..."
-                        }
-        process.wait()
-        if process.returncode == 0:
+        # El hash completo solo se calcula al convertir: identifica el original para reutilizar salidas previas
+        original_hash = get_full_hash(file_path)
+        if not original_hash:
+            raise RuntimeError('No se pudo calcular el hash del archivo')
+        original_size = os.path.getsize(file_path)
+        reused = find_reusable_conversion(original_hash, output_path, profile_name) if Config.CONVERSION_DEDUP != 'off' else None
+        estimate = None
+        encode_seconds = None
+        if reused is not None:
+            result['reused_from'] = reused.converted_path
+            result['reuse_method'] = stage_reused_output(reused.converted_path, temp_output_path)
+            current_app.logger.info(f"Reutilizada la conversión de {reused.converted_path} para {file_path} ({result['reuse_method']})")
+            inc('conversion_dedup_hits_total')
+            returncode, ffmpeg_error = 0, ''
+            verb = 'Reutilizada conversión existente'
+        else:
+            segmented = segmented_encoder.should_segment(plan, duration)
+            parallelism = segmented_encoder.get_free_parallelism() if segmented else 1
+            estimate = estimate_output(file_path, plan, video_info, profile, parallelism)
+            result['estimate'] = estimate
+            started = time.monotonic()
+            if segmented:
+                current_app.logger.info(f"Conversión por segmentos de {file_path} ({duration:.0f}s, {parallelism} en paralelo)")
+                has_audio = any(s.get('codec_type') == 'audio' for s in video_info.get('streams') or [])
+                returncode, ffmpeg_error = run_segmented(file_path, plan, temp_output_path, duration, has_audio, profile)
+            else:
+                command = build_ffmpeg_command(file_path, plan, temp_output_path, throttle_service.get_encoder_threads(), profile)
+                returncode, ffmpeg_error = run_ffmpeg(command, file_path, duration, verb, plan['operation'])
+            encode_seconds = round(time.monotonic() - started, 1)
+        if returncode == 0:
+            converted_hash = reused.converted_hash if reused is not None else get_file_hash(temp_output_path)
+            if not converted_hash:
+                raise RuntimeError('No se pudo calcular el hash de la salida')
+        if is_cancelled():
+            # Otro worker ha reclamado el trabajo: ni se archiva el original ni se tocan sus temporales
+            conversion_status[file_path] = {'status': 'failed', 'message': LEASE_LOST_MESSAGE, 'progress': 0, 'eta': 'N/A', 'result': result}
+            return
+        if returncode == 0:
+            video_codec = 'h264' if plan['operation'] == 'reencode' else video_info.get('video_codec')
+            size = os.path.getsize(temp_output_path)
+            os.makedirs(os.path.dirname(archive_path), exist_ok=True)
             os.rename(file_path, archive_path)
-            os.rename(temp_output_path, file_path)
-            with db.session:
-                converted = ConvertedVideo(original_hash=original_hash, original_path=archive_path, converted_path=file_path)
-                db.session.add(converted)
-                db.session.commit()
-            conversion_status[file_path] = {'status': 'completed', 'message': f'Convertido y archivado: {file_path}', 'progress': 100, 'eta': '0s'}
+            os.rename(temp_output_path, output_path)
+            converted = ConvertedVideo(original_hash=original_hash, original_path=archive_path, converted_path=output_path,
+                                       converted_hash=converted_hash, video_codec=video_codec, size=size,
+                                       created_at=datetime.utcnow(),
+                                       profile=reused.profile if reused is not None else profile_name,
+                                       original_size=original_size,
+                                       expected_size=estimate['expected_size'] if estimate else None,
+                                       expected_seconds=estimate['expected_seconds'] if estimate else None,
+                                       encode_seconds=encode_seconds)
+            db.session.add(converted)
+            db.session.commit()
+            result.update({'original_size': original_size, 'size': size, 'encode_seconds': encode_seconds})
+            if estimate:
+                current_app.logger.info(f"Tamaño de {output_path}: {size} bytes (previsto {estimate['expected_size']}), "
+                                        f"{encode_seconds}s (previsto {estimate['expected_seconds']}s)")
+            conversion_status[file_path] = {'status': 'completed', 'message': f'{verb} y archivado: {output_path}', 'progress': 100, 'eta': '0s', 'result': result}
         else:
-            conversion_status[file_path] = {'status': 'failed', 'message': 'FFmpeg falló', 'progress': 0, 'eta': 'N/A'}
+            conversion_status[file_path] = {'status': 'failed', 'message': f'FFmpeg falló: {ffmpeg_error}', 'progress': 0, 'eta': 'N/A', 'result': result}
             if os.path.exists(temp_output_path):
                 os.remove(temp_output_path)
     except Exception as e:
         conversion_status[file_path] = {'status': 'failed', 'message': str(e), 'progress': 0, 'eta': 'N/A'}
-        if os.path.exists(temp_output_path):
+        if os.path.exists(temp_output_path) and not is_cancelled():
             os.remove(temp_output_path)
         current_app.logger.error(f"Error en convert_video: {str(e)}", exc_info=True)
 
-def conversion_worker():
-    while True:
-        try:
-            file_path = conversion_queue.get()
-            convert_video(file_path)
-            conversion_queue.task_done()
-        except Exception as e:
-            current_app.logger.error(f"Error en conversion_worker: {str(e)}", exc_info=True)
-            conversion_queue.task_done()
+def estimate_video(file_path, payload=None):
+    # Trabajo 'estimate': previsión de tamaño y tiempo con uno o varios perfiles, sin convertir nada
+    _, video_info = get_cached_metadata(file_path)
+    if 'error' in video_info:
+        conversion_status[file_path] = {'status': 'failed', 'message': video_info['error'], 'progress': 0, 'eta': 'N/A'}
+        return
+    plan = plan_conversion(file_path, video_info)
+    if plan['operation'] != 'reencode':
+        conversion_status[file_path] = {'status': 'completed', 'progress': 100, 'eta': '0s', 'result': {'estimates': []},
+                                        'message': f"No se recodifica (operación {plan['operation']}): el perfil no cambia el tamaño"}
+        return
+    names = [name for name in (payload or {}).get('profiles') or [] if name in ENCODING_PROFILES] or list(ENCODING_PROFILES)
+    segmented = segmented_encoder.should_segment(plan, video_info.get('duration'))
+    parallelism = segmented_encoder.get_parallelism() if segmented else 1
+    estimates = []
+    for name in names:
+        estimate = estimate_output(file_path, plan, video_info, get_profile(name), parallelism)
+        if estimate is None:
+            break  # Video demasiado corto para muestrear o estimación fallida: igual con todos los perfiles
+        estimates.append(estimate)
+    if not estimates:
+        conversion_status[file_path] = {'status': 'failed', 'progress': 0, 'eta': 'N/A',
+                                        'message': 'No se pudo estimar (video demasiado corto o muestras fallidas)'}
+        return
+    summary = ' · '.join(f"{e['profile']}: {e['expected_size'] / (1024 * 1024):.0f} MB ({e['expected_ratio']:.0%}), "
+                         f"~{format_eta(e['expected_seconds'])}" for e in estimates)
+    conversion_status[file_path] = {'status': 'completed', 'message': summary, 'progress': 100, 'eta': '0s',
+                                    'result': {'estimates': estimates, 'operation': plan['operation']}}
 
-def set_queue_size(new_size):
+def package_hls(file_path, payload=None):
+    _, video_info = get_cached_metadata(file_path)
+    if 'error' in video_info:
+        conversion_status[file_path] = {'status': 'failed', 'message': video_info['error'], 'progress': 0, 'eta': 'N/A'}
+        return
+    renditions = hls_service.get_renditions(video_info.get('height'))
+    has_audio = video_info.get('audio_codec', 'N/A') != 'N/A'
+    temp_dir = hls_service.get_temp_hls_dir(file_path)
+    conversion_status[file_path] = {'status': 'processing', 'message': 'Iniciando empaquetado HLS', 'progress': 0, 'eta': 'Calculando...'}
     try:
-        global conversion_queue
-        new_queue = Queue(maxsize=new_size)
-        while not conversion_queue.empty() and not new_queue.full():
-            new_queue.put(conversion_queue.get())
-        conversion_queue = new_queue
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        for height in renditions:
+            os.makedirs(os.path.join(temp_dir, f"{height}p"), exist_ok=True)
+        command = hls_service.build_hls_command(file_path, temp_dir, renditions, has_audio,
+                                                throttle_service.get_encoder_threads())
+        returncode, ffmpeg_error = run_ffmpeg(command, file_path, video_info.get('duration', 0), 'Empaquetando HLS', 'hls')
+        if is_cancelled():
+            conversion_status[file_path] = {'status': 'failed', 'message': LEASE_LOST_MESSAGE, 'progress': 0, 'eta': 'N/A'}
+            return
+        if returncode == 0:
+            hls_service.publish_hls(file_path, temp_dir)
+            conversion_status[file_path] = {
+                'status': 'completed', 'message': f"HLS generado: {', '.join(f'{h}p' for h in renditions)}",
+                'progress': 100, 'eta': '0s',
+                'result': {'renditions': renditions, 'segment_seconds': Config.HLS_SEGMENT_SECONDS, 'audio': has_audio}
+            }
+        else:
+            conversion_status[file_path] = {'status': 'failed', 'message': f'FFmpeg falló al empaquetar HLS: {ffmpeg_error}', 'progress': 0, 'eta': 'N/A'}
+            shutil.rmtree(temp_dir, ignore_errors=True)
     except Exception as e:
-        current_app.logger.error(f"Error en set_queue_size: {str(e)}", exc_info=True)
\ No newline at end of file
+        conversion_status[file_path] = {'status': 'failed', 'message': str(e), 'progress': 0, 'eta': 'N/A'}
+        if not is_cancelled():
+            shutil.rmtree(temp_dir, ignore_errors=True)
+        current_app.logger.error(f"Error en package_hls: {str(e)}", exc_info=True)
+
+JOB_HANDLERS = {
+    'convert': convert_video,
+    'hls': package_hls,
+    'estimate': estimate_video,
+    'dedup': dedup_service.run_dedup,
+}
+
+def queue_conversion(file_path, priority=scheduler_service.PRIORITY_AUTO, duration=0, plan=None, profile=None):
+    # El plan del escaneo se guarda en el trabajo para mostrar por qué se encoló; profile fuerza un perfil
+    payload = dict(plan or {})
+    if profile in ENCODING_PROFILES:
+        payload['profile'] = profile
+    return scheduler_service.submit(file_path, priority=priority, duration=duration, payload=payload or None,
+                                    temp_path=get_temp_output_path(file_path))
+
+def queue_hls(file_path, priority=scheduler_service.PRIORITY_AUTO, duration=0, follow_up=False):
+    return scheduler_service.submit(file_path, priority=priority, duration=duration, job_type='hls',
+                                    temp_path=hls_service.get_temp_hls_dir(file_path), follow_up=follow_up)
+
+def queue_estimate(file_path, profiles=None, duration=0):
+    return scheduler_service.submit(file_path, priority=scheduler_service.PRIORITY_ADMIN, duration=duration,
+                                    job_type='estimate', payload={'profiles': profiles or []},
+                                    temp_path=encode_estimator.get_work_dir(file_path))
+
+def _heartbeat_loop(app, job, worker_id, stop, cancel):
+    # Publica el progreso cuando cambia (como mucho cada PROGRESS_PUBLISH_INTERVAL) y renueva el lease
+    published = None
+    last_heartbeat = time.monotonic()
+    while not stop.wait(Config.PROGRESS_PUBLISH_INTERVAL):
+        status = conversion_status.get(job['file_path'], {})
+        current = (status.get('progress'), status.get('message'), status.get('eta'))
+        if current == published and time.monotonic() - last_heartbeat < Config.JOB_HEARTBEAT_INTERVAL:
+            continue
+        with app.app_context():
+            owned = scheduler_service.heartbeat(job['id'], worker_id, progress=current[0], message=current[1], eta=current[2])
+            db.session.remove()
+        if not owned:
+            # El lease expiró y el trabajo se reencoló: se detiene ffmpeg y convert_video no archiva ni renombra
+            app.logger.warning(f"Trabajo {job['id']} ({job['file_path']}) reclamado por otro worker, se cancela")
+            cancel.set()
+            return
+        published = current
+        last_heartbeat = time.monotonic()
+
+def conversion_worker(app):
+    worker_id = scheduler_service.make_worker_id()
+    while True:
+        with app.app_context():
+            job = scheduler_service.next_job(worker_id)
+            refill_queue(app)
+        file_path = job['file_path']
+        stop = threading.Event()
+        _job_context.cancel = threading.Event()
+        threading.Thread(target=_heartbeat_loop, args=(app, job, worker_id, stop, _job_context.cancel), daemon=True).start()
+        segmented_encoder.hold_job_slot()
+        with app.app_context():
+            try:
+                JOB_HANDLERS[job['job_type']](file_path, job['payload'])
+            except Exception as e:
+                app.logger.error(f"Error en conversion_worker: {str(e)}", exc_info=True)
+                conversion_status[file_path] = {'status': 'failed', 'message': str(e), 'progress': 0, 'eta': 'N/A'}
+            finally:
+                segmented_encoder.release_slots(1)
+                stop.set()
+                status = conversion_status.pop(file_path, {})
+                state = 'completed' if status.get('status') == 'completed' else 'failed'
+                inc('conversion_jobs_total', job_type=job['job_type'], state=state)
+                scheduler_service.finish_job(job['id'], worker_id, state, message=status.get('message', ''),
+                                             progress=status.get('progress'), result=status.get('result'))
+                # Un video recién convertido pasa directamente al empaquetado HLS, aunque la cola esté llena
+                if state == 'completed' and job['job_type'] == 'convert' and Config.HLS_ENABLED:
+                    output_path = (status.get('result') or {}).get('output_path', file_path)
+                    if not queue_hls(output_path, duration=job.get('duration', 0), follow_up=True):
+                        app.logger.warning(f"No se pudo encolar el empaquetado HLS de {output_path}")
+                db.session.remove()
+
+def start_conversion_workers(app):
+    workers = scheduler_service.get_worker_count()
+    with app.app_context():
+        scheduler_service.publish_worker_info()
+    app.logger.info(f"Iniciando {workers} workers de conversión ({Config.FFMPEG_THREADS} hilos de ffmpeg cada uno)")
+    for i in range(workers):
+        threading.Thread(target=conversion_worker, args=(app,), name=f"conversion-{i}", daemon=True).start()
+    threading.Thread(target=scheduler_service.job_janitor, args=(app,), daemon=True).start()
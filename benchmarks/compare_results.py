@@ -0,0 +1,71 @@
+# Compara dos resultados de run_benchmarks.py y marca las regresiones que superan el umbral.
+#
+#   python benchmarks/compare_results.py base.json nuevo.json --threshold 10
+#
+# Devuelve 1 si alguna métrica empeora más que el umbral (útil en CI), 0 en otro caso.
+import argparse
+import json
+import sys
+
+# Métricas comparables y si un valor mayor es mejor
+METRICS = {
+    'p50_ms': False, 'p90_ms': False, 'p95_ms': False, 'p99_ms': False, 'mean_ms': False, 'max_ms': False,
+    'ops_per_sec': True, 'mb_per_sec': True, 'peak_kb': False,
+}
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)
+
+def compare(base, candidate, metrics, threshold):
+    # Devuelve filas (benchmark, métrica, base, nuevo, cambio %, regresión)
+    rows = []
+    for name in sorted(set(base['results']) & set(candidate['results'])):
+        for metric in metrics:
+            before = base['results'][name].get(metric)
+            after = candidate['results'][name].get(metric)
+            if before is None or after is None:
+                continue
+            change = (after - before) / before * 100 if before else 0.0
+            worse = -change if METRICS[metric] else change
+            rows.append((name, metric, before, after, change, worse > threshold))
+    return rows
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compara dos resultados de benchmarks')
+    parser.add_argument('base')
+    parser.add_argument('candidate')
+    parser.add_argument('--metrics', default='p50_ms,p95_ms,ops_per_sec,peak_kb',
+                        help=f"Lista separada por comas de: {', '.join(METRICS)}")
+    parser.add_argument('--threshold', type=float, default=10.0, help='Empeoramiento máximo tolerado, en %%')
+    parser.add_argument('--json', action='store_true', help='Salida en JSON en lugar de tabla')
+    args = parser.parse_args(argv)
+
+    metrics = [metric.strip() for metric in args.metrics.split(',') if metric.strip()]
+    unknown = set(metrics) - set(METRICS)
+    if unknown:
+        parser.error(f"Métricas desconocidas: {', '.join(sorted(unknown))}")
+    base, candidate = load(args.base), load(args.candidate)
+    if base['library']['shape'] != candidate['library']['shape']:
+        print("Aviso: las bibliotecas tienen forma distinta, la comparación no es directa", file=sys.stderr)
+    if base.get('settings') != candidate.get('settings'):
+        print("Aviso: las iteraciones difieren entre ejecuciones", file=sys.stderr)
+
+    rows = compare(base, candidate, metrics, args.threshold)
+    regressions = [row for row in rows if row[5]]
+    if args.json:
+        print(json.dumps({
+            'base': base.get('git'), 'candidate': candidate.get('git'), 'threshold': args.threshold,
+            'rows': [dict(zip(('benchmark', 'metric', 'base', 'candidate', 'change_pct', 'regression'), row))
+                     for row in rows],
+        }, indent=2))
+    else:
+        print(f"{'benchmark':24} {'métrica':12} {'base':>12} {'nuevo':>12} {'cambio':>9}")
+        for name, metric, before, after, change, regression in rows:
+            flag = '  REGRESIÓN' if regression else ''
+            print(f"{name:24} {metric:12} {before:>12.3f} {after:>12.3f} {change:>+8.1f}%{flag}")
+        print(f"\n{len(regressions)} regresiones por encima del {args.threshold}%")
+    return 1 if regressions else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
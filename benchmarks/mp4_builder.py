@@ -0,0 +1,50 @@
+# MP4 mínimos con cajas ISO-BMFF válidas para el lector nativo: los usan el generador de bibliotecas y las pruebas
+import random
+import struct
+
+def box(box_type, *parts):
+    data = b''.join(parts)
+    return struct.pack('>I4s', 8 + len(data), box_type) + data
+
+def full_box(box_type, version, *parts):
+    return box(box_type, struct.pack('>I', version << 24), *parts)
+
+def trak(handler, sample_entry, duration_ms):
+    stsd = full_box(b'stsd', 0, struct.pack('>I', 1), sample_entry)
+    mdhd = full_box(b'mdhd', 0, struct.pack('>IIII', 0, 0, 1000, duration_ms), b'\0' * 4)
+    hdlr = full_box(b'hdlr', 0, b'\0' * 4, handler, b'\0' * 12, b'bench\0')
+    return box(b'trak', box(b'mdia', mdhd, hdlr, box(b'minf', box(b'stbl', stsd))))
+
+def video_entry(fourcc, width, height):
+    # VisualSampleEntry de 78 bytes + configuración del decodificador
+    base = (b'\0' * 6 + struct.pack('>H', 1) + b'\0' * 16 + struct.pack('>HH', width, height)
+            + struct.pack('>II', 0x480000, 0x480000) + b'\0' * 4 + struct.pack('>H', 1) + b'\0' * 32
+            + struct.pack('>Hh', 0x18, -1))
+    if fourcc == b'avc1':
+        return box(fourcc, base, box(b'avcC', bytes([1, 100, 0, 31, 0xff, 0xe0])))
+    return box(fourcc, base, box(b'hvcC', b'\1' + b'\0' * 22))
+
+def audio_entry():
+    base = b'\0' * 6 + struct.pack('>H', 1) + b'\0' * 8 + struct.pack('>HHHHI', 2, 16, 0, 0, 48000 << 16)
+    decoder_config = bytes([4, 13, 0x40, 0x15]) + b'\0' * 11  # objectTypeIndication 0x40 = AAC
+    es_descriptor = bytes([3, len(decoder_config) + 3, 0, 1, 0]) + decoder_config
+    return box(b'mp4a', base, full_box(b'esds', 0, es_descriptor))
+
+FTYP = box(b'ftyp', b'isom', b'\0\0\2\0', b'isomiso2avc1mp41')
+
+def moov(duration_ms=90000, width=1280, height=720, fourcc=b'avc1', audio=True, version=0):
+    if version == 1:
+        mvhd = full_box(b'mvhd', 1, struct.pack('>QQIQ', 0, 0, 1000, duration_ms), b'\0' * 80)
+    else:
+        mvhd = full_box(b'mvhd', 0, struct.pack('>IIII', 0, 0, 1000, duration_ms), b'\0' * 80)
+    traks = [trak(b'vide', video_entry(fourcc, width, height), duration_ms)]
+    if audio:
+        traks.append(trak(b'soun', audio_entry(), duration_ms))
+    return box(b'moov', mvhd, *traks)
+
+def write_mp4(path, width, height, duration_s, payload_bytes, fourcc=b'avc1', faststart=True, audio=True, seed=0):
+    header = moov(duration_s * 1000, width, height, fourcc, audio)
+    # Contenido pseudoaleatorio: cada archivo tiene una huella distinta (no comprimible, como un video real)
+    mdat = box(b'mdat', random.Random(seed).randbytes(payload_bytes))
+    with open(path, 'wb') as f:
+        f.write(FTYP + (header + mdat if faststart else mdat + header))
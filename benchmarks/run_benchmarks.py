@@ -0,0 +1,266 @@
+# Benchmarks reproducibles de los caminos calientes: índice de cursos, búsqueda, escaneo de videos,
+# render del índice y servido de archivos. Genera una biblioteca sintética, arranca la app contra SQLite
+# y escribe los resultados en JSON (percentiles, throughput y memoria) para comparar con compare_results.py.
+#
+#   python benchmarks/run_benchmarks.py --courses 20 --sections 15 --output resultados.json
+import argparse
+import gc
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from synthetic_library import generate_library
+
+RESULTS_SCHEMA = 1
+BENCHMARKS = (
+    'scan_cursos.build', 'scan_cursos.refresh', 'scan_cursos.cached', 'search.sync', 'scan_cursos_filtered',
+    'scan_videos.cold', 'scan_videos.warm', 'index', 'index.curso', 'index.search',
+    'serve_file.pdf', 'serve_file.video', 'serve_file.range',
+)
+
+def configure_environment(workdir, cursos_dir):
+    # Debe ejecutarse antes de importar app: Config lee el entorno al cargarse
+    data_dir = os.path.join(workdir, 'data')
+    os.makedirs(data_dir, exist_ok=True)
+    os.environ.update({
+        'CURSOS_DIR': cursos_dir,
+        'DATABASE_URL': f"sqlite:///{os.path.join(workdir, 'bench.db')}",  # En lugar de Postgres
+        'SEARCH_INDEX_PATH': os.path.join(data_dir, 'search.db'),
+        'THUMBNAIL_DIR': os.path.join(data_dir, 'thumbs'),
+        'PROFILING_DIR': os.path.join(data_dir, 'profiles'),
+        'LOG_DIR': os.path.join(workdir, 'logs'),
+        'LOG_LEVEL': os.getenv('BENCH_LOG_LEVEL', 'WARNING'),
+        'THUMBNAILS_ENABLED': 'false',
+        'HLS_ENABLED': 'false',
+        'FILE_OFFLOAD': '',
+        # La biblioteca se acaba de generar: sin esto el escaneo deja todos los videos a la ingesta por eventos
+        'INGEST_STABLE_SECONDS': '0',
+    })
+
+def percentile(sorted_values, fraction):
+    # Interpolación lineal entre los dos valores más cercanos
+    if not sorted_values:
+        return None
+    position = (len(sorted_values) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+def summarize(durations, total_bytes, peak_bytes):
+    values = sorted(durations)
+    total = sum(values)
+    mean = total / len(values)
+    variance = sum((value - mean) ** 2 for value in values) / len(values)
+    result = {
+        'iterations': len(values),
+        'min_ms': round(values[0] * 1000, 3),
+        'mean_ms': round(mean * 1000, 3),
+        'p50_ms': round(percentile(values, 0.50) * 1000, 3),
+        'p90_ms': round(percentile(values, 0.90) * 1000, 3),
+        'p95_ms': round(percentile(values, 0.95) * 1000, 3),
+        'p99_ms': round(percentile(values, 0.99) * 1000, 3),
+        'max_ms': round(values[-1] * 1000, 3),
+        'stdev_ms': round(variance ** 0.5 * 1000, 3),
+        'ops_per_sec': round(len(values) / total, 2) if total else None,
+        'peak_kb': round(peak_bytes / 1024, 1),
+    }
+    if total_bytes:
+        result['mb_per_sec'] = round(total_bytes / total / (1024 * 1024), 2)
+    return result
+
+def measure(operation, iterations, setup=None, warmup=1):
+    # Si operation() devuelve un entero se toma como bytes transferidos; otros valores se ignoran. setup() se ejecuta antes de cada iteración
+    # fuera del tiempo medido. La memoria pico se mide en una pasada aparte: tracemalloc ralentiza
+    # cada asignación y falsearía las latencias
+    for _ in range(warmup):
+        if setup:
+            setup()
+        operation()
+    durations = []
+    total_bytes = 0
+    for _ in range(iterations):
+        if setup:
+            setup()
+        gc.collect()
+        start = time.perf_counter()
+        transferred = operation()
+        durations.append(time.perf_counter() - start)
+        if isinstance(transferred, int):
+            total_bytes += transferred
+    if setup:
+        setup()
+    gc.collect()
+    tracemalloc.start()
+    try:
+        operation()
+        _, peak_bytes = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return summarize(durations, total_bytes, peak_bytes)
+
+def _git_revision():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=REPO_ROOT, capture_output=True, text=True).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=REPO_ROOT,
+                                    capture_output=True, text=True).stdout.strip())
+        return {'commit': commit or None, 'dirty': dirty}
+    except OSError:
+        return {'commit': None, 'dirty': None}
+
+def run_benchmarks(app, library, args, selected):
+    from app.__init__ import db
+    from app.models.job_model import ConversionJob
+    from app.models.video_model import VideoMetadata
+    from app.services import course_index, search_service, video_service
+    from app.services.file_service import scan_cursos, scan_cursos_filtered
+
+    terms = library['terms']
+    videos = library['videos']
+    pdfs = library['pdfs']
+    counters = {'term': 0, 'video': 0, 'pdf': 0, 'curso': 0}
+
+    def next_item(kind, items):
+        counters[kind] += 1
+        return items[counters[kind] % len(items)]
+
+    def reset_search_index():
+        search_service._initialized = False
+        for suffix in ('', '-wal', '-shm'):
+            path = os.environ['SEARCH_INDEX_PATH'] + suffix
+            if os.path.exists(path):
+                os.remove(path)
+
+    def reset_video_cache():
+        ConversionJob.query.delete()
+        VideoMetadata.query.delete()
+        db.session.commit()
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session.update({'logged_in': True, 'is_admin': False, 'username': 'bench'})
+
+    def get(url, headers=None, data=None):
+        response = client.post(url, data=data) if data else client.get(url, headers=headers)
+        body = response.get_data()
+        response.close()
+        if response.status_code not in (200, 206):
+            raise RuntimeError(f"{url}: HTTP {response.status_code}")
+        return len(body)
+
+    def file_url(rel_path):
+        # Se usa la ruta con sección: la biblioteca sintética siempre tiene curso/sección/archivo
+        from urllib.parse import quote
+        return '/cursos/' + quote(rel_path)
+
+    cursos = sorted(scan_cursos())
+    repeat = args.repeat
+    requests = args.requests
+    cases = {
+        'scan_cursos.build': lambda: measure(course_index.build_course_index, repeat),
+        'scan_cursos.refresh': lambda: measure(course_index.refresh_course_index, requests),
+        'scan_cursos.cached': lambda: measure(scan_cursos, requests * 10),
+        'search.sync': lambda: measure(search_service.sync_search_index, repeat, setup=reset_search_index),
+        'scan_cursos_filtered': lambda: measure(lambda: scan_cursos_filtered(next_item('term', terms)), requests),
+        'scan_videos.cold': lambda: measure(lambda: video_service.scan_videos_once(app), repeat, setup=reset_video_cache),
+        'scan_videos.warm': lambda: measure(lambda: video_service.scan_videos_once(app), repeat),
+        'index': lambda: measure(lambda: get('/'), requests),
+        'index.curso': lambda: measure(lambda: get('/?curso=' + next_item('curso', cursos)), requests),
+        'index.search': lambda: measure(
+            lambda: get('/', data={'search': next_item('term', terms)}), requests),
+        'serve_file.pdf': lambda: measure(lambda: get(file_url(next_item('pdf', pdfs))), requests),
+        'serve_file.video': lambda: measure(lambda: get(file_url(next_item('video', videos))), requests),
+        'serve_file.range': lambda: measure(
+            lambda: get(file_url(next_item('video', videos)), headers={'Range': 'bytes=65536-131071'}), requests),
+    }
+    results = {}
+    for name in BENCHMARKS:
+        if name not in selected:
+            continue
+        results[name] = cases[name]()
+        print(f"{name:24} p50 {results[name]['p50_ms']:>10.3f} ms  p95 {results[name]['p95_ms']:>10.3f} ms  "
+              f"{results[name]['ops_per_sec'] or 0:>10.2f} op/s  pico {results[name]['peak_kb']:>10.1f} KiB",
+              file=sys.stderr)
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmarks de escaneo, búsqueda, render y servido de archivos')
+    parser.add_argument('--courses', type=int, default=10)
+    parser.add_argument('--sections', type=int, default=10)
+    parser.add_argument('--videos', type=int, default=8, help='Videos por sección')
+    parser.add_argument('--pdfs', type=int, default=4, help='PDF por sección')
+    parser.add_argument('--depth', type=int, default=1, choices=(1, 2))
+    parser.add_argument('--video-kb', type=int, default=256)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--repeat', type=int, default=5, help='Iteraciones de los escaneos completos')
+    parser.add_argument('--requests', type=int, default=200, help='Iteraciones de las peticiones y búsquedas')
+    parser.add_argument('--only', default='', help=f"Lista separada por comas de: {', '.join(BENCHMARKS)}")
+    parser.add_argument('--label', default='', help='Etiqueta libre guardada en los resultados')
+    parser.add_argument('--workdir', help='Directorio de trabajo (por defecto uno temporal que se borra al terminar)')
+    parser.add_argument('--output', default='-', help="Archivo JSON de resultados ('-' = salida estándar)")
+    args = parser.parse_args(argv)
+
+    selected = [name.strip() for name in args.only.split(',') if name.strip()] or list(BENCHMARKS)
+    unknown = set(selected) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"Benchmarks desconocidos: {', '.join(sorted(unknown))}")
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix='oposiciones-bench-')
+    cursos_dir = os.path.join(workdir, 'cursos')
+    if os.path.exists(cursos_dir):
+        parser.error(f"{cursos_dir} ya existe; usa un --workdir vacío")
+    try:
+        started = time.perf_counter()
+        library = generate_library(cursos_dir, args.courses, args.sections, args.videos, args.pdfs,
+                                   args.depth, args.video_kb, args.seed)
+        library['generate_seconds'] = round(time.perf_counter() - started, 3)
+        print(f"Biblioteca: {library['files']} archivos, {library['bytes'] / (1024 * 1024):.1f} MiB "
+              f"en {library['generate_seconds']}s ({cursos_dir})", file=sys.stderr)
+
+        configure_environment(workdir, cursos_dir)
+        from app.__init__ import create_app
+        from app.services.startup_service import migrate_db
+        app = create_app()
+        with app.app_context():
+            migrate_db(app)
+            results = run_benchmarks(app, library, args, selected)
+
+        report = {
+            'schema': RESULTS_SCHEMA,
+            'label': args.label,
+            'created_at': datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%SZ'),
+            'git': _git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'library': {key: library[key] for key in ('shape', 'files', 'bytes', 'generate_seconds')},
+            'settings': {'repeat': args.repeat, 'requests': args.requests},
+            'results': results,
+            # ru_maxrss está en KiB en Linux (en bytes en macOS)
+            'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        }
+        output = json.dumps(report, indent=2, ensure_ascii=False)
+        if args.output == '-':
+            print(output)
+        else:
+            with open(args.output, 'w') as f:
+                f.write(output + '\n')
+            print(f"Resultados guardados en {args.output}", file=sys.stderr)
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
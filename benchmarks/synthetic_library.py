@@ -0,0 +1,113 @@
+# Generador de bibliotecas de cursos sintéticas para los benchmarks: árbol cursos × secciones × archivos
+# con MP4 mínimos (cajas ISO-BMFF válidas para el lector nativo) y PDF de una página.
+# Misma semilla y misma forma -> mismo árbol, byte a byte.
+import argparse
+import json
+import os
+import random
+import sys
+
+from mp4_builder import write_mp4
+
+WORDS = [
+    'constitución', 'derecho', 'administrativo', 'procedimiento', 'régimen', 'jurídico', 'contratos',
+    'sector', 'público', 'hacienda', 'presupuestos', 'función', 'empleo', 'igualdad', 'transparencia',
+    'protección', 'datos', 'unión', 'europea', 'tribunal', 'cortes', 'gobierno', 'autonomías',
+    'municipio', 'provincia', 'recursos', 'sanciones', 'responsabilidad', 'patrimonio', 'subvenciones',
+    'ofimática', 'informática', 'redes', 'seguridad', 'prevención', 'riesgos', 'laborales', 'archivo',
+]
+
+# (peso, variante): la mezcla imita una biblioteca real, con algunos videos que el escáner encolará
+VIDEO_VARIANTS = [
+    (70, {'fourcc': b'avc1', 'faststart': True, 'audio': True}),
+    (15, {'fourcc': b'avc1', 'faststart': False, 'audio': True}),
+    (10, {'fourcc': b'hev1', 'faststart': True, 'audio': True}),
+    (5, {'fourcc': b'avc1', 'faststart': True, 'audio': False}),
+]
+RESOLUTIONS = [(1280, 720), (1920, 1080), (854, 480)]
+
+def write_pdf(path, title):
+    # PDF de una página con el título; los desplazamientos de xref se calculan al escribir
+    text = title.encode('latin-1', 'replace').replace(b'(', b'[').replace(b')', b']')
+    content = b'BT /F1 18 Tf 72 720 Td (' + text + b') Tj ET'
+    objects = [
+        b'<< /Type /Catalog /Pages 2 0 R >>',
+        b'<< /Type /Pages /Kids [3 0 R] /Count 1 >>',
+        b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents 4 0 R '
+        b'/Resources << /Font << /F1 5 0 R >> >> >>',
+        b'<< /Length ' + str(len(content)).encode() + b' >>\nstream\n' + content + b'\nendstream',
+        b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>',
+    ]
+    output = bytearray(b'%PDF-1.4\n')
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(output))
+        output += str(number).encode() + b' 0 obj\n' + body + b'\nendobj\n'
+    xref_offset = len(output)
+    output += b'xref\n0 ' + str(len(objects) + 1).encode() + b'\n0000000000 65535 f \n'
+    output += b''.join(b'%010d 00000 n \n' % offset for offset in offsets)
+    output += b'trailer\n<< /Size ' + str(len(objects) + 1).encode() + b' /Root 1 0 R >>\n'
+    output += b'startxref\n' + str(xref_offset).encode() + b'\n%%EOF\n'
+    with open(path, 'wb') as f:
+        f.write(bytes(output))
+
+def _title(rng, words=3):
+    return ' '.join(rng.sample(WORDS, words)).capitalize()
+
+def generate_library(root, courses=10, sections=10, videos=8, pdfs=4, depth=1, video_kb=256, seed=42):
+    # depth=2 anida cada sección en "Bloque N/Tema M", como las bibliotecas con subcarpetas.
+    # Devuelve un resumen con la forma y listas de muestra para los benchmarks (búsquedas y archivos)
+    rng = random.Random(seed)
+    variants = [variant for weight, variant in VIDEO_VARIANTS for _ in range(weight)]
+    summary = {'root': root, 'shape': {'courses': courses, 'sections': sections, 'videos': videos, 'pdfs': pdfs,
+                                      'depth': depth, 'video_kb': video_kb, 'seed': seed},
+               'files': 0, 'bytes': 0, 'videos': [], 'pdfs': [], 'terms': []}
+    for course_number in range(1, courses + 1):
+        course = f"Curso {course_number:03d} - {_title(rng, 2)}"
+        for section_number in range(1, sections + 1):
+            section = f"Tema {section_number:02d} - {_title(rng)}"
+            if depth > 1:
+                section = os.path.join(f"Bloque {(section_number - 1) // 5 + 1}", section)
+            directory = os.path.join(root, course, section)
+            os.makedirs(directory, exist_ok=True)
+            for video_number in range(1, videos + 1):
+                name = f"{video_number:02d} {_title(rng)}.mp4"
+                variant = rng.choice(variants)
+                width, height = rng.choice(RESOLUTIONS)
+                path = os.path.join(directory, name)
+                write_mp4(path, width, height, rng.randint(300, 3600), video_kb * 1024,
+                          seed=rng.getrandbits(32), **variant)
+                summary['videos'].append(os.path.relpath(path, root))
+                summary['bytes'] += os.path.getsize(path)
+            for pdf_number in range(1, pdfs + 1):
+                title = _title(rng)
+                path = os.path.join(directory, f"Apuntes {pdf_number} - {title}.pdf")
+                write_pdf(path, title)
+                summary['pdfs'].append(os.path.relpath(path, root))
+                summary['bytes'] += os.path.getsize(path)
+            summary['files'] += videos + pdfs
+    # Términos de búsqueda reproducibles: palabras sueltas, pares y un prefijo
+    summary['terms'] = [rng.choice(WORDS) for _ in range(5)] + [' '.join(rng.sample(WORDS, 2)) for _ in range(3)] \
+        + [rng.choice(WORDS)[:4]]
+    return summary
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Genera una biblioteca de cursos sintética')
+    parser.add_argument('root', help='Directorio destino (equivale a /cursos)')
+    parser.add_argument('--courses', type=int, default=10)
+    parser.add_argument('--sections', type=int, default=10)
+    parser.add_argument('--videos', type=int, default=8, help='Videos por sección')
+    parser.add_argument('--pdfs', type=int, default=4, help='PDF por sección')
+    parser.add_argument('--depth', type=int, default=1, choices=(1, 2))
+    parser.add_argument('--video-kb', type=int, default=256, help='Tamaño de los datos de cada video')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args(argv)
+    if os.path.exists(args.root) and os.listdir(args.root):
+        parser.error(f"{args.root} no está vacío")
+    summary = generate_library(args.root, args.courses, args.sections, args.videos, args.pdfs,
+                               args.depth, args.video_kb, args.seed)
+    print(json.dumps({key: summary[key] for key in ('root', 'shape', 'files', 'bytes')}, indent=2))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,27 @@
+# Configuración de gunicorn para producción
+import multiprocessing
+import os
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:5000')
+workers = int(os.getenv('WEB_CONCURRENCY', min(multiprocessing.cpu_count() * 2 + 1, 8)))
+# Hilos por proceso: una descarga de video ocupa un hilo mientras dura (con sendfile, sin copiar datos)
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', 8))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 120))
+graceful_timeout = 30
+keepalive = 5
+sendfile = True
+preload_app = False
+accesslog = '-'
+errorlog = '-'
+loglevel = os.getenv('GUNICORN_LOG_LEVEL', 'info')
+
+def on_starting(server):
+    # El worker aplica las migraciones; los procesos web no sirven nada hasta que el esquema está al día
+    from app.services.startup_service import wait_for_schema
+    wait_for_schema(server.log)
+
+def post_worker_init(worker):
+    # Los hilos no sobreviven al fork: cada worker arranca su propio índice de cursos
+    from app.services.startup_service import start_web_services
+    start_web_services(worker.wsgi)
@@ -0,0 +1,61 @@
+# Planificador de conversiones: la operación más barata que deja el video reproducible en el navegador
+import unittest
+
+from app.services.conversion_planner import build_ffmpeg_command, get_output_path, get_profile, plan_conversion
+
+def _info(video_codec='h264', audio_codec='aac', pix_fmt='yuv420p', profile='High', faststart=True):
+    streams = [{'codec_type': 'video', 'codec_name': video_codec, 'pix_fmt': pix_fmt, 'profile': profile}]
+    if audio_codec:
+        streams.append({'codec_type': 'audio', 'codec_name': audio_codec})
+    return {'video_codec': video_codec, 'streams': streams, 'faststart': faststart}
+
+class ConversionPlannerTest(unittest.TestCase):
+    def test_compatible_mp4_needs_nothing(self):
+        plan = plan_conversion('/cursos/a.mp4', _info())
+        self.assertEqual(plan['operation'], 'none')
+        self.assertEqual(plan['output_path'], '/cursos/a.mp4')
+
+    def test_moov_at_end_only_moves_it(self):
+        self.assertEqual(plan_conversion('/cursos/a.mp4', _info(faststart=False))['operation'], 'faststart')
+
+    def test_other_container_is_remuxed(self):
+        plan = plan_conversion('/cursos/a.mkv', _info())
+        self.assertEqual(plan['operation'], 'remux')
+        self.assertEqual(plan['output_path'], '/cursos/a.mp4')
+
+    def test_incompatible_audio_is_transcoded(self):
+        plan = plan_conversion('/cursos/a.mkv', _info(audio_codec='opus'))
+        self.assertEqual(plan['operation'], 'audio')
+        self.assertTrue(plan['transcode_audio'])
+
+    def test_incompatible_video_is_reencoded(self):
+        for info in (_info(video_codec='hevc'), _info(pix_fmt='yuv420p10le'), _info(profile='High 10')):
+            self.assertEqual(plan_conversion('/cursos/a.mp4', info)['operation'], 'reencode')
+
+    def test_reencode_wins_over_audio(self):
+        plan = plan_conversion('/cursos/a.mp4', _info(video_codec='hevc', audio_codec='opus'))
+        self.assertEqual(plan['operation'], 'reencode')
+        self.assertEqual(len(plan['reasons']), 2)
+
+    def test_video_without_audio(self):
+        self.assertEqual(plan_conversion('/cursos/a.mp4', _info(audio_codec=None))['operation'], 'none')
+
+    def test_output_path_keeps_folder(self):
+        self.assertEqual(get_output_path('/cursos/Tema 1/clase.MOV'), '/cursos/Tema 1/clase.mp4')
+
+    def test_unknown_profile_falls_back(self):
+        self.assertIn(get_profile('no-existe')['name'], ('standard', get_profile()['name']))
+        self.assertEqual(get_profile('slides')['name'], 'slides')
+
+    def test_command_per_operation(self):
+        copy = build_ffmpeg_command('/cursos/a.mkv', plan_conversion('/cursos/a.mkv', _info()), '/tmp/out.mp4', 2)
+        self.assertIn('copy', copy)
+        self.assertNotIn('libx264', copy)
+        self.assertEqual(copy[-1], '/tmp/out.mp4')
+        reencode = build_ffmpeg_command('/cursos/a.mp4', plan_conversion('/cursos/a.mp4', _info(video_codec='hevc')),
+                                        '/tmp/out.mp4', 2, get_profile('slides'))
+        self.assertIn('libx264', reencode)
+        self.assertEqual(reencode[reencode.index('-crf') + 1], '28')
+
+if __name__ == '__main__':
+    unittest.main()
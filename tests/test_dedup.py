@@ -0,0 +1,185 @@
+# Deduplicación y retención de _archive sobre una biblioteca temporal: solo se enlaza o borra lo que se ha verificado
+import atexit
+import errno
+import hashlib
+import os
+import tempfile
+import time
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+
+from app.__init__ import create_app, db
+from app.config import Config
+from app.models import job_model, setting_model, video_model  # noqa: F401 (registran las tablas)
+from app.models.video_model import ConvertedVideo
+from app.services import dedup_service, scheduler_service
+
+DATA = bytes(range(256)) * 64  # 16 KB
+
+class DedupTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        for attr in ('SQLALCHEMY_DATABASE_URI', 'LOG_DIR', 'CURSOS_DIR', 'ARCHIVE_DIR', 'TEMP_DIR',
+                     'DEDUP_MIN_SIZE_MB', 'ARCHIVE_RETENTION_DAYS'):
+            self.addCleanup(setattr, Config, attr, getattr(Config, attr))
+        Config.SQLALCHEMY_DATABASE_URI = f"sqlite:///{os.path.join(self.tmp.name, 'app.db')}"
+        Config.LOG_DIR = self.tmp.name
+        Config.CURSOS_DIR = os.path.join(self.tmp.name, 'cursos')
+        Config.ARCHIVE_DIR = os.path.join(Config.CURSOS_DIR, '_archive')
+        Config.TEMP_DIR = os.path.join(Config.CURSOS_DIR, '_temp')
+        Config.DEDUP_MIN_SIZE_MB = 0
+        Config.ARCHIVE_RETENTION_DAYS = 30
+        self.app = create_app()
+        # El escritor de logs se detiene antes de borrar LOG_DIR (y ya no hace falta al salir)
+        listener = self.app.extensions['log_listener']
+        self.addCleanup(atexit.unregister, listener.stop)
+        self.addCleanup(listener.stop)
+        context = self.app.app_context()
+        context.push()
+        self.addCleanup(context.pop)
+        db.create_all()
+        self.addCleanup(db.session.remove)
+
+    def _write(self, relative, data=DATA):
+        # mtime antiguo: los archivos recién modificados se consideran en copia y no se tocan
+        path = os.path.join(Config.CURSOS_DIR, relative)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(data)
+        old = time.time() - 3600
+        os.utime(path, (old, old))
+        return path
+
+    def _group(self, *paths):
+        return {'hash': hashlib.sha256(DATA).hexdigest(), 'size': len(DATA), 'files': [(path, os.stat(path)) for path in paths]}
+
+    def _same_inode(self, a, b):
+        return os.stat(a).st_ino == os.stat(b).st_ino
+
+    def test_hardlinks_the_copies_found_by_find_duplicates(self):
+        a = self._write('curso1/tema1/video.mp4')
+        b = self._write('curso2/tema1/video.mp4')
+        self._write('curso2/tema2/otro.mp4', DATA[::-1])
+        scanned, groups = dedup_service.find_duplicates()
+        self.assertEqual(scanned, 3)
+        self.assertEqual([sorted(path for path, _ in group['files']) for group in groups], [[a, b]])
+        result = dedup_service.compact(groups, 'hardlink')
+        self.assertEqual((result['linked_files'], result['linked_bytes'], result['skipped']), (1, len(DATA), 0))
+        self.assertTrue(self._same_inode(a, b))
+        self.assertEqual([name for name in os.listdir(os.path.dirname(b)) if '.dedup-' in name], [])
+
+    def test_content_mismatch_is_skipped(self):
+        a = self._write('curso1/tema1/video.mp4')
+        b = self._write('curso2/tema1/video.mp4', DATA[:-1] + b'\0')
+        result = dedup_service.compact([self._group(a, b)], 'hardlink')
+        self.assertEqual((result['linked_files'], result['skipped']), (0, 1))
+        self.assertFalse(self._same_inode(a, b))
+
+    def test_files_changed_since_the_scan_are_skipped(self):
+        a = self._write('curso1/tema1/video.mp4')
+        b = self._write('curso2/tema1/video.mp4')
+        group = self._group(a, b)
+        os.utime(b, (time.time() - 60, time.time() - 60))
+        result = dedup_service.compact([group], 'hardlink')
+        self.assertEqual((result['linked_files'], result['skipped']), (0, 1))
+        self.assertFalse(self._same_inode(a, b))
+
+    def test_files_being_copied_are_skipped(self):
+        a = self._write('curso1/tema1/video.mp4')
+        b = self._write('curso2/tema1/video.mp4')
+        os.utime(b)
+        result = dedup_service.compact([self._group(a, b)], 'hardlink')
+        self.assertEqual((result['linked_files'], result['skipped']), (0, 1))
+
+    def test_busy_files_are_skipped(self):
+        a = self._write('curso1/tema1/video.mp4')
+        b = self._write('curso2/tema1/video.mp4')
+        scheduler_service.submit(b, priority=scheduler_service.PRIORITY_ADMIN)
+        result = dedup_service.compact([self._group(a, b)], 'hardlink')
+        self.assertEqual((result['linked_files'], result['skipped']), (0, 1))
+        self.assertFalse(self._same_inode(a, b))
+
+    def test_cross_device_link_is_skipped(self):
+        a = self._write('curso1/tema1/video.mp4')
+        b = self._write('curso2/tema1/video.mp4')
+        c = self._write('curso3/tema1/video.mp4')
+        with mock.patch.object(dedup_service.os, 'link', side_effect=OSError(errno.EXDEV, 'Invalid cross-device link')):
+            result = dedup_service.compact([self._group(a, b, c)], 'hardlink')
+        self.assertEqual(result, {'linked_files': 0, 'linked_bytes': 0, 'skipped': 2, 'unsupported': False})
+        self.assertFalse(self._same_inode(a, b))
+
+    def test_reflink_not_supported_stops_and_leaves_files_alone(self):
+        a = self._write('curso1/tema1/video.mp4')
+        b = self._write('curso2/tema1/video.mp4')
+        c = self._write('curso3/tema1/video.mp4')
+        with mock.patch.object(dedup_service, 'clone_file', side_effect=OSError(errno.EOPNOTSUPP, 'Operation not supported')) as clone:
+            result = dedup_service.compact([self._group(a, b, c)], 'reflink')
+        self.assertTrue(result['unsupported'])
+        self.assertEqual((result['linked_files'], result['skipped']), (0, 0))
+        self.assertEqual(clone.call_count, 1)  # No se reintenta con el resto de copias
+        with open(b, 'rb') as f:
+            self.assertEqual(f.read(), DATA)
+        self.assertEqual([name for name in os.listdir(os.path.dirname(b)) if '.dedup-' in name], [])
+
+    def test_nothing_is_freed_while_the_replaced_inode_has_other_links(self):
+        a = self._write('curso1/tema1/video.mp4')
+        b = self._write('curso2/tema1/video.mp4')
+        # b, con más enlaces, queda como canónico; a sigue enlazado fuera de la biblioteca tras sustituirlo
+        os.link(a, os.path.join(self.tmp.name, 'fuera-a.mp4'))
+        for name in ('fuera-b1.mp4', 'fuera-b2.mp4'):
+            os.link(b, os.path.join(self.tmp.name, name))
+        result = dedup_service.compact([self._group(a, b)], 'hardlink')
+        self.assertEqual((result['linked_files'], result['linked_bytes']), (1, 0))
+        self.assertTrue(self._same_inode(a, b))
+
+    def _archived(self, converted_data=DATA, size=None, days_ago=60):
+        original = self._write('_archive/curso1/tema1/video.avi', b'original' * 100)
+        converted = self._write('curso1/tema1/video.mp4', converted_data)
+        row = ConvertedVideo(original_hash='0' * 64, original_path=original, converted_path=converted,
+                             converted_hash=hashlib.sha256(DATA).hexdigest(),
+                             size=len(DATA) if size is None else size, created_at=datetime.utcnow() - timedelta(days=days_ago))
+        db.session.add(row)
+        db.session.commit()
+        return row, original
+
+    def test_purge_deletes_verified_originals_after_the_retention(self):
+        row, original = self._archived()
+        result = dedup_service.purge_archive()
+        self.assertEqual(result, {'purged': 1, 'purged_bytes': 800, 'skipped': 0})
+        self.assertFalse(os.path.exists(original))
+        self.assertIsNotNone(db.session.get(ConvertedVideo, row.id).original_purged_at)
+
+    def test_purge_keeps_recent_originals(self):
+        _, original = self._archived(days_ago=1)
+        self.assertEqual(dedup_service.purge_archive()['purged'], 0)
+        self.assertTrue(os.path.exists(original))
+
+    def test_purge_refuses_when_the_converted_size_changed(self):
+        row, original = self._archived(size=len(DATA) + 1)
+        self.assertEqual(dedup_service.purge_archive(), {'purged': 0, 'purged_bytes': 0, 'skipped': 1})
+        self.assertTrue(os.path.exists(original))
+        self.assertIsNone(db.session.get(ConvertedVideo, row.id).original_purged_at)
+
+    def test_purge_refuses_when_the_converted_hash_changed(self):
+        _, original = self._archived(converted_data=DATA[::-1])
+        self.assertEqual(dedup_service.purge_archive(), {'purged': 0, 'purged_bytes': 0, 'skipped': 1})
+        self.assertTrue(os.path.exists(original))
+
+    def test_purge_frees_nothing_while_the_original_has_other_links(self):
+        _, original = self._archived()
+        os.link(original, os.path.join(self.tmp.name, 'copia.avi'))
+        self.assertEqual(dedup_service.purge_archive(), {'purged': 1, 'purged_bytes': 0, 'skipped': 0})
+        self.assertFalse(os.path.exists(original))
+
+    def test_purge_only_maintenance_waits_for_the_interval(self):
+        self._archived()
+        self.assertTrue(dedup_service.maintenance_due())
+        dedup_service.run_dedup(Config.CURSOS_DIR, {'mode': 'purge'})
+        self.assertFalse(os.path.exists(os.path.join(Config.ARCHIVE_DIR, 'curso1/tema1/video.avi')))
+        self.assertIsNone(dedup_service.get_report())
+        self.assertFalse(dedup_service.maintenance_due())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+# Lector de logs: páginas sin índice y con índice, cursores entre copias rotadas, filtros y formato JSON
+import json
+import logging
+import os
+import tempfile
+import unittest
+from logging.handlers import WatchedFileHandler
+
+from app.config import Config
+from app.logging_config import JsonFormatter, rotate_log
+from app.services import log_service
+from app.services.log_service import query_logs
+
+PER_FILE = 300
+FILES = ('app.log.2', 'app.log.1', 'app.log')  # Del más antiguo al más reciente
+
+class LogServiceTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        for attr in ('LOG_DIR', 'LOG_BACKUP_COUNT'):
+            self.addCleanup(setattr, Config, attr, getattr(Config, attr))
+        Config.LOG_DIR = self.tmp.name
+        Config.LOG_BACKUP_COUNT = 5
+        log_service._index.clear()
+        self.addCleanup(log_service._index.clear)
+        # Registros en orden cronológico; uno de cada 50 lleva traza de varias líneas
+        self.messages = []
+        number = 0
+        for day, name in enumerate(FILES, start=1):
+            with open(os.path.join(self.tmp.name, name), 'w') as f:
+                for i in range(PER_FILE):
+                    level = ('INFO', 'WARNING', 'ERROR')[number % 3]
+                    message = f"mensaje {number}"
+                    if number % 50 == 0:
+                        message += "\nTraceback (most recent call last):\n  ValueError: fallo"
+                    f.write(f"2026-01-0{day} {i // 60:02d}:{i % 60:02d}:00,000 - app - {level} - {message}\n")
+                    self.messages.append((f"2026-01-0{day} {i // 60:02d}:{i % 60:02d}:00,000", level, message))
+                    number += 1
+        self.newest = self.messages[::-1]
+
+    def _append(self, text):
+        with open(os.path.join(self.tmp.name, 'app.log'), 'a') as f:
+            f.write(text)
+
+    def test_latest_page_reads_without_index(self):
+        result = query_logs(page_size=20)
+        self.assertEqual([r['message'] for r in result['logs']], [m for _, _, m in self.newest[:20]])
+        self.assertEqual(log_service._index, {})
+        self.assertIsNone(result['pages'])
+        self.assertIsNotNone(result['next_cursor'])
+
+    def test_numbered_pages_index_only_what_they_need(self):
+        result = query_logs(page=3, page_size=20)
+        self.assertEqual([r['message'] for r in result['logs']], [m for _, _, m in self.newest[40:60]])
+        self.assertEqual(len(log_service._index), 1)
+        result = query_logs(page=40, page_size=20)
+        self.assertEqual([r['message'] for r in result['logs']], [m for _, _, m in self.newest[780:800]])
+        self.assertEqual(result['total'], PER_FILE * len(FILES))
+        self.assertEqual(result['pages'], 45)
+        self.assertEqual(query_logs(page=46, page_size=20)['logs'], [])
+
+    def test_cursor_walks_rotated_files(self):
+        seen = []
+        result = query_logs(page_size=70)
+        while True:
+            seen += [r['message'] for r in result['logs']]
+            if not result['next_cursor']:
+                break
+            result = query_logs(page_size=70, cursor=result['next_cursor'])
+        self.assertEqual(seen, [m for _, _, m in self.newest])
+
+    def test_expired_cursor(self):
+        self.assertTrue(query_logs(cursor='999999999:0')['expired'])
+
+    def test_filters(self):
+        result = query_logs(level='error', page_size=1000)
+        self.assertEqual([r['message'] for r in result['logs']], [m for _, l, m in self.newest if l == 'ERROR'])
+        result = query_logs(text='valueerror', page_size=1000)
+        self.assertEqual(len(result['logs']), len([1 for _, _, m in self.messages if 'ValueError' in m]))
+        result = query_logs(since='2026-01-02 01:00', until='2026-01-02 01:30', page_size=1000)
+        expected = [m for t, _, m in self.newest if '2026-01-02 01:00:00,000' <= t <= '2026-01-02 01:30:59,999']
+        self.assertEqual([r['message'] for r in result['logs']], expected)
+        self.assertIsNone(result['pages'])
+
+    def test_partial_last_line_is_skipped(self):
+        self._append("2026-01-04 00:00:00,000 - app - INFO - a medio")
+        self.assertEqual(query_logs(page_size=1)['logs'][0]['message'], self.newest[0][2])
+        self._append(" escribir\n")
+        self.assertEqual(query_logs(page_size=1)['logs'][0]['message'], 'a medio escribir')
+
+    def test_json_records(self):
+        record = {'ts': '2026-01-04 00:00:00,000', 'level': 'ERROR', 'name': 'app', 'message': 'en json', 'exc': 'traza'}
+        self._append(json.dumps(record) + '\n')
+        latest = query_logs(page_size=2)['logs']
+        self.assertEqual(latest[0], {'timestamp': record['ts'], 'name': 'app', 'level': 'ERROR', 'message': 'en json\ntraza'})
+        self.assertEqual(latest[1]['message'], self.newest[0][2])
+
+    def test_records_from_every_process_share_app_log(self):
+        # Web y worker escriben en el mismo app.log con su propio manejador; solo uno rota y el otro reabre
+        path = os.path.join(self.tmp.name, 'app.log')
+        web, worker = WatchedFileHandler(path), WatchedFileHandler(path)
+        for handler in (web, worker):
+            handler.setFormatter(JsonFormatter())
+            self.addCleanup(handler.close)
+
+        def emit(handler, message):
+            handler.emit(logging.makeLogRecord({'name': 'app', 'levelno': logging.INFO, 'levelname': 'INFO', 'msg': message}))
+
+        emit(web, 'petición web')
+        self.assertTrue(rotate_log(path, 0, Config.LOG_BACKUP_COUNT))
+        emit(worker, 'conversión del worker')
+        emit(web, 'otra petición web')
+        latest = query_logs(page_size=4)['logs']
+        self.assertEqual([r['message'] for r in latest],
+                         ['otra petición web', 'conversión del worker', 'petición web', self.newest[0][2]])
+
+if __name__ == '__main__':
+    unittest.main()
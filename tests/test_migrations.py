@@ -0,0 +1,100 @@
+# Migraciones: base de datos nueva y la de la primera versión (sin alembic_version)
+import atexit
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from alembic.autogenerate import compare_metadata
+from alembic.migration import MigrationContext
+from alembic.script import ScriptDirectory
+from alembic.config import Config as AlembicConfig
+from flask_migrate import stamp
+
+from app.__init__ import MIGRATIONS_DIR, create_app, db
+from app.config import Config
+from app.models import job_model, setting_model, thumbnail_model, user_model, video_model  # noqa: F401 (registran las tablas)
+from app.services.startup_service import BASELINE_REVISION, get_head_revision, migrate_db, wait_for_schema
+
+# Esquema que creaba db.create_all() en la primera versión
+BASELINE_SCHEMA = [
+    'CREATE TABLE converted_video (id INTEGER NOT NULL, original_hash VARCHAR(64) NOT NULL, '
+    'original_path VARCHAR(255) NOT NULL, converted_path VARCHAR(255) NOT NULL, PRIMARY KEY (id))',
+    'CREATE TABLE user (id INTEGER NOT NULL, username VARCHAR(80) NOT NULL, password VARCHAR(120) NOT NULL, '
+    'is_admin BOOLEAN, PRIMARY KEY (id), UNIQUE (username))',
+]
+
+class MigrationTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.db_path = os.path.join(self.tmp.name, 'app.db')
+        saved = (Config.SQLALCHEMY_DATABASE_URI, Config.LOG_DIR)
+        self.addCleanup(lambda: (setattr(Config, 'SQLALCHEMY_DATABASE_URI', saved[0]), setattr(Config, 'LOG_DIR', saved[1])))
+        Config.SQLALCHEMY_DATABASE_URI = f"sqlite:///{self.db_path}"
+        Config.LOG_DIR = self.tmp.name
+        self.app = create_app()
+        # El escritor de logs se detiene antes de borrar LOG_DIR (y ya no hace falta al salir)
+        listener = self.app.extensions['log_listener']
+        self.addCleanup(atexit.unregister, listener.stop)
+        self.addCleanup(listener.stop)
+
+    def _execute(self, statements):
+        connection = sqlite3.connect(self.db_path)
+        for statement in statements:
+            connection.execute(statement)
+        connection.commit()
+        connection.close()
+
+    def _migrate(self):
+        with self.app.app_context():
+            migrate_db(self.app)
+            alembic_config = AlembicConfig()
+            alembic_config.set_main_option('script_location', MIGRATIONS_DIR)
+            head = ScriptDirectory.from_config(alembic_config).get_current_head()
+            with db.engine.connect() as connection:
+                context = MigrationContext.configure(connection, opts={'render_as_batch': True})
+                self.assertEqual(context.get_current_revision(), head)
+                # El esquema migrado es el de los modelos: nada pendiente de autogenerar
+                self.assertEqual(compare_metadata(context, db.metadata), [])
+            db.session.remove()
+
+    def _query(self, sql):
+        connection = sqlite3.connect(self.db_path)
+        try:
+            return connection.execute(sql).fetchall()
+        finally:
+            connection.close()
+
+    def test_new_database(self):
+        self._migrate()
+
+    def test_baseline_database(self):
+        self._execute(BASELINE_SCHEMA + [
+            "INSERT INTO converted_video VALUES (1, 'abc', '/cursos/_archive/a.mkv', '/cursos/a.mp4')",
+            "INSERT INTO user VALUES (1, 'admin', 'x', 1)",
+        ])
+        self._migrate()
+        self.assertEqual(self._query('SELECT original_hash, converted_path, converted_hash FROM converted_video'),
+                         [('abc', '/cursos/a.mp4', None)])
+        self.assertEqual(self._query('SELECT username FROM user'), [('admin',)])
+
+    def test_migrated_database_is_left_alone(self):
+        self._migrate()
+        self._execute(["INSERT INTO app_setting VALUES ('k', '1', NULL)"])
+        self._migrate()
+        self.assertEqual(self._query('SELECT value FROM app_setting'), [('1',)])
+
+    def test_web_waits_for_the_latest_revision(self):
+        with self.assertRaises(RuntimeError):
+            wait_for_schema(self.app.logger, timeout=0)
+        self._execute(BASELINE_SCHEMA)
+        with self.app.app_context():
+            stamp(directory=MIGRATIONS_DIR, revision=BASELINE_REVISION)
+        with self.assertRaises(RuntimeError):
+            wait_for_schema(self.app.logger, timeout=0)
+        self._migrate()
+        self.assertEqual(wait_for_schema(self.app.logger, timeout=0), get_head_revision())
+
+if __name__ == '__main__':
+    unittest.main()
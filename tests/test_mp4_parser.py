@@ -0,0 +1,127 @@
+# Lector nativo de MP4 sobre archivos mínimos generados con las cajas de benchmarks/mp4_builder.py
+import os
+import random
+import struct
+import tempfile
+import unittest
+
+from app.services.mp4_parser import FORMAT_NAME, Mp4ParseError, is_faststart, parse_mp4
+from benchmarks.mp4_builder import FTYP, box, full_box, moov, trak, video_entry, write_mp4
+
+def _large_mdat(payload):
+    # Caja con tamaño de 64 bits: size = 1 y el tamaño real tras el tipo
+    return struct.pack('>I4sQ', 1, b'mdat', 16 + len(payload)) + payload
+
+class Mp4ParserTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def _write(self, name, data):
+        path = os.path.join(self.tmp.name, name)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+
+    def _generated(self, name='video.mp4', **kwargs):
+        path = os.path.join(self.tmp.name, name)
+        options = {'width': 1280, 'height': 720, 'duration_s': 90, 'payload_bytes': 4096}
+        options.update(kwargs)
+        write_mp4(path, **options)
+        return path
+
+    def test_moov_first(self):
+        path = self._generated()
+        info = parse_mp4(path)
+        self.assertTrue(info['faststart'])
+        self.assertTrue(is_faststart(path))
+        self.assertEqual(info['format'], FORMAT_NAME)
+        self.assertEqual((info['video_codec'], info['audio_codec']), ('h264', 'aac'))
+        self.assertEqual((info['width'], info['height']), (1280, 720))
+        self.assertEqual(info['duration'], 90)
+        self.assertEqual(info['bit_rate'], int(os.path.getsize(path) * 8 / 90))
+        video, audio = info['streams']
+        self.assertEqual(video, {'codec_type': 'video', 'codec_name': 'h264', 'width': 1280, 'height': 720,
+                                 'profile': 'High', 'pix_fmt': 'yuv420p', 'index': 0})
+        self.assertEqual(audio, {'codec_type': 'audio', 'codec_name': 'aac', 'channels': 2, 'sample_rate': '48000', 'index': 1})
+
+    def test_moov_last(self):
+        path = self._generated(faststart=False)
+        self.assertFalse(parse_mp4(path)['faststart'])
+        self.assertFalse(is_faststart(path))
+
+    def test_hevc_without_audio(self):
+        info = parse_mp4(self._generated(fourcc=b'hev1', audio=False))
+        self.assertEqual((info['video_codec'], info['audio_codec']), ('hevc', 'N/A'))
+        self.assertEqual(len(info['streams']), 1)
+
+    def test_version_1_headers(self):
+        # mvhd y mdhd de versión 1 usan campos de 64 bits; el mvhd sin duración obliga a usar la de las pistas
+        path = self._write('v1.mp4', FTYP + moov(duration_ms=0, version=1) + box(b'mdat', b'\0' * 16))
+        with self.assertRaises(Mp4ParseError):
+            parse_mp4(path)
+        path = self._write('v1.mp4', FTYP + moov(duration_ms=7200000, version=1) + box(b'mdat', b'\0' * 16))
+        self.assertEqual(parse_mp4(path)['duration'], 7200)
+
+    def test_largesize_mdat(self):
+        payload = random.Random(1).randbytes(2048)
+        path = self._write('large.mp4', FTYP + _large_mdat(payload) + moov())
+        self.assertFalse(is_faststart(path))
+        info = parse_mp4(path)
+        self.assertFalse(info['faststart'])
+        self.assertEqual(info['video_codec'], 'h264')
+
+    def test_size_zero_box_runs_to_end_of_file(self):
+        path = self._write('open.mp4', FTYP + moov() + struct.pack('>I4s', 0, b'mdat') + b'\0' * 512)
+        self.assertTrue(is_faststart(path))
+        self.assertEqual(parse_mp4(path)['duration'], 90)
+
+    def test_truncated_moov(self):
+        data = FTYP + moov() + box(b'mdat', b'\0' * 64)
+        path = self._write('cut.mp4', data[:len(FTYP) + 100])
+        self.assertIsNone(is_faststart(path))
+        with self.assertRaises(Mp4ParseError):
+            parse_mp4(path)
+
+    def test_truncated_after_mdat(self):
+        # Copia a medias: el mdat declara más bytes de los que hay y el moov no ha llegado
+        data = FTYP + box(b'mdat', b'\0' * 4096) + moov()
+        path = self._write('partial.mp4', data[:len(FTYP) + 1024])
+        self.assertIsNone(is_faststart(path))
+        with self.assertRaises(Mp4ParseError):
+            parse_mp4(path)
+
+    def test_truncated_largesize_header(self):
+        path = self._write('short.mp4', FTYP + struct.pack('>I4s', 1, b'mdat') + b'\0\0\0')
+        self.assertIsNone(is_faststart(path))
+        with self.assertRaises(Mp4ParseError):
+            parse_mp4(path)
+
+    def test_invalid_box_size(self):
+        path = self._write('bad.mp4', FTYP + struct.pack('>I4s', 4, b'free') + moov())
+        self.assertIsNone(is_faststart(path))
+        with self.assertRaises(Mp4ParseError):
+            parse_mp4(path)
+
+    def test_without_moov(self):
+        path = self._write('nomoov.mp4', FTYP + box(b'mdat', b'\0' * 64))
+        self.assertFalse(is_faststart(path))
+        with self.assertRaises(Mp4ParseError):
+            parse_mp4(path)
+
+    def test_unknown_video_codec(self):
+        entry = box(b'xxxx', video_entry(b'avc1', 640, 360)[8:])
+        moov = box(b'moov', full_box(b'mvhd', 0, struct.pack('>IIII', 0, 0, 1000, 1000), b'\0' * 80),
+                    trak(b'vide', entry, 1000))
+        path = self._write('unknown.mp4', FTYP + moov)
+        with self.assertRaises(Mp4ParseError):
+            parse_mp4(path)
+
+    def test_not_an_mp4(self):
+        path = self._write('text.mp4', b'esto no es un video\n' * 10)
+        self.assertIsNone(is_faststart(path))
+        with self.assertRaises(Mp4ParseError):
+            parse_mp4(path)
+
+if __name__ == '__main__':
+    unittest.main()
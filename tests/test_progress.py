@@ -0,0 +1,68 @@
+# Progreso de ffmpeg (-progress): bloques key=value, porcentaje, velocidad y ETA
+import unittest
+
+from app.services.progress_service import format_eta, format_message, parse_progress, summarize_progress
+
+OUTPUT = """frame=120
+fps=30.00
+bitrate=1200.5kbits/s
+total_size=262144
+out_time_us=4000000
+out_time_ms=4000000
+speed=2.5x
+progress=continue
+línea que no es key=value
+frame=300
+fps=30.00
+bitrate=N/A
+total_size=N/A
+out_time_us=10000000
+speed=2.50x
+progress=end
+frame=301
+"""
+
+class ProgressTest(unittest.TestCase):
+    def test_blocks_end_at_progress_key(self):
+        blocks = list(parse_progress(OUTPUT.splitlines(True)))
+        self.assertEqual(len(blocks), 2)  # El bloque final sin progress= no se emite
+        self.assertEqual(blocks[0]['out_time_us'], '4000000')
+        self.assertEqual(blocks[1]['progress'], 'end')
+
+    def test_summary_with_duration(self):
+        block = next(parse_progress(OUTPUT.splitlines()))
+        summary = summarize_progress(block, 20)
+        self.assertEqual(summary['elapsed'], 4.0)
+        self.assertEqual(summary['progress'], 20)
+        self.assertEqual(summary['speed'], 2.5)
+        self.assertEqual(summary['bitrate_kbps'], 1200.5)
+        self.assertEqual(summary['total_size'], 262144)
+        self.assertEqual(summary['eta_seconds'], round(16 / 2.5))
+        self.assertFalse(summary['finished'])
+
+    def test_end_block_is_complete(self):
+        summary = summarize_progress(list(parse_progress(OUTPUT.splitlines()))[1], 20)
+        self.assertTrue(summary['finished'])
+        self.assertEqual(summary['progress'], 100)
+        self.assertIsNone(summary['bitrate_kbps'])
+        self.assertIsNone(summary['total_size'])
+
+    def test_progress_never_reaches_100_before_end(self):
+        summary = summarize_progress({'out_time_us': '30000000', 'progress': 'continue'}, 20)
+        self.assertEqual(summary['progress'], 99)
+
+    def test_without_duration_or_speed(self):
+        summary = summarize_progress({'out_time_ms': '1500000', 'speed': 'N/A', 'progress': 'continue'}, None)
+        self.assertEqual(summary['elapsed'], 1.5)
+        self.assertIsNone(summary['progress'])
+        self.assertIsNone(summary['eta_seconds'])
+
+    def test_formatting(self):
+        self.assertEqual(format_eta(None), 'Calculando...')
+        self.assertEqual(format_eta(0), 'Finalizando...')
+        self.assertEqual(format_eta(125), '2m 5s')
+        summary = summarize_progress({'out_time_us': '5000000', 'speed': '2x', 'fps': '48', 'progress': 'continue'}, 10)
+        self.assertEqual(format_message('Convirtiendo', summary), 'Convirtiendo (50%) · 2x · 48 fps')
+
+if __name__ == '__main__':
+    unittest.main()
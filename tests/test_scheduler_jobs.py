@@ -0,0 +1,157 @@
+# Cola persistente: reclamar, renovar el lease, cancelar al perderlo, recuperar interrumpidos, temporales e historial
+import atexit
+import os
+import socket
+import subprocess
+import tempfile
+import threading
+import time
+import unittest
+from datetime import datetime, timedelta
+
+from app.__init__ import create_app, db
+from app.config import Config
+from app.models import job_model, setting_model  # noqa: F401 (registran las tablas)
+from app.models.job_model import ConversionJob
+from app.services import scheduler_service, video_service
+
+class SchedulerJobsTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        for attr in ('SQLALCHEMY_DATABASE_URI', 'LOG_DIR', 'TEMP_DIR', 'CONVERSION_WINDOWS', 'PROGRESS_PUBLISH_INTERVAL'):
+            self.addCleanup(setattr, Config, attr, getattr(Config, attr))
+        Config.SQLALCHEMY_DATABASE_URI = f"sqlite:///{os.path.join(self.tmp.name, 'app.db')}"
+        Config.LOG_DIR = self.tmp.name
+        Config.TEMP_DIR = os.path.join(self.tmp.name, '_temp')
+        Config.CONVERSION_WINDOWS = ''
+        os.makedirs(Config.TEMP_DIR)
+        self.app = create_app()
+        # El escritor de logs se detiene antes de borrar LOG_DIR (y ya no hace falta al salir)
+        listener = self.app.extensions['log_listener']
+        self.addCleanup(atexit.unregister, listener.stop)
+        self.addCleanup(listener.stop)
+        context = self.app.app_context()
+        context.push()
+        self.addCleanup(context.pop)
+        db.create_all()
+        self.addCleanup(db.session.remove)
+
+    def _expire(self, job_id, worker_id=None):
+        job = db.session.get(ConversionJob, job_id)
+        job.lease_expires_at = datetime.utcnow() - timedelta(seconds=1)
+        if worker_id:
+            job.worker_id = worker_id
+        db.session.commit()
+
+    def _finished(self, file_path, state, days_ago, job_type='convert'):
+        finished_at = datetime.utcnow() - timedelta(days=days_ago)
+        job = ConversionJob(file_path=file_path, job_type=job_type, state=state, created_at=finished_at,
+                            finished_at=finished_at, message=state)
+        db.session.add(job)
+        db.session.commit()
+        return job.id
+
+    def test_claim_takes_admin_jobs_first_and_sets_the_lease(self):
+        self.assertTrue(scheduler_service.submit('/cursos/auto.mp4', duration=10))
+        self.assertTrue(scheduler_service.submit('/cursos/admin.mp4', priority=scheduler_service.PRIORITY_ADMIN, duration=900))
+        job = scheduler_service.next_job('host:boot:conversion-0')
+        self.assertEqual(job['file_path'], '/cursos/admin.mp4')
+        self.assertEqual(job['attempts'], 1)
+        row = db.session.get(ConversionJob, job['id'])
+        self.assertEqual((row.state, row.worker_id), ('processing', 'host:boot:conversion-0'))
+        self.assertGreater(row.lease_expires_at, datetime.utcnow())
+        self.assertEqual(scheduler_service.next_job('host:boot:conversion-1')['file_path'], '/cursos/auto.mp4')
+
+    def test_heartbeat_is_refused_once_the_job_is_reclaimed(self):
+        scheduler_service.submit('/cursos/a.mp4')
+        job = scheduler_service.next_job('host:boot:conversion-0')
+        self.assertTrue(scheduler_service.heartbeat(job['id'], 'host:boot:conversion-0', progress=40))
+        self.assertEqual(db.session.get(ConversionJob, job['id']).progress, 40)
+        self._expire(job['id'])
+        self.assertEqual(scheduler_service.recover_jobs(), 1)
+        self.assertFalse(scheduler_service.heartbeat(job['id'], 'host:boot:conversion-0'))
+
+    def test_lost_lease_cancels_the_running_job(self):
+        Config.PROGRESS_PUBLISH_INTERVAL = 0.01
+        scheduler_service.submit('/cursos/a.mp4')
+        job = scheduler_service.next_job('host:boot:conversion-0')
+        self._expire(job['id'])
+        scheduler_service.recover_jobs()
+        scheduler_service.next_job('host:boot:conversion-1')
+        stop, cancel = threading.Event(), threading.Event()
+        self.addCleanup(stop.set)
+        thread = threading.Thread(target=video_service._heartbeat_loop, args=(self.app, job, 'host:boot:conversion-0', stop, cancel))
+        thread.start()
+        self.assertTrue(cancel.wait(5))
+        thread.join(5)
+        # ffmpeg se detiene aunque el regulador lo tenga parado
+        process = subprocess.Popen(['sleep', '30'])
+        self.addCleanup(process.kill)
+        video_service._terminate_on_cancel(process, cancel)
+        self.assertIsNotNone(process.wait(5))
+
+    def test_recover_requeues_until_max_attempts(self):
+        scheduler_service.submit('/cursos/a.mp4')
+        for attempt in range(1, Config.JOB_MAX_ATTEMPTS + 1):
+            job = scheduler_service.next_job('host:boot:conversion-0')
+            self.assertEqual(job['attempts'], attempt)
+            self._expire(job['id'])
+            self.assertEqual(scheduler_service.recover_jobs(), 1)
+        row = db.session.get(ConversionJob, job['id'])
+        self.assertEqual(row.state, 'failed')
+        self.assertIsNone(row.worker_id)
+        self.assertIsNotNone(row.finished_at)
+
+    def test_startup_recovers_jobs_of_a_previous_boot_on_this_host(self):
+        for name in ('previous', 'current', 'other'):
+            scheduler_service.submit(f'/cursos/{name}.mp4')
+        host = socket.gethostname()
+        previous = scheduler_service.next_job(f'{host}:00000000:conversion-0')
+        current = scheduler_service.next_job(scheduler_service.make_worker_id())
+        other = scheduler_service.next_job('otro-host:00000000:conversion-0')
+        self.assertEqual(scheduler_service.recover_jobs(startup=True), 1)
+        self.assertEqual(db.session.get(ConversionJob, previous['id']).state, 'queued')
+        self.assertEqual(db.session.get(ConversionJob, current['id']).state, 'processing')
+        self.assertEqual(db.session.get(ConversionJob, other['id']).state, 'processing')
+
+    def test_orphan_temp_files_are_removed_but_not_those_of_running_jobs(self):
+        prefix = scheduler_service.get_temp_prefix('/cursos/a.mp4')
+        temp_path = os.path.join(Config.TEMP_DIR, f'{prefix}_temp.mp4')
+        scheduler_service.submit('/cursos/a.mp4', temp_path=temp_path)
+        scheduler_service.next_job('host:boot:conversion-0')
+        old = time.time() - Config.JOB_LEASE_SECONDS - 60
+        names = {'in_use': f'{prefix}_temp.mp4', 'segments': f'{prefix}_segments', 'orphan': 'ffffffff_temp.mp4',
+                 'recent': 'eeeeeeee_temp.mp4'}
+        for key, name in names.items():
+            path = os.path.join(Config.TEMP_DIR, name)
+            if key == 'segments':
+                os.makedirs(path)
+            else:
+                open(path, 'wb').close()
+            if key != 'recent':
+                os.utime(path, (old, old))
+        scheduler_service.recover_jobs()
+        self.assertEqual(sorted(os.listdir(Config.TEMP_DIR)), sorted(names[key] for key in ('in_use', 'segments', 'recent')))
+
+    def test_purge_keeps_the_latest_job_of_each_file_type_and_state(self):
+        old_completed = self._finished('/cursos/a.mp4', 'completed', 90)
+        latest_completed = self._finished('/cursos/a.mp4', 'completed', 60)
+        latest_failed = self._finished('/cursos/a.mp4', 'failed', 45)
+        hls = self._finished('/cursos/a.mp4', 'completed', 80, job_type='hls')
+        recent = self._finished('/cursos/b.mp4', 'failed', 1)
+        recent_latest = self._finished('/cursos/b.mp4', 'failed', 0)
+        scheduler_service.submit('/cursos/a.mp4')
+        self.assertEqual(scheduler_service.purge_finished_jobs(30), 1)
+        remaining = {job.id for job in ConversionJob.query.filter(ConversionJob.state.in_(scheduler_service.FINISHED_STATES))}
+        self.assertEqual(remaining, {latest_completed, latest_failed, hls, recent, recent_latest})
+        self.assertNotIn(old_completed, remaining)
+        self.assertEqual(scheduler_service.purge_finished_jobs(0), 0)
+        self.assertEqual(scheduler_service.get_job_states(), {
+            '/cursos/a.mp4': {'status': 'queued', 'message': 'En cola'},
+            '/cursos/b.mp4': {'status': 'failed', 'message': 'failed'},
+        })
+        self.assertEqual(set(scheduler_service.get_completed_at('hls')), {'/cursos/a.mp4'})
+
+if __name__ == '__main__':
+    unittest.main()
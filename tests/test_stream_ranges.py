@@ -0,0 +1,75 @@
+# Entrega con Range: rangos simples, sufijos, varios rangos, no satisfacibles e If-Range
+import os
+import tempfile
+import unittest
+
+from flask import Flask
+
+from app.services.stream_service import _make_etag, stream_file
+
+DATA = bytes(range(256)) * 4  # 1024 bytes distinguibles por posición
+
+class StreamRangeTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = os.path.join(self.tmp.name, 'video.mp4')
+        with open(self.path, 'wb') as f:
+            f.write(DATA)
+        self.app = Flask(__name__)
+
+    def _get(self, **headers):
+        with self.app.test_request_context('/', headers=headers):
+            response = stream_file(self.path, 'video/mp4')
+            response.direct_passthrough = False
+            return response.status_code, response.headers, response.get_data()
+
+    def test_without_range(self):
+        status, headers, body = self._get()
+        self.assertEqual(status, 200)
+        self.assertEqual(body, DATA)
+        self.assertEqual(headers['Accept-Ranges'], 'bytes')
+
+    def test_single_range(self):
+        status, headers, body = self._get(Range='bytes=10-19')
+        self.assertEqual(status, 206)
+        self.assertEqual(body, DATA[10:20])
+        self.assertEqual(headers['Content-Range'], 'bytes 10-19/1024')
+        self.assertEqual(headers['Content-Length'], '10')
+
+    def test_open_and_suffix_ranges(self):
+        status, headers, body = self._get(Range='bytes=1000-')
+        self.assertEqual((status, body), (206, DATA[1000:]))
+        status, headers, body = self._get(Range='bytes=-24')
+        self.assertEqual((status, body), (206, DATA[-24:]))
+        self.assertEqual(headers['Content-Range'], 'bytes 1000-1023/1024')
+
+    def test_range_past_end_is_clamped(self):
+        status, headers, body = self._get(Range='bytes=1020-5000')
+        self.assertEqual((status, body), (206, DATA[1020:]))
+
+    def test_unsatisfiable_range(self):
+        status, headers, body = self._get(Range='bytes=2000-3000')
+        self.assertEqual(status, 416)
+        self.assertEqual(headers['Content-Range'], 'bytes */1024')
+
+    def test_multiple_ranges(self):
+        status, headers, body = self._get(Range='bytes=0-3,100-103')
+        self.assertEqual(status, 206)
+        self.assertTrue(headers['Content-Type'].startswith('multipart/byteranges'))
+        self.assertIn(b'Content-Range: bytes 0-3/1024\r\n\r\n' + DATA[0:4], body)
+        self.assertIn(b'Content-Range: bytes 100-103/1024\r\n\r\n' + DATA[100:104], body)
+        self.assertEqual(int(headers['Content-Length']), len(body))
+
+    def test_if_range_with_stale_etag_sends_whole_file(self):
+        status, _, body = self._get(Range='bytes=0-9', **{'If-Range': '"otro"'})
+        self.assertEqual((status, body), (200, DATA))
+        status, _, body = self._get(Range='bytes=0-9', **{'If-Range': _make_etag(os.stat(self.path))})
+        self.assertEqual((status, body), (206, DATA[:10]))
+
+    def test_not_modified(self):
+        status, _, body = self._get(**{'If-None-Match': _make_etag(os.stat(self.path))})
+        self.assertEqual((status, body), (304, b''))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,48 @@
+# Ventanas de conversión (CONVERSION_WINDOWS): formato, ventanas que cruzan la medianoche y valores inválidos
+import unittest
+from datetime import datetime
+
+from app.config import Config
+from app.services.throttle_service import _parse_windows, in_conversion_window
+
+def _at(hour, minute=0):
+    return datetime(2026, 1, 1, hour, minute)
+
+class ConversionWindowTest(unittest.TestCase):
+    def setUp(self):
+        self.addCleanup(setattr, Config, 'CONVERSION_WINDOWS', Config.CONVERSION_WINDOWS)
+
+    def test_parse(self):
+        self.assertEqual(_parse_windows('01:00-07:30, 14:00-16:00'), [(60, 450), (840, 960)])
+        self.assertEqual(_parse_windows('23:00-06:00'), [(1380, 360)])
+
+    def test_invalid_parts_are_ignored(self):
+        self.assertEqual(_parse_windows('basura,1-2,aa:bb-cc:dd,02:00-03:00'), [(120, 180)])
+        self.assertEqual(_parse_windows(''), [])
+
+    def test_without_windows_always_open(self):
+        Config.CONVERSION_WINDOWS = ''
+        self.assertTrue(in_conversion_window(_at(12)))
+
+    def test_daytime_window(self):
+        Config.CONVERSION_WINDOWS = '01:00-07:30'
+        self.assertTrue(in_conversion_window(_at(1)))
+        self.assertTrue(in_conversion_window(_at(7, 29)))
+        self.assertFalse(in_conversion_window(_at(7, 30)))  # El final no se incluye
+        self.assertFalse(in_conversion_window(_at(0, 59)))
+
+    def test_window_across_midnight(self):
+        Config.CONVERSION_WINDOWS = '23:00-06:00'
+        self.assertTrue(in_conversion_window(_at(23, 30)))
+        self.assertTrue(in_conversion_window(_at(0)))
+        self.assertTrue(in_conversion_window(_at(5, 59)))
+        self.assertFalse(in_conversion_window(_at(6)))
+        self.assertFalse(in_conversion_window(_at(12)))
+
+    def test_several_windows(self):
+        Config.CONVERSION_WINDOWS = '01:00-03:00,14:00-16:00'
+        self.assertTrue(in_conversion_window(_at(15)))
+        self.assertFalse(in_conversion_window(_at(10)))
+
+if __name__ == '__main__':
+    unittest.main()
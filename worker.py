@@ -0,0 +1,21 @@
+# Proceso de segundo plano: escaneo de videos, conversiones e índice de búsqueda (una instancia por despliegue)
+import os
+import sys
+import threading
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.__init__ import create_app
+from app.services.startup_service import init_db, start_worker_services
+
+app = create_app()
+
+if __name__ == '__main__':
+    try:
+        init_db(app)
+    except Exception as e:
+        app.logger.error(f"Error al inicializar la base de datos: {e}")
+        raise
+    start_worker_services(app)
+    app.logger.info("Worker en marcha")
+    threading.Event().wait()
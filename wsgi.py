@@ -0,0 +1,9 @@
+# Punto de entrada WSGI para producción: importar este módulo no arranca hilos ni toca la base de datos
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.__init__ import create_app
+
+app = create_app()